@@ -13,7 +13,7 @@ from etho_renamer.models import FileInfo, InputData
 from etho_renamer.validation import validate_all
 from etho_renamer.config import MONTHS
 from etho_renamer.core import compute_new_filename
-from etho_renamer.ffprobe import get_duration
+from etho_renamer.ffprobe import get_default_engine
 
 
 def example_rename_one_file():
@@ -63,7 +63,7 @@ def example_rename_one_file():
     )
     
     # 4. Ottieni durata (richiede ffprobe)
-    duration, error = get_duration(video_path)
+    duration, error = get_default_engine().get_duration(video_path)
     if error:
         print(f"Duration error: {error}")
         return
@@ -107,6 +107,9 @@ def example_batch_rename():
         part='Part1'
     )
     
+    # Un solo ProbeEngine per tutto il batch (ffprobe risolto una volta)
+    engine = get_default_engine()
+
     results = []
     for video_path in video_files:
         print(f"\nProcessing: {video_path.name}")
@@ -120,7 +123,7 @@ def example_batch_rename():
         )
         
         # Ottieni durata
-        duration, error = get_duration(video_path)
+        duration, error = engine.get_duration(video_path)
         if error:
             print(f"  ERROR: {error}")
             continue
@@ -0,0 +1,192 @@
+"""Durate di tutte le clip di una scheda AVCHD dai file indice CLIPINF/PLAYLIST."""
+import os
+import struct
+from pathlib import Path
+from typing import Optional, Dict, List
+
+from .models import FileInfo
+
+# I tempi negli indici AVCHD/Blu-ray sono a 45 kHz
+_INDEX_CLOCK_HZ = 45000
+
+CLIPINF_EXTENSIONS = {'.cpi', '.clpi'}
+PLAYLIST_EXTENSIONS = {'.mpl', '.mpls'}
+
+# Percorsi relativi della cartella STREAM a partire dalla radice della scheda
+_STREAM_SUBDIRS = (
+    ("PRIVATE", "AVCHD", "BDMV", "STREAM"),
+    ("AVCHD", "BDMV", "STREAM"),
+    ("BDMV", "STREAM"),
+    ("STREAM",),
+)
+
+
+def _child_dir(parent: Path, name: str) -> Optional[Path]:
+    """Sottocartella `name` di parent, case-insensitive (FAT/exFAT delle schede)."""
+    exact = parent / name
+    if exact.is_dir():
+        return exact
+    try:
+        with os.scandir(parent) as it:
+            for entry in it:
+                if entry.name.upper() == name and entry.is_dir():
+                    return Path(entry.path)
+    except OSError:
+        pass
+    return None
+
+
+def _is_stream_dir(folder: Path) -> bool:
+    """True se folder è una cartella STREAM con CLIPINF accanto."""
+    return folder.name.upper() == "STREAM" and _child_dir(folder.parent, "CLIPINF") is not None
+
+
+def find_stream_dir(folder: Path) -> Optional[Path]:
+    """
+    Restituisce la cartella BDMV/STREAM se folder è (o contiene) una
+    struttura AVCHD: radice della scheda, AVCHD, BDMV o STREAM stessa.
+    """
+    if _is_stream_dir(folder):
+        return folder
+
+    for parts in _STREAM_SUBDIRS:
+        current: Optional[Path] = folder
+        for part in parts:
+            current = _child_dir(current, part)
+            if current is None:
+                break
+        if current is not None and _is_stream_dir(current):
+            return current
+    return None
+
+
+def read_clpi_duration(file_path: Path) -> Optional[float]:
+    """
+    Durata (secondi) di una clip dal suo file CLIPINF (.CPI/.clpi):
+    somma degli intervalli presentation_start/end delle sequenze STC.
+    """
+    try:
+        data = file_path.read_bytes()
+        if len(data) < 40 or data[0:4] != b"HDMV":
+            return None
+
+        seq_start = struct.unpack_from(">I", data, 8)[0]
+        num_atc = data[seq_start + 5]
+        pos = seq_start + 6
+        total = 0
+        for _ in range(num_atc):
+            num_stc = data[pos + 4]
+            pos += 6
+            for _ in range(num_stc):
+                start, end = struct.unpack_from(">II", data, pos + 6)
+                if end > start:
+                    total += end - start
+                pos += 14
+    except (OSError, struct.error, IndexError):
+        return None
+
+    if total <= 0:
+        return None
+    return total / _INDEX_CLOCK_HZ
+
+
+def read_mpls_durations(file_path: Path) -> Dict[str, float]:
+    """
+    Durate per clip da un file PLAYLIST (.MPL/.mpls): per ogni PlayItem
+    OUT_time - IN_time, sommati per nome clip (es. "00001").
+    """
+    durations: Dict[str, float] = {}
+    try:
+        data = file_path.read_bytes()
+        if len(data) < 20 or data[0:4] != b"MPLS":
+            return durations
+
+        pl_start = struct.unpack_from(">I", data, 8)[0]
+        num_items = struct.unpack_from(">H", data, pl_start + 6)[0]
+        pos = pl_start + 10
+        for _ in range(num_items):
+            item_len = struct.unpack_from(">H", data, pos)[0]
+            clip_id = data[pos + 2:pos + 7].decode("ascii")
+            in_time, out_time = struct.unpack_from(">II", data, pos + 14)
+            if out_time > in_time:
+                durations[clip_id] = (
+                    durations.get(clip_id, 0.0)
+                    + (out_time - in_time) / _INDEX_CLOCK_HZ
+                )
+            pos += 2 + item_len
+    except (OSError, struct.error, IndexError, UnicodeDecodeError):
+        pass
+    return durations
+
+
+def read_card_durations(stream_dir: Path) -> Dict[str, float]:
+    """
+    Legge una volta sola gli indici della scheda a cui appartiene stream_dir.
+    Restituisce {nome_clip_maiuscolo: durata_sec}; CLIPINF ha la precedenza
+    su PLAYLIST per le clip presenti in entrambi.
+    """
+    bdmv = stream_dir.parent
+    durations: Dict[str, float] = {}
+
+    playlist_dir = _child_dir(bdmv, "PLAYLIST")
+    if playlist_dir is not None:
+        for entry in _iter_files(playlist_dir, PLAYLIST_EXTENSIONS):
+            for clip_id, dur in read_mpls_durations(entry).items():
+                durations.setdefault(clip_id.upper(), dur)
+
+    clipinf_dir = _child_dir(bdmv, "CLIPINF")
+    if clipinf_dir is not None:
+        for entry in _iter_files(clipinf_dir, CLIPINF_EXTENSIONS):
+            dur = read_clpi_duration(entry)
+            if dur is not None:
+                durations[entry.stem.upper()] = dur
+
+    return durations
+
+
+def _iter_files(folder: Path, extensions: set) -> List[Path]:
+    """File in folder con una delle estensioni date (case-insensitive)."""
+    try:
+        with os.scandir(folder) as it:
+            return [
+                Path(e.path) for e in it
+                if os.path.splitext(e.name)[1].lower() in extensions and e.is_file()
+            ]
+    except OSError:
+        return []
+
+
+def fill_durations_from_index(
+    file_infos: List[FileInfo],
+    by_stream_dir: Optional[Dict[Path, Optional[Dict[str, float]]]] = None,
+) -> List[FileInfo]:
+    """
+    Compila duration_sec per i file che stanno in una cartella BDMV/STREAM,
+    leggendo gli indici di ciascuna scheda una sola volta.
+
+    by_stream_dir: indici già letti per cartella; passando lo stesso dict a
+    più chiamate (es. i blocchi di una scansione) gli indici non vengono riletti.
+
+    Restituisce i FileInfo non coperti dagli indici (da analizzare con probe).
+    """
+    if by_stream_dir is None:
+        by_stream_dir = {}
+    uncovered: List[FileInfo] = []
+
+    for fi in file_infos:
+        parent = fi.path.parent
+        if parent not in by_stream_dir:
+            by_stream_dir[parent] = (
+                read_card_durations(parent) if _is_stream_dir(parent) else None
+            )
+
+        index = by_stream_dir[parent]
+        duration = index.get(fi.path.stem.upper()) if index else None
+        if duration is None:
+            uncovered.append(fi)
+        else:
+            fi.duration_sec = duration
+            fi.duration_provisional = False
+            fi.error = None
+
+    return uncovered
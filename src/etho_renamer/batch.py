@@ -0,0 +1,180 @@
+"""Calcolo in blocco dei nuovi nomi, per anteprime di intere cartelle."""
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+from .config import VECTORIZE_MIN_ROWS
+from .core import parse_prefix_date, MTIME_MISSING_MSG, DURATION_MISSING_MSG
+from .models import FileInfo, InputData
+from .naming import compile_template
+
+try:
+    import numpy as np
+except ImportError:  # NumPy è opzionale: si usa il percorso Python puro
+    np = None
+
+_US_PER_MINUTE = 60_000_000
+_US_PER_DAY = 86_400_000_000
+_MAX_ORDINAL = date.max.toordinal()
+# "HHMM" per ogni minuto del giorno
+_HHMM = [f"{h:02d}{m:02d}" for h in range(24) for m in range(60)]
+# Margine (µs) dal cambio di minuto entro cui si ricalcola con timedelta:
+# l'arrotondamento di NumPy può differire di 1 µs da quello di timedelta
+_BOUNDARY_US = 2
+
+
+def numpy_available() -> bool:
+    return np is not None
+
+
+def compute_new_filenames(
+    mtimes: Sequence[Optional[datetime]],
+    durations: Sequence[Optional[float]],
+    original_names: Sequence[str],
+    extensions: Sequence[str],
+    inputs: Union[InputData, Sequence[InputData]],
+    creation_times: Optional[Sequence[Optional[datetime]]] = None,
+    use_numpy: Optional[bool] = None,
+) -> List[Tuple[Optional[str], str]]:
+    """
+    Versione a colonne di compute_new_filename: stesso risultato riga per
+    riga, ma ora di inizio (mtime - durata) e stringhe YYYYMMDD/HHMM
+    calcolate insieme per tutte le righe.
+
+    inputs: un InputData per riga (già risolto con gli override) o uno
+    solo per tutte. creation_times: se passato, equivale a
+    use_creation_time=True (None nella riga = si usa mtime - durata).
+    use_numpy: None = NumPy se installato e le righe sono abbastanza.
+
+    Restituisce [(new_filename_or_none, error_message_or_empty)].
+    """
+    n = len(original_names)
+    if isinstance(inputs, InputData):
+        inputs = [inputs] * n
+
+    results: List[Optional[Tuple[Optional[str], str]]] = [None] * n
+    # (YYYYMMDD, HHMM) dell'ora di inizio, per riga
+    stamps: List[Optional[Tuple[str, str]]] = [None] * n
+    from_mtime: List[int] = []
+    days: Dict[int, str] = {}
+
+    for i in range(n):
+        created = creation_times[i] if creation_times is not None else None
+        if created:
+            stamps[i] = _stamp(created, days)
+        elif not mtimes[i]:
+            results[i] = (None, MTIME_MISSING_MSG)
+        elif not durations[i]:
+            results[i] = (None, DURATION_MISSING_MSG)
+        else:
+            from_mtime.append(i)
+
+    if use_numpy is None:
+        use_numpy = np is not None and len(from_mtime) >= VECTORIZE_MIN_ROWS
+    if use_numpy and np is not None and from_mtime:
+        _stamps_numpy(mtimes, durations, from_mtime, stamps, days)
+    else:
+        for i in from_mtime:
+            stamps[i] = _stamp(mtimes[i] - timedelta(seconds=durations[i]), days)
+
+    # Formatter del template, una volta per InputData (di solito uno solo)
+    template = compile_template()
+    formatters: Dict[int, Callable[[str, str], str]] = {}
+    for i in range(n):
+        if results[i] is not None:
+            continue
+        yyyymmdd, hhmm = stamps[i]
+        name = original_names[i]
+        # Solo i nomi che iniziano con una cifra possono avere il prefisso data
+        if name[:1].isdigit():
+            prefix_date = parse_prefix_date(name)
+            if prefix_date:
+                yyyymmdd = _ymd(*prefix_date)
+        input_data = inputs[i]
+        formatter = formatters.get(id(input_data))
+        if formatter is None:
+            formatter = formatters[id(input_data)] = template.bind(input_data)
+        results[i] = (formatter(yyyymmdd, hhmm) + extensions[i], "")
+    return results
+
+
+def compute_new_filenames_for(
+    file_infos: Sequence[FileInfo],
+    inputs: Union[InputData, Sequence[InputData]],
+    use_creation_time: bool = False,
+    use_numpy: Optional[bool] = None,
+) -> List[Tuple[Optional[str], str]]:
+    """compute_new_filenames sulle colonne di una lista di FileInfo."""
+    return compute_new_filenames(
+        [fi.mtime for fi in file_infos],
+        [fi.duration_sec for fi in file_infos],
+        [fi.original_filename for fi in file_infos],
+        [fi.extension for fi in file_infos],
+        inputs,
+        creation_times=[fi.creation_time for fi in file_infos] if use_creation_time else None,
+        use_numpy=use_numpy,
+    )
+
+
+def _ymd(year: int, month: int, day: int) -> str:
+    if year < 1000:
+        # strftime non aggiunge zeri sugli anni a 3 cifre: stesso risultato dello scalare
+        return datetime(year, month, day).strftime("%Y%m%d")
+    return f"{year:04d}{month:02d}{day:02d}"
+
+
+def _day_string(ordinal: int, days: Dict[int, str]) -> str:
+    """YYYYMMDD del giorno (ordinale gregoriano), memorizzato in days."""
+    ymd = days.get(ordinal)
+    if ymd is None:
+        d = date.fromordinal(ordinal)
+        ymd = days[ordinal] = _ymd(d.year, d.month, d.day)
+    return ymd
+
+
+def _stamp(dt: datetime, days: Dict[int, str]) -> Tuple[str, str]:
+    """(YYYYMMDD, HHMM) come strftime, senza strftime."""
+    return _day_string(dt.toordinal(), days), _HHMM[dt.hour * 60 + dt.minute]
+
+
+def _stamps_numpy(
+    mtimes: Sequence[Optional[datetime]],
+    durations: Sequence[Optional[float]],
+    rows: List[int],
+    stamps: List[Optional[Tuple[str, str]]],
+    days: Dict[int, str],
+) -> None:
+    """Ora di inizio in µs interi (int64) per le righe date; compila stamps."""
+    count = len(rows)
+    # Istante in µs dal giorno 1 del calendario gregoriano (no datetime64:
+    # convertire oggetti datetime in NumPy costa più del calcolo stesso)
+    mt_us = np.fromiter(
+        (
+            ((d.toordinal() * 86400 + d.hour * 3600 + d.minute * 60 + d.second)
+             * 1_000_000 + d.microsecond)
+            for d in (mtimes[i] for i in rows)
+        ),
+        dtype=np.int64, count=count,
+    )
+    du = np.fromiter((durations[i] for i in rows), dtype=np.float64, count=count)
+
+    # Durate non finite o enormi: percorso scalare (stessi errori di timedelta)
+    fallback = ~np.isfinite(du) | (np.abs(du) > 1e11)
+    start_us = mt_us - np.rint(np.where(fallback, 0.0, du) * 1e6).astype(np.int64)
+
+    ordinal, us_of_day = np.divmod(start_us, _US_PER_DAY)
+    minute_of_day, rest = np.divmod(us_of_day, _US_PER_MINUTE)
+    fallback |= (rest < _BOUNDARY_US) | (rest > _US_PER_MINUTE - _BOUNDARY_US)
+    fallback |= (ordinal < 1) | (ordinal > _MAX_ORDINAL)
+
+    # Stringa YYYYMMDD una volta per giorno distinto
+    unique_days, day_index = np.unique(np.where(fallback, 1, ordinal), return_inverse=True)
+    day_strings = [_day_string(o, days) for o in unique_days.tolist()]
+
+    day_index = day_index.tolist()
+    minute_of_day = minute_of_day.tolist()
+    fallback = fallback.tolist()
+    for k, i in enumerate(rows):
+        if fallback[k]:
+            stamps[i] = _stamp(mtimes[i] - timedelta(seconds=durations[i]), days)
+        else:
+            stamps[i] = (day_strings[day_index[k]], _HHMM[minute_of_day[k]])
@@ -0,0 +1,319 @@
+"""Cache persistente (SQLite) delle durate e dei metadati video."""
+import os
+import sys
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Optional, Dict, List, Tuple
+
+from .config import DURATION_CACHE_FILENAME, DURATION_CACHE_MAX_ENTRIES
+from .models import MediaInfo
+
+# Numero di "touch" LRU accumulati prima di scriverli su disco
+_TOUCH_FLUSH_THRESHOLD = 256
+
+# Colonne dei metadati aggiunte dopo la prima versione dello schema
+# (create con ALTER TABLE sulle cache esistenti)
+_METADATA_COLUMNS = (
+    ("creation_time", "TEXT"),
+    ("codec", "TEXT"),
+    ("width", "INTEGER"),
+    ("height", "INTEGER"),
+    ("fps", "REAL"),
+    ("bit_rate", "INTEGER"),
+    ("complete", "INTEGER NOT NULL DEFAULT 0"),
+)
+
+
+def user_data_dir() -> Path:
+    """
+    Cartella dati utente dell'app.
+    Override con la variabile d'ambiente ETHO_RENAMER_DATA_DIR.
+    """
+    override = os.environ.get("ETHO_RENAMER_DATA_DIR")
+    if override:
+        return Path(override)
+
+    if sys.platform.startswith("win"):
+        base = os.environ.get("LOCALAPPDATA") or os.environ.get("APPDATA")
+        if base:
+            return Path(base) / "EthoRenamer"
+        return Path.home() / "AppData" / "Local" / "EthoRenamer"
+
+    if sys.platform == "darwin":
+        return Path.home() / "Library" / "Application Support" / "EthoRenamer"
+
+    base = os.environ.get("XDG_DATA_HOME")
+    if base:
+        return Path(base) / "etho-renamer"
+    return Path.home() / ".local" / "share" / "etho-renamer"
+
+
+class DurationCache:
+    """
+    Cache durate e metadati (MediaInfo) su SQLite, chiave = path,
+    validata da size + mtime (+ inode).
+
+    Se il file cambia (size, mtime o inode diversi) la voce viene invalidata
+    automaticamente. Oltre max_entries le voci usate meno di recente vengono
+    rimosse (LRU). Thread-safe: usata dai worker di probing.
+    """
+
+    def __init__(self, db_path: Path, max_entries: int = DURATION_CACHE_MAX_ENTRIES):
+        self.db_path = Path(db_path)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+        self._lock = threading.Lock()
+        self._pending_touches: Dict[str, int] = {}
+        self._closed = False
+
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS durations ("
+            " path TEXT PRIMARY KEY,"
+            " size INTEGER NOT NULL,"
+            " mtime_ns INTEGER NOT NULL,"
+            " inode INTEGER NOT NULL,"
+            " duration REAL NOT NULL,"
+            " last_access INTEGER NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_durations_access "
+            "ON durations(last_access)"
+        )
+        self._migrate()
+        self._conn.commit()
+
+        # Orologio logico LRU: monotono anche tra sessioni diverse
+        last = self._conn.execute("SELECT MAX(last_access) FROM durations").fetchone()[0]
+        self._clock = int(last or 0)
+
+    # ── Lookup ───────────────────────────────────────────────────────────────
+
+    def get(self, file_path: Path, st: Optional[os.stat_result] = None) -> Optional[float]:
+        """
+        Restituisce la durata in cache o None (miss).
+        st: risultato di stat() già disponibile, per evitare una seconda chiamata.
+        """
+        info = self.get_info(file_path, st)
+        return info.duration_sec if info is not None else None
+
+    def get_info(
+        self,
+        file_path: Path,
+        st: Optional[os.stat_result] = None,
+    ) -> Optional[MediaInfo]:
+        """Restituisce i metadati in cache o None (miss o file modificato)."""
+        key = str(file_path)
+        try:
+            if st is None:
+                st = os.stat(key)
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            if self._closed:
+                self.misses += 1
+                return None
+            row = self._conn.execute(
+                "SELECT size, mtime_ns, inode, duration, creation_time, codec,"
+                " width, height, fps, bit_rate, complete"
+                " FROM durations WHERE path = ?",
+                (key,),
+            ).fetchone()
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            size, mtime_ns, inode = row[:3]
+            if not _matches(st, size, mtime_ns, inode):
+                # File modificato: la voce non è più valida
+                self._conn.execute("DELETE FROM durations WHERE path = ?", (key,))
+                self._conn.commit()
+                self._pending_touches.pop(key, None)
+                self.invalidations += 1
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._pending_touches[key] = self._tick()
+            if len(self._pending_touches) >= _TOUCH_FLUSH_THRESHOLD:
+                self._flush_touches()
+
+        duration, created, codec, width, height, fps, bit_rate, complete = row[3:]
+        return MediaInfo(
+            duration_sec=duration,
+            creation_time=datetime.fromisoformat(created) if created else None,
+            codec=codec,
+            width=width,
+            height=height,
+            fps=fps,
+            bit_rate=bit_rate,
+            complete=bool(complete),
+        )
+
+    def put(self, file_path: Path, duration: float, st: Optional[os.stat_result] = None) -> None:
+        """Salva la durata per il file (con la sua firma size/mtime/inode)."""
+        self.put_info(file_path, MediaInfo(duration_sec=duration), st)
+
+    def put_info(
+        self,
+        file_path: Path,
+        info: MediaInfo,
+        st: Optional[os.stat_result] = None,
+    ) -> None:
+        """Salva i metadati del file (con la sua firma size/mtime/inode)."""
+        if info.duration_sec is None:
+            return
+        key = str(file_path)
+        try:
+            if st is None:
+                st = os.stat(key)
+        except OSError:
+            return
+
+        created = info.creation_time.isoformat() if info.creation_time else None
+        with self._lock:
+            if self._closed:
+                return
+            self._conn.execute(
+                "INSERT OR REPLACE INTO durations "
+                "(path, size, mtime_ns, inode, duration, last_access,"
+                " creation_time, codec, width, height, fps, bit_rate, complete) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, st.st_size, st.st_mtime_ns, st.st_ino or 0,
+                 float(info.duration_sec), self._tick(),
+                 created, info.codec, info.width, info.height, info.fps,
+                 info.bit_rate, int(info.complete)),
+            )
+            self._pending_touches.pop(key, None)
+            self._evict_if_needed()
+            self._conn.commit()
+
+    # ── Manutenzione ─────────────────────────────────────────────────────────
+
+    def __len__(self) -> int:
+        with self._lock:
+            if self._closed:
+                return 0
+            return self._conn.execute("SELECT COUNT(*) FROM durations").fetchone()[0]
+
+    def stats(self) -> dict:
+        """Contatori hit/miss/invalidazioni dall'avvio."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "hit_rate": (self.hits / total) if total else 0.0,
+            }
+
+    def samples(self, limit: int = 5000) -> List[Tuple[Path, int, float]]:
+        """Voci più recenti come (path, dimensione, durata), es. per stimare i bitrate."""
+        with self._lock:
+            if self._closed:
+                return []
+            rows = self._conn.execute(
+                "SELECT path, size, duration FROM durations "
+                "ORDER BY last_access DESC LIMIT ?",
+                (limit,),
+            ).fetchall()
+        return [(Path(p), size, duration) for p, size, duration in rows]
+
+    def clear(self) -> None:
+        """Svuota la cache."""
+        with self._lock:
+            if self._closed:
+                return
+            self._pending_touches.clear()
+            self._conn.execute("DELETE FROM durations")
+            self._conn.commit()
+
+    def close(self) -> None:
+        """Scrive gli accessi pendenti e chiude la connessione."""
+        with self._lock:
+            if self._closed:
+                return
+            self._flush_touches()
+            self._conn.close()
+            self._closed = True
+
+    def _migrate(self) -> None:
+        """Aggiunge le colonne dei metadati a una cache creata da versioni precedenti."""
+        existing = {
+            row[1] for row in self._conn.execute("PRAGMA table_info(durations)")
+        }
+        for name, decl in _METADATA_COLUMNS:
+            if name not in existing:
+                self._conn.execute(f"ALTER TABLE durations ADD COLUMN {name} {decl}")
+
+    def _tick(self) -> int:
+        """Avanza l'orologio LRU (chiamare con lock acquisito)."""
+        self._clock += 1
+        return self._clock
+
+    def _flush_touches(self) -> None:
+        """Aggiorna last_access per le voci lette (chiamare con lock acquisito)."""
+        if not self._pending_touches:
+            return
+        self._conn.executemany(
+            "UPDATE durations SET last_access = ? WHERE path = ?",
+            [(ts, key) for key, ts in self._pending_touches.items()],
+        )
+        self._conn.commit()
+        self._pending_touches.clear()
+
+    def _evict_if_needed(self) -> None:
+        """Rimuove le voci meno recenti oltre max_entries (chiamare con lock acquisito)."""
+        count = self._conn.execute("SELECT COUNT(*) FROM durations").fetchone()[0]
+        if count <= self.max_entries:
+            return
+        self._flush_touches()
+        # Scende al 90% per non pagare l'eviction a ogni put
+        target = int(self.max_entries * 0.9)
+        self._conn.execute(
+            "DELETE FROM durations WHERE path IN ("
+            " SELECT path FROM durations ORDER BY last_access ASC LIMIT ?)",
+            (count - target,),
+        )
+
+
+def _matches(st: os.stat_result, size: int, mtime_ns: int, inode: int) -> bool:
+    """Confronta la firma in cache con lo stat attuale del file."""
+    if st.st_size != size or st.st_mtime_ns != mtime_ns:
+        return False
+    # inode non disponibile su alcuni filesystem (0): in quel caso si ignora
+    if inode and st.st_ino and st.st_ino != inode:
+        return False
+    return True
+
+
+_default_cache: Optional[DurationCache] = None
+_default_cache_failed = False
+_default_cache_lock = threading.Lock()
+
+
+def get_default_cache() -> Optional[DurationCache]:
+    """
+    Cache condivisa nella cartella dati utente (creata al primo uso).
+    Restituisce None se la cartella non è scrivibile.
+    """
+    global _default_cache, _default_cache_failed
+    with _default_cache_lock:
+        if _default_cache is None and not _default_cache_failed:
+            try:
+                _default_cache = DurationCache(user_data_dir() / DURATION_CACHE_FILENAME)
+            except (OSError, sqlite3.Error):
+                _default_cache_failed = True
+        return _default_cache
@@ -13,8 +13,94 @@ MONTHS = [
 DEFAULT_INITIALS = 'IM'
 DEFAULT_PART = ''  # Opzionale - lasciato vuoto di default
 
-# UI debounce (ms)
+# UI debounce (ms): minimo; segue il costo misurato dell'anteprima fino al massimo
 PREVIEW_DEBOUNCE_MS = 300
+PREVIEW_DEBOUNCE_MAX_MS = 1000
+
+# Anteprima in background da questo numero di righe in su (sotto è più
+# rapido calcolarla subito); risultati applicati alla tabella a blocchi
+PREVIEW_ASYNC_MIN_ROWS = 500
+PREVIEW_CHUNK_ROWS = 1000
 
 # CSV separator per Excel ITA
 CSV_SEPARATOR = ';'
+
+# Cache persistente delle durate (SQLite nella cartella dati utente)
+DURATION_CACHE_FILENAME = 'durations.sqlite3'
+DURATION_CACHE_MAX_ENTRIES = 50000
+
+# Probing in background: concorrenza per dispositivo (adattiva)
+PROBE_MAX_WORKERS = 32
+PROBE_INITIAL_DEVICE_CONCURRENCY = 2
+PROBE_MAX_DEVICE_CONCURRENCY = 16
+# Risultati dei probe raccolti e applicati alla tabella a blocchi (ms)
+PROBE_FLUSH_MS = 50
+
+# Velocità mostrata nella barra di stato (file/s): media sugli ultimi N secondi
+THROUGHPUT_WINDOW_SEC = 5.0
+
+# Timeout ffprobe proporzionale alla dimensione del file
+PROBE_TIMEOUT_BASE_SEC = 5.0
+PROBE_TIMEOUT_SEC_PER_GB = 10.0
+PROBE_TIMEOUT_MAX_SEC = 60.0
+
+# Circuit breaker: dopo N timeout consecutivi su un dispositivo ffprobe
+# non viene più lanciato su quel dispositivo per un periodo di pausa
+PROBE_BREAKER_MAX_HANGS = 3
+PROBE_BREAKER_COOLDOWN_SEC = 120.0
+
+# Durata provvisoria da dimensione file: bitrate medio di partenza (byte/s)
+# per estensione, prima di averlo appreso dai probe esatti.
+# AVCHD registra a bitrate quasi costante (~24 Mbps in FX/FH + audio)
+DEFAULT_BYTES_PER_SEC = {'.mts': 3.1e6}
+
+# Ora di inizio dal creation_time del container invece che da mtime - durata
+# (per file copiati dalla scheda con mtime reimpostato)
+DEFAULT_USE_CREATION_TIME = False
+
+# Scansione ricorsiva delle cartelle: le righe arrivano alla tabella a blocchi
+# di al massimo SCAN_BATCH_SIZE file o ogni SCAN_BATCH_MAX_SEC secondi
+SCAN_BATCH_SIZE = 200
+SCAN_BATCH_MAX_SEC = 0.05
+# Profondità massima di default (None = illimitata, 0 = solo la cartella scelta)
+SCAN_DEFAULT_MAX_DEPTH = None
+
+# Caricamento file da share di rete (SMB/NFS): stat concorrenti per
+# nascondere la latenza di rete (una richiesta in volo per worker)
+PREPARE_STAT_WORKERS = 16
+
+# Snapshot dei nomi per cartella (controllo "file target esiste già"):
+# l'mtime della cartella viene ricontrollato al massimo ogni N secondi
+DIR_SNAPSHOT_RECHECK_SEC = 2.0
+# Cartelle osservate al massimo con il watcher del filesystem (oltre: solo mtime)
+DIR_WATCH_MAX = 256
+
+# Anteprima in blocco: sotto questo numero di righe NumPy non conviene
+VECTORIZE_MIN_ROWS = 512
+
+# Convenzione del nome file: {campo} = valore, [ ... ] = sezione omessa se
+# un suo campo è vuoto. Campi: date (YYYYMMDD), time (HHMM), pup, mama,
+# month, year, part, initials. Usata sia per comporre sia per riconoscere
+# i nomi già rinominati (export osservazioni).
+NAME_PATTERN = "{date}_{pup}_{mama}_{month}_{year}_{time}[_{part}]_{initials}"
+
+# Rinomina a due fasi: piano salvabile (JSON) e avanzamento ogni N passi
+RENAME_PLAN_VERSION = 1
+RENAME_PROGRESS_EVERY = 50
+
+# Journal delle rinomine (JSONL nella cartella dati utente): intent scritti
+# e sincronizzati a gruppi prima dei rename, compattato oltre la soglia
+RENAME_JOURNAL_FILENAME = 'rename_journal.jsonl'
+RENAME_JOURNAL_FSYNC_EVERY = 64
+RENAME_JOURNAL_COMPACT_BYTES = 1_000_000
+# Batch annullabili conservati (anche dopo un riavvio)
+RENAME_JOURNAL_MAX_UNDO_BATCHES = 20
+
+# Rinomina in background: thread per le share di rete (in locale uno solo)
+# e rinomine contemporanee al massimo per cartella
+RENAME_MAX_WORKERS = 8
+RENAME_DIR_CONCURRENCY = 4
+
+# Rinomina automatica (opzionale): le righe pronte dopo il probe vengono
+# raccolte per questo intervallo e rinominate in un unico piano
+AUTO_RENAME_BATCH_MS = 250
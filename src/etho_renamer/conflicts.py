@@ -0,0 +1,171 @@
+"""Conflitti di nome: snapshot delle cartelle e collisioni all'interno del batch."""
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from .config import DIR_SNAPSHOT_RECHECK_SEC
+
+
+def _name_key(name: str) -> str:
+    """Chiave di confronto di un nome (case-insensitive dove lo è il filesystem)."""
+    return os.path.normcase(name)
+
+
+class _Snapshot:
+    __slots__ = ("mtime_ns", "names", "checked_at")
+
+    def __init__(self, mtime_ns: int, names: Set[str], checked_at: float):
+        self.mtime_ns = mtime_ns
+        self.names = names
+        self.checked_at = checked_at
+
+
+class DirectoryCache:
+    """
+    Elenco in memoria dei nomi di ogni cartella, per rispondere a
+    "il file target esiste già?" senza uno stat per riga.
+
+    Lo snapshot viene riletto se cambia l'mtime della cartella, controllato
+    al massimo ogni recheck_sec secondi; invalidate() lo scarta subito
+    (es. da un watcher del filesystem). Le rinomine fatte dall'app vengono
+    registrate con note_rename(). Thread-safe.
+    """
+
+    def __init__(self, recheck_sec: float = DIR_SNAPSHOT_RECHECK_SEC):
+        self.recheck_sec = recheck_sec
+        self._lock = threading.Lock()
+        self._snapshots: Dict[str, _Snapshot] = {}
+
+    def exists(self, path: Path) -> bool:
+        """True se path esiste (secondo lo snapshot della sua cartella)."""
+        folder, name = os.path.split(str(path))
+        names = self._names(folder)
+        if names is None:
+            return os.path.exists(path)
+        return _name_key(name) in names
+
+    def listing(self, folder: Path) -> Tuple[Optional[int], Set[str]]:
+        """(mtime_ns, nomi normalizzati) dello snapshot; (None, vuoto) se illeggibile."""
+        key = str(folder)
+        names = self._names(key)
+        if names is None:
+            return None, set()
+        with self._lock:
+            snap = self._snapshots.get(key)
+            mtime_ns = snap.mtime_ns if snap is not None else None
+        return mtime_ns, set(names)
+
+    def invalidate(self, folder: Optional[Path] = None) -> None:
+        """Scarta lo snapshot di folder (o di tutte le cartelle)."""
+        with self._lock:
+            if folder is None:
+                self._snapshots.clear()
+            else:
+                self._snapshots.pop(str(folder), None)
+
+    def note_rename(self, old_path: Path, new_path: Path) -> None:
+        """Aggiorna gli snapshot dopo una rinomina eseguita dall'app."""
+        with self._lock:
+            old_folder, old_name = os.path.split(str(old_path))
+            new_folder, new_name = os.path.split(str(new_path))
+            snap = self._snapshots.get(old_folder)
+            if snap is not None:
+                snap.names.discard(_name_key(old_name))
+            snap = self._snapshots.get(new_folder)
+            if snap is not None:
+                snap.names.add(_name_key(new_name))
+
+    def _names(self, folder: str) -> Optional[Set[str]]:
+        """Nomi della cartella (riletti solo se è cambiata); None se illeggibile."""
+        now = time.monotonic()
+        with self._lock:
+            snap = self._snapshots.get(folder)
+            if snap is not None and now - snap.checked_at < self.recheck_sec:
+                return snap.names
+
+        try:
+            mtime_ns = os.stat(folder).st_mtime_ns
+            if snap is not None and snap.mtime_ns == mtime_ns:
+                names = snap.names
+            else:
+                names = {_name_key(n) for n in os.listdir(folder)}
+        except OSError:
+            self.invalidate(Path(folder))
+            return None
+
+        with self._lock:
+            self._snapshots[folder] = _Snapshot(mtime_ns, names, now)
+        return names
+
+
+class CollisionIndex:
+    """
+    Indice path target -> ID dei file che vi verrebbero rinominati.
+
+    Aggiornato riga per riga durante l'anteprima: due file che producono lo
+    stesso nuovo nome nella stessa cartella vengono segnalati subito, prima
+    che la rinomina fallisca a metà batch.
+    """
+
+    def __init__(self):
+        self._by_target: Dict[str, List[int]] = {}
+        self._target_of: Dict[int, str] = {}
+
+    def set(self, file_id: int, target: Optional[Path]) -> Set[int]:
+        """
+        Registra il target del file (None = nessun nome valido).
+        Restituisce gli altri file il cui stato di collisione può essere
+        cambiato (vecchio e nuovo gruppo).
+        """
+        key = _name_key(str(target)) if target is not None else None
+        old_key = self._target_of.get(file_id)
+        if old_key == key:
+            return set()
+
+        affected: Set[int] = set()
+        if old_key is not None:
+            group = self._by_target[old_key]
+            group.remove(file_id)
+            affected.update(group)
+            if not group:
+                del self._by_target[old_key]
+            del self._target_of[file_id]
+        if key is not None:
+            group = self._by_target.setdefault(key, [])
+            affected.update(group)
+            group.append(file_id)
+            self._target_of[file_id] = key
+        return affected
+
+    def discard(self, file_id: int) -> Set[int]:
+        """Toglie il file dall'indice (es. rimosso dalla tabella)."""
+        return self.set(file_id, None)
+
+    def clear(self) -> None:
+        self._by_target.clear()
+        self._target_of.clear()
+
+    def colliding(self, file_id: int) -> List[int]:
+        """Altri file con lo stesso target (vuota se nessuna collisione)."""
+        key = self._target_of.get(file_id)
+        if key is None:
+            return []
+        return [other for other in self._by_target[key] if other != file_id]
+
+    def targeting(self, path: Path) -> List[int]:
+        """File che verrebbero rinominati in path."""
+        return list(self._by_target.get(_name_key(str(path)), ()))
+
+    def groups(self) -> List[List[int]]:
+        """Gruppi di file in collisione (almeno due per gruppo)."""
+        return [list(group) for group in self._by_target.values() if len(group) > 1]
+
+
+def suggest_parts(file_ids: Iterable[int]) -> Dict[int, str]:
+    """
+    Suffissi PartN da assegnare a un gruppo in collisione, nell'ordine dato
+    (ordine delle righe = ordine cronologico delle riprese).
+    """
+    return {file_id: f"Part{i}" for i, file_id in enumerate(file_ids, start=1)}
@@ -1,16 +1,32 @@
 """Logica principale per rinomina."""
+import os
 import re
+import stat
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
 from datetime import datetime, timedelta
-from typing import Optional, Tuple, List
+from typing import Optional, Tuple, List, Iterable, Union, Callable, Dict
 
-from .models import FileInfo, InputData, InputOverrides, RenameResult, ObservationRecord
-from .config import SUPPORTED_EXTENSIONS
+from .models import (
+    FileInfo, InputData, InputOverrides, RenameResult, ObservationRecord, MediaInfo,
+)
+from .config import SUPPORTED_EXTENSIONS, PREPARE_STAT_WORKERS
+from .naming import compile_template
 
 # Soglia durata osservazione "full" in secondi (15 minuti)
 FULL_OBSERVATION_THRESHOLD_SEC = 15 * 60
 
 
+# Errori di compute_new_filename (condivisi con la versione batch)
+MTIME_MISSING_MSG = "mtime non disponibile"
+DURATION_MISSING_MSG = "Durata non calcolata (ffprobe non disponibile?)"
+
+# Prefisso data YYYYMMDD_ nel nome file originale
+_PREFIX_DATE_RE = re.compile(r'^(\d{4})(\d{2})(\d{2})_')
+
+
 def parse_prefix_date(filename: str) -> Optional[Tuple[int, int, int]]:
     """
     Estrae data dal prefisso YYYYMMDD_ se presente.
@@ -18,7 +34,7 @@ def parse_prefix_date(filename: str) -> Optional[Tuple[int, int, int]]:
 
     Esempio: "20260202_qualcosa.MTS" -> (2026, 2, 2)
     """
-    match = re.match(r'^(\d{4})(\d{2})(\d{2})_', filename)
+    match = _PREFIX_DATE_RE.match(filename)
     if not match:
         return None
 
@@ -26,8 +42,9 @@ def parse_prefix_date(filename: str) -> Optional[Tuple[int, int, int]]:
         year = int(match.group(1))
         month = int(match.group(2))
         day = int(match.group(3))
-        if 1 <= month <= 12 and 1 <= day <= 31:
-            return (year, month, day)
+        # Data di calendario valida (es. 20260231_ non è un prefisso data)
+        datetime(year, month, day)
+        return (year, month, day)
     except ValueError:
         pass
 
@@ -53,6 +70,7 @@ def compute_new_filename(
     file_info: FileInfo,
     input_data: InputData,
     duration_sec: Optional[float],
+    use_creation_time: bool = False,
 ) -> Tuple[Optional[str], str]:
     """
     Calcola il nuovo filename senza side effects.
@@ -60,17 +78,24 @@ def compute_new_filename(
     Restituisce (new_filename_or_none, error_message_or_empty).
 
     Pattern: YYYYMMDD_pupX_NomeMamma_mmm_YY_HHMM_[PartN_]INIZIALI.EXT
+
+    L'ora di inizio è mtime - durata; con use_creation_time=True si usa
+    invece il creation_time del container, se presente (utile per file
+    copiati dalla scheda con mtime reimpostato).
     """
-    if not file_info.mtime:
-        return None, "mtime non disponibile"
+    if use_creation_time and file_info.creation_time:
+        start_time_dt = file_info.creation_time
+    else:
+        if not file_info.mtime:
+            return None, MTIME_MISSING_MSG
 
-    if not duration_sec:
-        return None, "Durata non calcolata (ffprobe non disponibile?)"
+        if not duration_sec:
+            return None, DURATION_MISSING_MSG
 
-    # Calcola ora inizio registrazione
-    mtime_dt = file_info.mtime
-    duration_td = timedelta(seconds=duration_sec)
-    start_time_dt = mtime_dt - duration_td
+        # Calcola ora inizio registrazione
+        mtime_dt = file_info.mtime
+        duration_td = timedelta(seconds=duration_sec)
+        start_time_dt = mtime_dt - duration_td
 
     # Controlla prefisso data nel filename originale
     prefix_date = parse_prefix_date(file_info.original_filename)
@@ -88,35 +113,103 @@ def compute_new_filename(
     yyyymmdd = date_for_name.strftime("%Y%m%d")
     hhmm = date_for_name.strftime("%H%M")
 
-    if input_data.part:
-        new_name = (
-            f"{yyyymmdd}_{input_data.pup}_{input_data.mama_name}"
-            f"_{input_data.month}_{input_data.year}"
-            f"_{hhmm}_{input_data.part}_{input_data.initials}{file_info.extension}"
-        )
-    else:
-        new_name = (
-            f"{yyyymmdd}_{input_data.pup}_{input_data.mama_name}"
-            f"_{input_data.month}_{input_data.year}"
-            f"_{hhmm}_{input_data.initials}{file_info.extension}"
-        )
+    return format_new_filename(yyyymmdd, hhmm, input_data, file_info.extension), ""
+
+
+def format_new_filename(yyyymmdd: str, hhmm: str, input_data: InputData, extension: str) -> str:
+    """Compone il nome secondo NAME_PATTERN (YYYYMMDD_pupX_NomeMamma_mmm_YY_HHMM_[PartN_]INIZIALI.EXT)"""
+    return compile_template().format(yyyymmdd, hhmm, input_data, extension)
 
-    return new_name, ""
+
+def apply_media_info(file_info: FileInfo, info: MediaInfo) -> None:
+    """Copia sul FileInfo i metadati letti dal probe (durata esatta inclusa)."""
+    file_info.duration_sec = info.duration_sec
+    file_info.duration_provisional = False
+    file_info.creation_time = info.creation_time
+    file_info.codec = info.codec
+    file_info.width = info.width
+    file_info.height = info.height
+    file_info.fps = info.fps
+    file_info.bit_rate = info.bit_rate
 
 
 def prepare_file_info(file_path: Path) -> Tuple[Optional[FileInfo], str]:
     """
     Prepara FileInfo da un path.
-    Controlla se il file esiste, ha estensione valida ed estrae mtime.
+    Controlla se il file ha estensione valida, esiste ed estrae mtime
+    (un solo stat()).
 
     Restituisce (FileInfo, "") oppure (None, errore).
     """
-    if not file_path.exists():
-        return None, f"File non esiste: {file_path}"
+    return _prepare_from_stat(file_path, lambda: os.stat(file_path))
 
-    if not file_path.is_file():
-        return None, f"Non è un file: {file_path}"
 
+def prepare_file_infos(
+    items: Iterable[Union[Path, os.DirEntry]],
+    max_workers: int = PREPARE_STAT_WORKERS,
+) -> Tuple[List[FileInfo], List[Tuple[Path, str]]]:
+    """
+    Versione batch di prepare_file_info per path o os.DirEntry (es. da
+    scan_videos), con al massimo uno stat() per file.
+
+    Per i DirEntry si usa il loro stat() (su Windows già in cache dalla
+    scansione, nessuna chiamata al filesystem). Gli stat rimanenti su
+    share di rete (UNC, unità mappate, mount NFS/SMB) partono in parallelo
+    su max_workers thread, così la latenza di rete si paga una volta sola.
+
+    Restituisce (FileInfo nell'ordine di input, [(path, errore)]).
+    """
+    results: List[Optional[Tuple[Optional[FileInfo], str]]] = []
+    paths: List[Path] = []
+    remote_jobs: List[Tuple[int, Path, Callable[[], os.stat_result]]] = []
+    remote_dirs: Dict[str, bool] = {}
+
+    for item in items:
+        if isinstance(item, os.DirEntry):
+            path = Path(item.path)
+            stat_func = item.stat
+            cached = sys.platform.startswith("win")
+        else:
+            path = Path(item)
+            stat_func = (lambda p=path: os.stat(p))
+            cached = False
+
+        index = len(paths)
+        paths.append(path)
+        parent = os.path.dirname(str(path))
+        if parent not in remote_dirs:
+            remote_dirs[parent] = is_remote_path(parent)
+
+        if (not cached and remote_dirs[parent] and max_workers > 1
+                and path.suffix.lower() in SUPPORTED_EXTENSIONS):
+            results.append(None)
+            remote_jobs.append((index, path, stat_func))
+        else:
+            results.append(_prepare_from_stat(path, stat_func))
+
+    if remote_jobs:
+        workers = min(max_workers, len(remote_jobs))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="stat") as executor:
+            done = executor.map(lambda job: _prepare_from_stat(job[1], job[2]), remote_jobs)
+            for (index, _, _), result in zip(remote_jobs, done):
+                results[index] = result
+
+    file_infos: List[FileInfo] = []
+    errors: List[Tuple[Path, str]] = []
+    for path, (file_info, err) in zip(paths, results):
+        if err:
+            errors.append((path, err))
+        else:
+            file_infos.append(file_info)
+    return file_infos, errors
+
+
+def _prepare_from_stat(
+    file_path: Path,
+    stat_func: Callable[[], os.stat_result],
+) -> Tuple[Optional[FileInfo], str]:
+    """FileInfo da un solo stat (stat_func); stessi errori di prepare_file_info."""
+    # Estensione prima dello stat: nessuna richiesta al filesystem per i file scartati
     ext = file_path.suffix.lower()
     if ext not in SUPPORTED_EXTENSIONS:
         return None, (
@@ -125,21 +218,86 @@ def prepare_file_info(file_path: Path) -> Tuple[Optional[FileInfo], str]:
         )
 
     try:
-        mtime_ts = file_path.stat().st_mtime
-        mtime_dt = datetime.fromtimestamp(mtime_ts)
+        st = stat_func()
+    except FileNotFoundError:
+        return None, f"File non esiste: {file_path}"
     except Exception as e:
         return None, f"Errore lettura mtime: {str(e)}"
 
+    if not stat.S_ISREG(st.st_mode):
+        return None, f"Non è un file: {file_path}"
+
+    try:
+        mtime_dt = datetime.fromtimestamp(st.st_mtime)
+    except (OverflowError, OSError, ValueError) as e:
+        return None, f"Errore lettura mtime: {str(e)}"
+
     file_info = FileInfo(
         path=file_path,
         original_filename=file_path.name,
         extension=ext,
         mtime=mtime_dt,
+        size_bytes=st.st_size,
     )
 
     return file_info, ""
 
 
+# Filesystem di rete nelle tabelle di mount Linux
+_REMOTE_FS_TYPES = {
+    "nfs", "nfs4", "cifs", "smb3", "smbfs", "fuse.sshfs", "sshfs",
+    "afpfs", "9p", "ceph", "glusterfs", "fuse.glusterfs", "davfs", "fuse.rclone",
+}
+
+
+def is_remote_path(folder: str) -> bool:
+    """Euristica: True se folder sta su una share di rete (UNC, unità mappata, NFS/SMB)."""
+    if sys.platform.startswith("win"):
+        if folder.startswith(("\\\\", "//")):
+            return True
+        drive = os.path.splitdrive(os.path.abspath(folder))[0]
+        return bool(drive) and _windows_drive_is_remote(drive)
+
+    mounts = _linux_mounts()
+    if not mounts:
+        return False
+    folder = os.path.abspath(folder)
+    best, fstype = "", ""
+    for mountpoint, mount_fstype in mounts:
+        if (folder == mountpoint or folder.startswith(mountpoint.rstrip("/") + "/")) \
+                and len(mountpoint) > len(best):
+            best, fstype = mountpoint, mount_fstype
+    return fstype in _REMOTE_FS_TYPES
+
+
+@lru_cache(maxsize=32)
+def _windows_drive_is_remote(drive: str) -> bool:
+    """GetDriveTypeW == DRIVE_REMOTE per un'unità mappata (es. "Z:")."""
+    try:
+        import ctypes
+        DRIVE_REMOTE = 4
+        return ctypes.windll.kernel32.GetDriveTypeW(drive + "\\") == DRIVE_REMOTE
+    except (OSError, AttributeError):
+        return False
+
+
+@lru_cache(maxsize=1)
+def _linux_mounts() -> Tuple[Tuple[str, str], ...]:
+    """(mountpoint, fstype) da /proc/self/mounts; vuoto se non disponibile."""
+    try:
+        with open("/proc/self/mounts", encoding="utf-8", errors="replace") as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return ()
+    mounts = []
+    for line in lines:
+        fields = line.split()
+        if len(fields) >= 3:
+            # Gli spazi nei mountpoint sono codificati come \040
+            mounts.append((fields[1].replace("\\040", " "), fields[2]))
+    return tuple(mounts)
+
+
 def handle_rename(
     file_info: FileInfo,
     new_filename: str,
@@ -216,7 +374,7 @@ def extract_observation_from_file(
     """
     Estrae informazioni di osservazione dal nome file rinominato.
 
-    Pattern atteso: YYYYMMDD_pupX_NomeMamma_mmm_YY_HHMM_[PartN_]INIZIALI.EXT
+    Pattern atteso: NAME_PATTERN (YYYYMMDD_pupX_NomeMamma_mmm_YY_HHMM_[PartN_]INIZIALI.EXT)
 
     Il numero della parte (N in PartN) determina quale colonna partN compilare.
     L'activity viene auto-calcolata dalla durata del singolo file:
@@ -227,24 +385,18 @@ def extract_observation_from_file(
 
     filename = file_path.stem
 
-    # Pattern esteso: cattura il numero della parte
-    pattern = (
-        r'^(\d{8})_(\w+)_([^_]+)_([a-z]{3})_(\d{2})_(\d{4})'
-        r'(?:_Part(\d+))?_([A-Z]+)$'
-    )
-    match = re.match(pattern, filename)
-
-    if not match:
+    fields = compile_template().parse(filename)
+    if fields is None:
         return None
 
-    yyyymmdd = match.group(1)
-    pup_code = match.group(2)
-    mama_name = match.group(3)
-    month = match.group(4)
-    year = match.group(5)
-    hhmm = match.group(6)
-    part_num = match.group(7)   # può essere None se non c'è PartN
-    initials = match.group(8)
+    yyyymmdd = fields.get("date", "")
+    pup_code = fields.get("pup", "")
+    mama_name = fields.get("mama", "")
+    month = fields.get("month", "")
+    year = fields.get("year", "")
+    hhmm = fields.get("time", "")
+    part_num = fields.get("part", "")[len("Part"):]   # "" se non c'è PartN
+    initials = fields.get("initials", "")
 
     date_str = f"{yyyymmdd[0:4]}/{yyyymmdd[4:6]}/{yyyymmdd[6:8]}"
     time_str = f"{hhmm[0:2]}:{hhmm[2:4]}"
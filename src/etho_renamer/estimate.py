@@ -0,0 +1,87 @@
+"""Durate provvisorie stimate da dimensione file e bitrate appreso per camera."""
+import re
+import threading
+from pathlib import Path
+from typing import Optional, Dict, Tuple, Iterable
+
+from .models import FileInfo
+from .config import DEFAULT_BYTES_PER_SEC
+
+# Prefisso alfabetico del nome file (es. "GOPR", "MVI_", "DSC"): identifica la camera
+_PREFIX_RE = re.compile(r'^([A-Za-z_]+)')
+
+
+def _camera_keys(path: Path, extension: str) -> Tuple[tuple, ...]:
+    """Chiavi del modello, dalla più specifica alla più generica."""
+    ext = extension.lower()
+    keys = [("dir", str(path.parent), ext)]
+    match = _PREFIX_RE.match(path.name)
+    if match:
+        keys.append(("prefix", match.group(1).upper(), ext))
+    keys.append(("ext", ext))
+    return tuple(keys)
+
+
+class BitrateModel:
+    """
+    Bitrate medio (byte/s) appreso dai probe esatti, per cartella, per
+    prefisso del nome file (≈ camera) e per estensione.
+
+    estimate() usa la chiave più specifica con dati; in mancanza di dati
+    ricade sul bitrate di default dell'estensione (DEFAULT_BYTES_PER_SEC).
+    Thread-safe: learn() viene chiamato dai worker di probing.
+    """
+
+    def __init__(self, defaults: Optional[Dict[str, float]] = None):
+        self.defaults = dict(DEFAULT_BYTES_PER_SEC if defaults is None else defaults)
+        self._lock = threading.Lock()
+        # chiave -> [byte totali, secondi totali]
+        self._totals: Dict[tuple, list] = {}
+
+    def learn(self, path: Path, extension: str, size_bytes: int, duration_sec: float) -> None:
+        """Registra una coppia (dimensione, durata esatta)."""
+        if not size_bytes or not duration_sec or duration_sec <= 0:
+            return
+        with self._lock:
+            for key in _camera_keys(path, extension):
+                totals = self._totals.setdefault(key, [0, 0.0])
+                totals[0] += size_bytes
+                totals[1] += duration_sec
+
+    def learn_many(self, samples: Iterable[Tuple[Path, int, float]]) -> None:
+        """Registra più campioni (path, dimensione, durata), es. dalla cache."""
+        for path, size_bytes, duration_sec in samples:
+            self.learn(path, path.suffix, size_bytes, duration_sec)
+
+    def bytes_per_sec(self, path: Path, extension: str) -> Optional[float]:
+        """Bitrate da usare per il file, o None se non c'è nessuna base."""
+        with self._lock:
+            for key in _camera_keys(path, extension):
+                totals = self._totals.get(key)
+                if totals and totals[1] > 0:
+                    return totals[0] / totals[1]
+        return self.defaults.get(extension.lower())
+
+    def estimate(self, file_info: FileInfo) -> Optional[float]:
+        """Durata stimata (secondi) dalla dimensione del file, o None."""
+        if not file_info.size_bytes:
+            return None
+        rate = self.bytes_per_sec(file_info.path, file_info.extension)
+        if not rate:
+            return None
+        return file_info.size_bytes / rate
+
+
+def apply_provisional_duration(file_info: FileInfo, model: BitrateModel) -> bool:
+    """
+    Imposta una durata provvisoria se la durata esatta non è ancora nota.
+    Restituisce True se è stata applicata una stima.
+    """
+    if file_info.duration_sec is not None and not file_info.duration_provisional:
+        return False
+    estimate = model.estimate(file_info)
+    if estimate is None:
+        return False
+    file_info.duration_sec = estimate
+    file_info.duration_provisional = True
+    return True
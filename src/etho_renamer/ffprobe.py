@@ -1,9 +1,24 @@
-"""Wrapper per ffprobe con gestione errori."""
+"""Wrapper per ffprobe con gestione errori e catena di backend di probing."""
+import os
 import subprocess
 import json
+import re
 import shutil
+import threading
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime
 from pathlib import Path
-from typing import Optional, Tuple
+from typing import Optional, Tuple, List, Dict
+
+from .config import (
+    PROBE_TIMEOUT_BASE_SEC, PROBE_TIMEOUT_SEC_PER_GB, PROBE_TIMEOUT_MAX_SEC,
+    PROBE_BREAKER_MAX_HANGS, PROBE_BREAKER_COOLDOWN_SEC,
+)
+from .models import CancelToken, MediaInfo
+from .cache import DurationCache, get_default_cache
+from .mp4 import MP4_EXTENSIONS, read_mp4_info
+from .mpegts import TS_EXTENSIONS, read_ts_duration
 
 
 def find_ffprobe() -> Optional[str]:
@@ -32,53 +47,462 @@ def find_ffprobe() -> Optional[str]:
     return None
 
 
-def get_duration(file_path: Path) -> Tuple[Optional[float], Optional[str]]:
+class ProbeBackend(ABC):
+    """
+    Backend di probing dei metadati (durata, creation_time, codec...).
+
+    probe() restituisce (MediaInfo, None) se riesce, (None, None) se il file
+    non è di sua competenza, (None, errore) se fallisce.
+    token: annullamento opzionale (i backend lenti devono rispettarlo).
     """
-    Usa ffprobe per ottenere durata video in secondi.
+    name = "backend"
+
+    @abstractmethod
+    def probe(
+        self,
+        file_path: Path,
+        token: Optional[CancelToken] = None,
+    ) -> Tuple[Optional[MediaInfo], Optional[str]]:
+        """Metadati del file (vedi la docstring della classe)."""
+
+    def store(self, file_path: Path, info: MediaInfo) -> None:
+        """Riceve i metadati trovati da un altro backend (es. per la cache)."""
+
+
+class CacheBackend(ProbeBackend):
+    """Cache persistente SQLite di durate e metadati."""
+    name = "cache"
+
+    def __init__(self, cache: DurationCache):
+        self.cache = cache
+
+    def probe(self, file_path: Path, token=None) -> Tuple[Optional[MediaInfo], Optional[str]]:
+        return self.cache.get_info(file_path), None
+
+    def store(self, file_path: Path, info: MediaInfo) -> None:
+        self.cache.put_info(file_path, info)
+
+
+class Mp4Backend(ProbeBackend):
+    """Lettore nativo del box mvhd (MP4/MOV): durata e creation_time."""
+    name = "mp4"
+
+    def probe(self, file_path: Path, token=None) -> Tuple[Optional[MediaInfo], Optional[str]]:
+        if file_path.suffix.lower() not in MP4_EXTENSIONS:
+            return None, None
+        return read_mp4_info(file_path), None
+
+
+class TsBackend(ProbeBackend):
+    """Scanner nativo di PTS/PCR (MTS/M2TS/TS): solo durata."""
+    name = "mpegts"
+
+    def probe(self, file_path: Path, token=None) -> Tuple[Optional[MediaInfo], Optional[str]]:
+        if file_path.suffix.lower() not in TS_EXTENSIONS:
+            return None, None
+        duration = read_ts_duration(file_path)
+        if duration is None:
+            return None, None
+        return MediaInfo(duration_sec=duration), None
+
+
+# Messaggio restituito quando un probe viene annullato
+PROBE_CANCELLED = "Probe annullato"
+
+_resolve_lock = threading.Lock()
+_resolved: Optional[Tuple[Optional[str], Optional[str]]] = None
+
+
+def resolve_ffprobe(refresh: bool = False) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Trova ffprobe e ne verifica la versione una sola volta per processo.
+    Restituisce (percorso, versione) oppure (None, None) se non disponibile.
+    refresh=True ripete la ricerca (es. dopo aver copiato ffprobe in ./bin).
+    """
+    global _resolved
+    with _resolve_lock:
+        if _resolved is None or refresh:
+            path = find_ffprobe()
+            version = _ffprobe_version(path) if path else None
+            _resolved = (path, version) if version else (None, None)
+        return _resolved
+
+
+def _ffprobe_version(ffprobe_path: str) -> Optional[str]:
+    """Esegue `ffprobe -version`; restituisce la versione o None se non eseguibile."""
+    try:
+        result = subprocess.run(
+            [ffprobe_path, "-version"],
+            capture_output=True,
+            text=True,
+            timeout=10,
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    if result.returncode != 0:
+        return None
+    match = re.search(r"ffprobe version (\S+)", result.stdout)
+    return match.group(1) if match else "unknown"
+
+
+def probe_timeout(size_bytes: int) -> float:
+    """Timeout ffprobe in secondi, proporzionale alla dimensione del file."""
+    timeout = PROBE_TIMEOUT_BASE_SEC + PROBE_TIMEOUT_SEC_PER_GB * size_bytes / 1e9
+    return min(timeout, PROBE_TIMEOUT_MAX_SEC)
+
+
+class CircuitBreaker:
+    """
+    Interruttore per dispositivo: dopo max_hangs timeout consecutivi
+    si "apre" e blocca i nuovi ffprobe su quel dispositivo per cooldown
+    secondi; poi lascia passare un tentativo di prova.
+    """
+
+    def __init__(
+        self,
+        max_hangs: int = PROBE_BREAKER_MAX_HANGS,
+        cooldown_sec: float = PROBE_BREAKER_COOLDOWN_SEC,
+    ):
+        self.max_hangs = max_hangs
+        self.cooldown_sec = cooldown_sec
+        self._lock = threading.Lock()
+        self._hangs: Dict[int, int] = {}
+        self._open_until: Dict[int, float] = {}
+
+    def allow(self, device: int) -> bool:
+        """True se si può lanciare ffprobe sul dispositivo."""
+        with self._lock:
+            until = self._open_until.get(device)
+            if until is None:
+                return True
+            if time.monotonic() >= until:
+                # Half-open: un tentativo, riapre subito se va di nuovo in timeout
+                del self._open_until[device]
+                self._hangs[device] = self.max_hangs - 1
+                return True
+            return False
+
+    def record_hang(self, device: int) -> None:
+        with self._lock:
+            hangs = self._hangs.get(device, 0) + 1
+            self._hangs[device] = hangs
+            if hangs >= self.max_hangs:
+                self._open_until[device] = time.monotonic() + self.cooldown_sec
+
+    def record_ok(self, device: int) -> None:
+        with self._lock:
+            self._hangs.pop(device, None)
+            self._open_until.pop(device, None)
+
+
+class FfprobeBackend(ProbeBackend):
+    """
+    ffprobe esterno: in un solo passaggio legge durata, bitrate e
+    creation_time del container e codec/risoluzione/fps del primo stream
+    video, con timeout proporzionale alla dimensione del file e circuit
+    breaker per dispositivo.
+    """
+    name = "ffprobe"
+
+    def __init__(self, breaker: Optional[CircuitBreaker] = None):
+        self.breaker = breaker or CircuitBreaker()
+
+    def probe(
+        self,
+        file_path: Path,
+        token: Optional[CancelToken] = None,
+    ) -> Tuple[Optional[MediaInfo], Optional[str]]:
+        ffprobe_path, _ = resolve_ffprobe()
+        if not ffprobe_path:
+            return None, "ffprobe non trovato. Installa ffmpeg o copia ffprobe.exe in ./bin"
+
+        try:
+            st = os.stat(file_path)
+        except OSError as e:
+            return None, f"Errore lettura file: {str(e)}"
+
+        if not self.breaker.allow(st.st_dev):
+            return None, "ffprobe sospeso su questo dispositivo (troppi timeout)"
+
+        timeout = probe_timeout(st.st_size)
+        info, error, hung = _probe_media(ffprobe_path, file_path, timeout, token)
+        if hung:
+            self.breaker.record_hang(st.st_dev)
+        elif not (token is not None and token.cancelled):
+            self.breaker.record_ok(st.st_dev)
+        return info, error
+
+
+def default_backends(cache: Optional[DurationCache] = None) -> List[ProbeBackend]:
+    """Catena standard: cache, lettori nativi, ffprobe."""
+    backends: List[ProbeBackend] = []
+    if cache is not None:
+        backends.append(CacheBackend(cache))
+    backends.extend([Mp4Backend(), TsBackend(), FfprobeBackend()])
+    return backends
+
+
+class ProbeEngine:
+    """
+    Catena ordinata di backend di probing con contatori per backend.
+
+    Il primo backend che restituisce i metadati vince; vengono poi passati
+    a store() di tutti i backend precedenti (es. la cache).
+    Thread-safe: un'unica istanza è condivisa da UI e strumenti batch.
+    """
+
+    def __init__(self, backends: Optional[List[ProbeBackend]] = None):
+        self.backends = backends if backends is not None else default_backends(get_default_cache())
+        self._lock = threading.Lock()
+        self._stats: Dict[str, dict] = {
+            b.name: {"calls": 0, "successes": 0, "failures": 0, "total_sec": 0.0}
+            for b in self.backends
+        }
+
+    def probe(
+        self,
+        file_path: Path,
+        token: Optional[CancelToken] = None,
+        full: bool = False,
+        need_creation_time: bool = False,
+    ) -> Tuple[Optional[MediaInfo], Optional[str]]:
+        """
+        Metadati del file dal primo backend che riesce.
+        full=True accetta solo risultati completi (codec, risoluzione, fps,
+        bitrate): i lettori nativi vengono saltati e si usa ffprobe.
+        need_creation_time=True salta solo i risultati parziali senza
+        creation_time (MP4/MOV con mvhd datato restano sul lettore nativo).
+        Se nessun backend dà un risultato completo (es. ffprobe assente)
+        si usa il primo parziale, così la durata non va persa.
+        token: annulla il probe (termina anche un ffprobe in corso).
+        Restituisce (MediaInfo, None) oppure (None, messaggio_errore).
+        """
+        last_error = None
+        partial: Optional[Tuple[int, MediaInfo]] = None
+        for i, backend in enumerate(self.backends):
+            if token is not None and token.cancelled:
+                return None, PROBE_CANCELLED
+            t0 = time.perf_counter()
+            try:
+                info, error = backend.probe(file_path, token)
+            except Exception as e:
+                info, error = None, f"Errore {backend.name}: {str(e)}"
+            found = info is not None and info.duration_sec is not None
+            ok = found and (
+                info.complete
+                or not (full or (need_creation_time and info.creation_time is None))
+            )
+            self._record(backend.name, ok, time.perf_counter() - t0)
+
+            if ok:
+                for previous in self.backends[:i]:
+                    previous.store(file_path, info)
+                return info, None
+            if found and partial is None:
+                partial = (i, info)
+            if error:
+                last_error = error
+
+        if partial is not None:
+            i, info = partial
+            for previous in self.backends[:i]:
+                previous.store(file_path, info)
+            return info, None
+        return None, last_error or "Durata non trovata nei metadati"
+
+    def get_duration(
+        self,
+        file_path: Path,
+        token: Optional[CancelToken] = None,
+    ) -> Tuple[Optional[float], Optional[str]]:
+        """
+        Durata video in secondi dal primo backend che riesce.
+        Restituisce (durata_float, None) oppure (None, messaggio_errore).
+        """
+        info, error = self.probe(file_path, token)
+        if info is None:
+            return None, error
+        return info.duration_sec, None
+
+    def _record(self, name: str, success: bool, elapsed: float) -> None:
+        with self._lock:
+            st = self._stats[name]
+            st["calls"] += 1
+            st["successes" if success else "failures"] += 1
+            st["total_sec"] += elapsed
+
+    def stats(self) -> Dict[str, dict]:
+        """Per backend: chiamate, successi, fallimenti e latenza media (ms)."""
+        with self._lock:
+            return {
+                name: {
+                    **st,
+                    "avg_ms": (st["total_sec"] / st["calls"] * 1000) if st["calls"] else 0.0,
+                }
+                for name, st in self._stats.items()
+            }
+
+    @property
+    def ffprobe_version(self) -> Optional[str]:
+        """Versione di ffprobe rilevata (None se non disponibile)."""
+        return resolve_ffprobe()[1]
+
+
+_default_engine: Optional[ProbeEngine] = None
+_default_engine_lock = threading.Lock()
+
+
+def get_default_engine() -> ProbeEngine:
+    """Istanza condivisa di ProbeEngine (cache utente + lettori nativi + ffprobe)."""
+    global _default_engine
+    with _default_engine_lock:
+        if _default_engine is None:
+            _default_engine = ProbeEngine()
+        return _default_engine
+
+
+def get_duration(
+    file_path: Path,
+    use_cache: bool = True,
+    cache: Optional[DurationCache] = None,
+) -> Tuple[Optional[float], Optional[str]]:
+    """
+    Restituisce la durata video in secondi, dalla cache persistente se il
+    file non è cambiato, altrimenti con i lettori nativi (MP4/MOV, MTS) o
+    tramite ffprobe (e la salva in cache).
     Restituisce (durata_float, errore_string).
     
+    Con i parametri di default usa il ProbeEngine condiviso.
+    cache: cache da usare al posto di quella condivisa nella cartella utente.
     Se non riesce, restituisce (None, messaggio_errore).
     """
-    ffprobe_path = find_ffprobe()
-    if not ffprobe_path:
-        return None, "ffprobe non trovato. Installa ffmpeg o copia ffprobe.exe in ./bin"
-    
+    if use_cache and cache is None:
+        return get_default_engine().get_duration(file_path)
+    engine = ProbeEngine(default_backends(cache if use_cache else None))
+    return engine.get_duration(file_path)
+
+
+def _probe_media(
+    ffprobe_path: str,
+    file_path: Path,
+    timeout: float,
+    token: Optional[CancelToken] = None,
+) -> Tuple[Optional[MediaInfo], Optional[str], bool]:
+    """
+    Esegue ffprobe una volta chiedendo formato e primo stream video.
+    Restituisce (metadati, errore, andato_in_timeout).
+    """
     try:
-        # Comando ffprobe
+        # Comando ffprobe: solo i campi necessari, primo stream video
         cmd = [
             ffprobe_path,
             "-v", "error",
             "-print_format", "json",
-            "-show_format",
-            "-show_streams",
+            "-select_streams", "v:0",
+            "-show_entries", _SHOW_ENTRIES,
             str(file_path)
         ]
         
-        result = subprocess.run(
+        proc = subprocess.Popen(
             cmd,
-            capture_output=True,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
             text=True,
-            timeout=10
         )
+        if token is not None and not token.register(proc):
+            proc.kill()
+            proc.communicate()
+            return None, PROBE_CANCELLED, False
+        try:
+            stdout, stderr = proc.communicate(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.communicate()
+            return None, f"ffprobe timeout dopo {timeout:.0f}s (file corrotto?)", True
+        finally:
+            if token is not None:
+                token.unregister(proc)
+
+        if token is not None and token.cancelled:
+            return None, PROBE_CANCELLED, False
         
-        if result.returncode != 0:
-            return None, f"ffprobe error: {result.stderr}"
+        if proc.returncode != 0:
+            return None, f"ffprobe error: {stderr}", False
         
-        data = json.loads(result.stdout)
+        data = json.loads(stdout)
+        fmt = data.get('format') or {}
         
         # Estrai durata da format.duration
-        if 'format' in data and 'duration' in data['format']:
-            try:
-                duration = float(data['format']['duration'])
-                return duration, None
-            except (ValueError, TypeError):
-                return None, "Impossibile parsare durata dal formato"
-        
-        return None, "Durata non trovata nei metadati"
+        if 'duration' not in fmt:
+            return None, "Durata non trovata nei metadati", False
+        try:
+            duration = float(fmt['duration'])
+        except (ValueError, TypeError):
+            return None, "Impossibile parsare durata dal formato", False
+
+        streams = data.get('streams') or []
+        video = streams[0] if streams else {}
+        info = MediaInfo(
+            duration_sec=duration,
+            creation_time=_parse_creation_time(
+                (fmt.get('tags') or {}).get('creation_time')
+                or (video.get('tags') or {}).get('creation_time')
+            ),
+            codec=video.get('codec_name'),
+            width=_parse_int(video.get('width')),
+            height=_parse_int(video.get('height')),
+            fps=_parse_rate(video.get('avg_frame_rate')) or _parse_rate(video.get('r_frame_rate')),
+            bit_rate=_parse_int(fmt.get('bit_rate')),
+            complete=True,
+        )
+        return info, None, False
     
     except json.JSONDecodeError:
-        return None, "Errore parsing JSON da ffprobe"
-    except subprocess.TimeoutExpired:
-        return None, "ffprobe timeout (file troppo grande?)"
+        return None, "Errore parsing JSON da ffprobe", False
     except Exception as e:
-        return None, f"Errore ffprobe: {str(e)}"
+        return None, f"Errore ffprobe: {str(e)}", False
+
+
+# Campi chiesti a ffprobe (formato + primo stream video, con i tag creation_time)
+_SHOW_ENTRIES = (
+    "format=duration,bit_rate:format_tags=creation_time:"
+    "stream=codec_name,width,height,avg_frame_rate,r_frame_rate:"
+    "stream_tags=creation_time"
+)
+
+
+def _parse_int(value) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _parse_rate(value: Optional[str]) -> Optional[float]:
+    """Frame rate ffprobe ("30000/1001") in fps; None per "0/0" o valori non validi."""
+    if not value:
+        return None
+    num, _, den = value.partition("/")
+    try:
+        rate = float(num) / float(den or 1)
+    except (ValueError, ZeroDivisionError):
+        return None
+    return rate if rate > 0 else None
+
+
+def _parse_creation_time(value: Optional[str]) -> Optional[datetime]:
+    """
+    Tag creation_time ISO 8601 ("2026-02-02T09:15:00.000000Z") in ora locale.
+    Senza fuso orario il valore viene preso così com'è.
+    """
+    if not value:
+        return None
+    try:
+        dt = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if dt.tzinfo is not None:
+        dt = dt.astimezone().replace(tzinfo=None)
+    if dt.year < 1971:
+        return None
+    return dt
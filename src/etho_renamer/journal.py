@@ -0,0 +1,384 @@
+"""Journal write-ahead delle rinomine (JSONL): recupero dopo un crash e undo persistente."""
+import json
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from .config import (
+    RENAME_JOURNAL_FILENAME, RENAME_JOURNAL_FSYNC_EVERY,
+    RENAME_JOURNAL_COMPACT_BYTES, RENAME_JOURNAL_MAX_UNDO_BATCHES,
+)
+from .models import RenameOperation
+
+# Stati di un batch ricostruiti dal journal
+BATCH_OPEN = "open"            # rinomina in corso (o interrotta)
+BATCH_COMMITTED = "committed"  # completata: annullabile
+BATCH_UNDOING = "undoing"      # undo in corso (o interrotto)
+BATCH_CLOSED = "closed"        # annullata o ripristinata: solo storico
+
+
+class JournalBatch:
+    """Batch letto dal journal: passi previsti, passi confermati e stato."""
+
+    def __init__(self, batch_id: int):
+        self.batch_id = batch_id
+        self.state = BATCH_OPEN
+        # seq -> (da, a, temporaneo, identità del file spostato)
+        self.steps: Dict[int, Tuple[Path, Path, bool, Optional[Tuple[int, int, int]]]] = {}
+        self.done: set = set()
+        self.timestamp: Optional[datetime] = None
+
+    def operations(self) -> List[RenameOperation]:
+        """Passi confermati, in ordine, come RenameOperation (per l'undo)."""
+        return [
+            RenameOperation(
+                from_path=src, to_path=dst,
+                timestamp=self.timestamp or datetime.now(),
+                message="temporaneo" if temporary else "",
+                batch_id=self.batch_id,
+                seq=seq,
+            )
+            for seq, (src, dst, temporary, _) in sorted(self.steps.items())
+            if seq in self.done
+        ]
+
+
+def file_fingerprint(path: Path) -> Optional[Tuple[int, int, int]]:
+    """
+    Identità del file (size, mtime_ns, inode), invariata da una rinomina;
+    None se il file non c'è. Serve a capire, dopo un crash, se un passo è
+    stato eseguito: il file giusto si trova nel target.
+    """
+    try:
+        st = os.lstat(path)
+    except OSError:
+        return None
+    return (st.st_size, st.st_mtime_ns, st.st_ino)
+
+
+class RenameJournal:
+    """
+    Journal append-only delle rinomine.
+
+    Gli "intent" di un batch vengono scritti e sincronizzati (fsync) prima
+    del primo rename; ogni passo eseguito viene confermato con "done",
+    portato su disco a gruppi di fsync_every. Per il recupero dopo un
+    crash non servono i "done": ogni intent porta l'identità del file
+    (file_fingerprint), confrontata con il file che si trova nel target.
+
+    Record: begin, intent, done, commit, undo, undone, reverted (passo
+    annullato in un undo parziale), rolledback, replay (uno per riga).
+    Thread-safe.
+    """
+
+    def __init__(self, journal_path: Path, fsync_every: int = RENAME_JOURNAL_FSYNC_EVERY):
+        self.journal_path = Path(journal_path)
+        self.fsync_every = max(1, fsync_every)
+        self._lock = threading.Lock()
+        self.journal_path.parent.mkdir(parents=True, exist_ok=True)
+        self._batches = self._read()
+        self._next_id = max(self._batches, default=0) + 1
+        self._file = open(self.journal_path, "a", encoding="utf-8")
+        self._buffer: List[str] = []
+        self.compact_if_needed()
+
+    # ── Scrittura ────────────────────────────────────────────────────────────
+
+    def _append(self, record: dict) -> None:
+        self._buffer.append(json.dumps(record, ensure_ascii=False))
+
+    def flush(self) -> None:
+        """Scrive i record in attesa e li porta su disco (fsync)."""
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self) -> None:
+        if not self._buffer:
+            return
+        self._file.write("\n".join(self._buffer) + "\n")
+        self._buffer.clear()
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def begin(self) -> int:
+        """Apre un nuovo batch di rinomina e ne restituisce l'ID."""
+        with self._lock:
+            batch_id = self._next_id
+            self._next_id += 1
+            batch = self._batches[batch_id] = JournalBatch(batch_id)
+            batch.timestamp = datetime.now()
+            self._append({"t": "begin", "batch": batch_id, "ts": batch.timestamp.isoformat()})
+            return batch_id
+
+    def intend(
+        self,
+        batch_id: int,
+        seq: int,
+        src: Path,
+        dst: Path,
+        temporary: bool = False,
+        fingerprint: Optional[Tuple[int, int, int]] = None,
+    ) -> None:
+        """
+        Registra un passo previsto (va su disco con il prossimo flush).
+        fingerprint: file_fingerprint() del file che il passo sposta.
+        """
+        with self._lock:
+            self._batches[batch_id].steps[seq] = (Path(src), Path(dst), temporary, fingerprint)
+            self._append(self._intent_record(batch_id, seq, src, dst, temporary, fingerprint))
+
+    @staticmethod
+    def _intent_record(batch_id, seq, src, dst, temporary, fingerprint) -> dict:
+        record = {"t": "intent", "batch": batch_id, "seq": seq,
+                  "from": str(src), "to": str(dst)}
+        if temporary:
+            record["tmp"] = True
+        if fingerprint is not None:
+            record["id"] = list(fingerprint)
+        return record
+
+    def done(self, batch_id: int, seq: int) -> None:
+        """Conferma un passo eseguito."""
+        with self._lock:
+            self._batches[batch_id].done.add(seq)
+            self._append({"t": "done", "batch": batch_id, "seq": seq})
+
+    def commit(self, batch_id: int) -> None:
+        """Chiude il batch: i passi confermati diventano annullabili."""
+        with self._lock:
+            self._batches[batch_id].state = BATCH_COMMITTED
+            self._append({"t": "commit", "batch": batch_id})
+            self._flush_locked()
+        self.compact_if_needed()
+
+    def begin_undo(self, batch_id: int) -> None:
+        """Segna l'inizio dell'undo di un batch (ripreso al riavvio se interrotto)."""
+        self._set_state(batch_id, BATCH_UNDOING, "undo")
+
+    def end_undo(self, batch_id: int, reverted: Optional[List[int]] = None) -> None:
+        """
+        Chiude l'undo del batch. reverted: passi annullati se l'undo è
+        riuscito solo in parte; il batch resta annullabile per gli altri.
+        """
+        if reverted is None:
+            self._set_state(batch_id, BATCH_CLOSED, "undone")
+            return
+        with self._lock:
+            batch = self._batches.get(batch_id)
+            if batch is None:
+                return  # già rimosso dalla compattazione
+            for seq in reverted:
+                batch.done.discard(seq)
+                self._append({"t": "reverted", "batch": batch_id, "seq": seq})
+            batch.state = BATCH_COMMITTED
+            self._append({"t": "commit", "batch": batch_id})
+            self._flush_locked()
+
+    def _set_state(self, batch_id: int, state: str, kind: str) -> None:
+        with self._lock:
+            batch = self._batches.get(batch_id)
+            if batch is None:
+                return  # già rimosso dalla compattazione
+            batch.state = state
+            self._append({"t": kind, "batch": batch_id})
+            self._flush_locked()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file.closed:
+                return
+            self._flush_locked()
+            self._file.close()
+
+    # ── Lettura ──────────────────────────────────────────────────────────────
+
+    def _read(self) -> Dict[int, JournalBatch]:
+        batches: Dict[int, JournalBatch] = {}
+        try:
+            f = open(self.journal_path, "r", encoding="utf-8")
+        except FileNotFoundError:
+            return batches
+        with f:
+            for line in f:
+                try:
+                    self._apply_record(batches, json.loads(line))
+                except (ValueError, KeyError, TypeError):
+                    continue  # riga troncata da un crash durante la scrittura
+        return batches
+
+    @staticmethod
+    def _apply_record(batches: Dict[int, JournalBatch], record: dict) -> None:
+        kind, batch_id = record["t"], int(record["batch"])
+        batch = batches.get(batch_id)
+        if batch is None:
+            batch = batches[batch_id] = JournalBatch(batch_id)
+        if kind == "begin":
+            batch.timestamp = datetime.fromisoformat(record["ts"])
+        elif kind == "intent":
+            fingerprint = record.get("id")
+            batch.steps[int(record["seq"])] = (
+                Path(record["from"]), Path(record["to"]), bool(record.get("tmp")),
+                tuple(fingerprint) if fingerprint else None,
+            )
+        elif kind == "done":
+            batch.done.add(int(record["seq"]))
+        elif kind == "reverted":
+            batch.done.discard(int(record["seq"]))
+        elif kind == "replay":
+            batch.done.clear()
+        elif kind == "commit":
+            batch.state = BATCH_COMMITTED
+        elif kind == "undo":
+            batch.state = BATCH_UNDOING
+        elif kind in ("undone", "rolledback"):
+            batch.state = BATCH_CLOSED
+
+    def incomplete(self) -> List[JournalBatch]:
+        """Batch interrotti (rinomina o undo non terminati)."""
+        with self._lock:
+            return [b for b in self._batches.values()
+                    if b.state in (BATCH_OPEN, BATCH_UNDOING)]
+
+    def undo_batches(self) -> List[Tuple[int, List[RenameOperation]]]:
+        """Batch annullabili (dal più vecchio), per ricostruire lo stack di undo."""
+        with self._lock:
+            return [
+                (batch_id, batch.operations())
+                for batch_id, batch in sorted(self._batches.items())
+                if batch.state == BATCH_COMMITTED and batch.done
+            ]
+
+    # ── Recupero ─────────────────────────────────────────────────────────────
+
+    def recover(self, replay: bool = False) -> List[Tuple[Path, str]]:
+        """
+        Chiude i batch interrotti verificando ogni passo sul filesystem.
+
+        replay=False: riporta i file ai nomi originali (rollback).
+        replay=True: riporta il batch all'inizio e lo riesegue per intero;
+        un undo interrotto viene comunque completato.
+
+        Restituisce [(path, errore)] dei passi che non è stato possibile
+        sistemare (il batch viene comunque chiuso).
+        """
+        errors: List[Tuple[Path, str]] = []
+        for batch in self.incomplete():
+            steps = sorted(batch.steps.items())
+            errors.extend(self._roll_back(steps))
+
+            if replay and batch.state == BATCH_OPEN:
+                with self._lock:
+                    batch.done.clear()
+                    self._append({"t": "replay", "batch": batch.batch_id})
+                for seq, (src, dst, _, _) in steps:
+                    if os.path.lexists(dst) or not os.path.lexists(src):
+                        errors.append((src, f"Impossibile completare: {src.name} → {dst.name}"))
+                        continue
+                    try:
+                        os.rename(src, dst)
+                    except OSError as e:
+                        errors.append((src, f"Errore: {str(e)}"))
+                        continue
+                    self.done(batch.batch_id, seq)
+                self.commit(batch.batch_id)
+                continue
+
+            with self._lock:
+                batch.state = BATCH_CLOSED
+                self._append({"t": "rolledback", "batch": batch.batch_id})
+                self._flush_locked()
+        return errors
+
+    @staticmethod
+    def _roll_back(steps) -> List[Tuple[Path, str]]:
+        """
+        Annulla i passi eseguiti, dall'ultimo al primo: un passo è stato
+        eseguito se nel target c'è il file che doveva spostare. Procedendo
+        a ritroso ogni passo ritrova i file come li aveva lasciati.
+        """
+        errors: List[Tuple[Path, str]] = []
+        for _, (src, dst, _, fingerprint) in reversed(steps):
+            if fingerprint is None or file_fingerprint(dst) != fingerprint:
+                continue  # passo non eseguito (o file non identificabile)
+            if os.path.lexists(src):
+                errors.append((dst, f"Nome originale già occupato: {src.name}"))
+                continue
+            try:
+                os.rename(dst, src)
+            except OSError as e:
+                errors.append((dst, f"Errore: {str(e)}"))
+        return errors
+
+    # ── Compattazione ────────────────────────────────────────────────────────
+
+    def compact_if_needed(self) -> None:
+        try:
+            size = self.journal_path.stat().st_size
+        except OSError:
+            return
+        if size > RENAME_JOURNAL_COMPACT_BYTES:
+            self.compact()
+
+    def compact(self, max_undo_batches: int = RENAME_JOURNAL_MAX_UNDO_BATCHES) -> None:
+        """
+        Riscrive il journal con i soli batch ancora utili: gli ultimi
+        max_undo_batches annullabili (solo i passi eseguiti) e quelli
+        interrotti. Sostituzione atomica (file temporaneo + os.replace).
+        """
+        with self._lock:
+            self._flush_locked()
+            keep_ids = [i for i, b in sorted(self._batches.items()) if b.state == BATCH_COMMITTED]
+            keep_ids = set(keep_ids[-max_undo_batches:] if max_undo_batches > 0 else [])
+            keep_ids |= {i for i, b in self._batches.items() if b.state in (BATCH_OPEN, BATCH_UNDOING)}
+
+            lines = []
+            for batch_id in sorted(keep_ids):
+                batch = self._batches[batch_id]
+                ts = (batch.timestamp or datetime.now()).isoformat()
+                lines.append({"t": "begin", "batch": batch_id, "ts": ts})
+                for seq, (src, dst, temporary, fingerprint) in sorted(batch.steps.items()):
+                    if batch.state == BATCH_COMMITTED and seq not in batch.done:
+                        continue
+                    lines.append(self._intent_record(
+                        batch_id, seq, src, dst, temporary, fingerprint,
+                    ))
+                    if seq in batch.done:
+                        lines.append({"t": "done", "batch": batch_id, "seq": seq})
+                if batch.state == BATCH_COMMITTED:
+                    lines.append({"t": "commit", "batch": batch_id})
+                elif batch.state == BATCH_UNDOING:
+                    lines.append({"t": "undo", "batch": batch_id})
+
+            tmp_path = self.journal_path.with_name(self.journal_path.name + ".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.writelines(json.dumps(r, ensure_ascii=False) + "\n" for r in lines)
+                f.flush()
+                os.fsync(f.fileno())
+            self._file.close()
+            os.replace(tmp_path, self.journal_path)
+            self._file = open(self.journal_path, "a", encoding="utf-8")
+            self._batches = {i: b for i, b in self._batches.items() if i in keep_ids}
+
+
+_default_journal: Optional[RenameJournal] = None
+_default_journal_failed = False
+_default_journal_lock = threading.Lock()
+
+
+def get_default_journal() -> Optional[RenameJournal]:
+    """
+    Journal condiviso nella cartella dati utente (creato al primo uso).
+    Restituisce None se la cartella non è scrivibile.
+    """
+    global _default_journal, _default_journal_failed
+    from .cache import user_data_dir
+
+    with _default_journal_lock:
+        if _default_journal is None and not _default_journal_failed:
+            try:
+                _default_journal = RenameJournal(user_data_dir() / RENAME_JOURNAL_FILENAME)
+            except OSError:
+                _default_journal_failed = True
+        return _default_journal
@@ -1,8 +1,16 @@
 """Modelli dati."""
+import threading
+import time
+from collections import deque
 from dataclasses import dataclass, field
 from pathlib import Path
 from datetime import datetime
-from typing import Optional, List
+from typing import Optional, List, Set, Dict, TYPE_CHECKING
+
+from .config import SUPPORTED_EXTENSIONS, THROUGHPUT_WINDOW_SEC
+
+if TYPE_CHECKING:
+    from .journal import RenameJournal
 
 
 @dataclass
@@ -36,6 +44,17 @@ class FileInfo:
     duration_sec: Optional[float] = None
     mtime: Optional[datetime] = None
     error: Optional[str] = None
+    size_bytes: Optional[int] = None
+    # True se duration_sec è una stima da dimensione/bitrate (non ancora esatta)
+    duration_provisional: bool = False
+
+    # Metadati dal probe (None = non letti o non presenti nel file)
+    creation_time: Optional[datetime] = None  # ora locale
+    codec: Optional[str] = None
+    width: Optional[int] = None
+    height: Optional[int] = None
+    fps: Optional[float] = None
+    bit_rate: Optional[int] = None  # bit/s
 
     # Computed
     new_filename: Optional[str] = None
@@ -43,6 +62,34 @@ class FileInfo:
     message: str = ""
 
 
+@dataclass
+class ScanOptions:
+    """Opzioni della scansione ricorsiva di una cartella."""
+    max_depth: Optional[int] = None  # None = illimitata, 0 = solo la cartella scelta
+    include: List[str] = field(default_factory=list)  # glob sul nome file (vuoto = tutti)
+    exclude: List[str] = field(default_factory=list)  # glob su nomi di file e cartelle
+    extensions: Set[str] = field(default_factory=lambda: set(SUPPORTED_EXTENSIONS))
+    skip_hidden: bool = True
+
+
+@dataclass
+class MediaInfo:
+    """
+    Metadati letti con un solo probe.
+
+    complete=True se il backend ha letto anche codec/risoluzione/fps/bitrate
+    (ffprobe); i lettori nativi compilano solo durata e, se c'è, creation_time.
+    """
+    duration_sec: Optional[float] = None
+    creation_time: Optional[datetime] = None  # ora locale
+    codec: Optional[str] = None
+    width: Optional[int] = None
+    height: Optional[int] = None
+    fps: Optional[float] = None
+    bit_rate: Optional[int] = None  # bit/s
+    complete: bool = False
+
+
 @dataclass
 class RenameResult:
     """Risultato di un'operazione di rinomina."""
@@ -61,6 +108,35 @@ class RenameOperation:
     timestamp: datetime
     status: str = "ok"
     message: str = ""
+    batch_id: Optional[int] = None  # batch nel journal delle rinomine
+    seq: Optional[int] = None       # passo del batch nel journal
+
+
+@dataclass
+class PlanStep:
+    """Passo di un piano di rinomina, nell'ordine di esecuzione."""
+    from_path: Path
+    to_path: Path
+    temporary: bool = False  # to_path è un nome d'appoggio (ciclo di rinomine)
+
+
+@dataclass
+class RenamePlan:
+    """
+    Piano di rinomina: passi già ordinati (catene e cicli risolti) e
+    snapshot delle cartelle coinvolte (mtime in ns al momento del piano).
+    """
+    steps: List[PlanStep] = field(default_factory=list)
+    folders: Dict[str, int] = field(default_factory=dict)
+    created_at: datetime = field(default_factory=datetime.now)
+
+    def renames(self) -> List[PlanStep]:
+        """Rinomine logiche (origine -> nome finale), senza i nomi d'appoggio."""
+        temp_origin = {step.to_path: step.from_path for step in self.steps if step.temporary}
+        return [
+            PlanStep(temp_origin.get(step.from_path, step.from_path), step.to_path)
+            for step in self.steps if not step.temporary
+        ]
 
 
 class UndoManager:
@@ -68,11 +144,18 @@ class UndoManager:
     Gestisce lo stack di undo per le rinomina.
 
     Ogni click su "Rinomina" crea un batch (lista di RenameOperation).
-    undo_last() esegue il rollback dell'ultimo batch.
+    undo_last() esegue il rollback dell'ultimo batch; le operazioni che non
+    è stato possibile annullare tornano in cima allo stack.
+
+    journal: se passato, lo stack riparte dai batch annullabili del journal
+    (undo anche dopo un riavvio) e ogni undo viene registrato nel journal.
     """
 
-    def __init__(self):
+    def __init__(self, journal: Optional["RenameJournal"] = None):
+        self._journal = journal
         self._stack: List[List[RenameOperation]] = []
+        if journal is not None:
+            self._stack = [ops for _, ops in journal.undo_batches()]
 
     def push_transaction(self, operations: List[RenameOperation]) -> None:
         """Aggiunge un batch di operazioni allo stack."""
@@ -91,10 +174,25 @@ class UndoManager:
         if not self._stack:
             return []
         batch = self._stack.pop()
+        batch_id = batch[0].batch_id
+        if self._journal is not None and batch_id is not None:
+            self._journal.begin_undo(batch_id)
         results = []
         for op in reversed(batch):
             err = self._undo_single(op)
             results.append((op, err))
+
+        # Le operazioni non annullate restano annullabili (anche dopo un riavvio)
+        failed = {id(op) for op, err in results if err}
+        if self._journal is not None and batch_id is not None:
+            if failed:
+                self._journal.end_undo(
+                    batch_id, [op.seq for op, err in results if not err and op.seq is not None],
+                )
+            else:
+                self._journal.end_undo(batch_id)
+        if failed:
+            self._stack.append([op for op in batch if id(op) in failed])
         return results
 
     def _undo_single(self, op: RenameOperation) -> str:
@@ -113,6 +211,92 @@ class UndoManager:
             return f"Errore undo: {str(e)}"
 
 
+class CancelToken:
+    """
+    Token di annullamento per un'operazione in background.
+
+    I sottoprocessi registrati (es. ffprobe) vengono terminati quando
+    il token viene annullato.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cancelled = False
+        self._processes: set = set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled
+
+    def cancel(self) -> None:
+        """Annulla l'operazione e termina i sottoprocessi registrati."""
+        with self._lock:
+            self._cancelled = True
+            processes = list(self._processes)
+        for proc in processes:
+            try:
+                proc.kill()
+            except OSError:
+                pass
+
+    def register(self, proc) -> bool:
+        """Registra un sottoprocesso. Restituisce False se già annullato."""
+        with self._lock:
+            if self._cancelled:
+                return False
+            self._processes.add(proc)
+            return True
+
+    def unregister(self, proc) -> None:
+        with self._lock:
+            self._processes.discard(proc)
+
+
+class RateMeter:
+    """
+    Velocità su una finestra mobile (es. file elaborati al secondo).
+    add() e rate() sono O(1) ammortizzati: si tengono solo gli eventi
+    degli ultimi window_sec secondi.
+    """
+
+    def __init__(self, window_sec: float = THROUGHPUT_WINDOW_SEC):
+        self.window_sec = window_sec
+        self._events: deque = deque()   # (istante, quantità)
+        self._in_window = 0
+        self._started: Optional[float] = None
+
+    def add(self, count: int = 1, now: Optional[float] = None) -> None:
+        """Registra count elementi completati."""
+        if count <= 0:
+            return
+        now = time.monotonic() if now is None else now
+        if self._started is None:
+            self._started = now
+        self._events.append((now, count))
+        self._in_window += count
+        self._expire(now)
+
+    def rate(self, now: Optional[float] = None) -> float:
+        """Elementi al secondo nella finestra (0.0 se nessuno)."""
+        now = time.monotonic() if now is None else now
+        self._expire(now)
+        if not self._in_window:
+            return 0.0
+        # All'inizio la finestra è più corta: si divide per il tempo trascorso
+        elapsed = min(self.window_sec, max(now - self._started, 1.0))
+        return self._in_window / elapsed
+
+    def reset(self) -> None:
+        self._events.clear()
+        self._in_window = 0
+        self._started = None
+
+    def _expire(self, now: float) -> None:
+        limit = now - self.window_sec
+        while self._events and self._events[0][0] < limit:
+            self._in_window -= self._events.popleft()[1]
+
+
 @dataclass
 class ObservationRecord:
     """Record per un'osservazione (una riga nel CSV)."""
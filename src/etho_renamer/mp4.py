@@ -0,0 +1,139 @@
+"""Lettura nativa di durata e creation_time da file MP4/MOV (box mvhd), senza ffprobe."""
+import struct
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Optional, BinaryIO, Tuple
+
+from .models import MediaInfo
+
+# Estensioni ISO-BMFF / QuickTime gestite da questo lettore
+MP4_EXTENSIONS = {'.mp4', '.mov'}
+
+# Limite di sicurezza sul numero di box visitati (file corrotti)
+_MAX_BOXES = 4096
+
+# I tempi del box mvhd sono secondi dal 1904-01-01 UTC
+_MP4_EPOCH = datetime(1904, 1, 1, tzinfo=timezone.utc)
+# Sotto questa data il campo è considerato non impostato (camere senza orologio)
+_MIN_CREATION_YEAR = 1971
+
+
+def _read_box_header(f: BinaryIO, end: int) -> Optional[Tuple[bytes, int, int]]:
+    """
+    Legge l'header del box alla posizione corrente.
+    Restituisce (tipo, offset_payload, offset_fine_box) o None se non valido.
+    """
+    start = f.tell()
+    if start + 8 > end:
+        return None
+    header = f.read(8)
+    if len(header) < 8:
+        return None
+
+    size, box_type = struct.unpack(">I4s", header)
+    header_len = 8
+    if size == 1:
+        # Dimensione a 64 bit subito dopo il tipo
+        ext = f.read(8)
+        if len(ext) < 8:
+            return None
+        size = struct.unpack(">Q", ext)[0]
+        header_len = 16
+    elif size == 0:
+        # Il box si estende fino alla fine del contenitore
+        size = end - start
+
+    if size < header_len or start + size > end:
+        return None
+    return box_type, start + header_len, start + size
+
+
+def _find_child(f: BinaryIO, start: int, end: int, wanted: bytes) -> Optional[Tuple[int, int]]:
+    """Cerca il box `wanted` tra start e end; restituisce (payload, fine) o None."""
+    pos = start
+    for _ in range(_MAX_BOXES):
+        if pos >= end:
+            return None
+        f.seek(pos)
+        box = _read_box_header(f, end)
+        if box is None:
+            return None
+        box_type, payload, box_end = box
+        if box_type == wanted:
+            return payload, box_end
+        pos = box_end
+    return None
+
+
+def _parse_mvhd(f: BinaryIO, payload: int, box_end: int) -> Optional[MediaInfo]:
+    """Estrae creation_time e timescale/duration dal payload del box mvhd."""
+    f.seek(payload)
+    data = f.read(min(box_end - payload, 32))
+    if len(data) < 4:
+        return None
+
+    version = data[0]
+    if version == 1:
+        if len(data) < 32:
+            return None
+        created = struct.unpack(">Q", data[4:12])[0]
+        timescale, duration = struct.unpack(">IQ", data[20:32])
+        unknown = 0xFFFFFFFFFFFFFFFF
+    else:
+        if len(data) < 20:
+            return None
+        created = struct.unpack(">I", data[4:8])[0]
+        timescale, duration = struct.unpack(">II", data[12:20])
+        unknown = 0xFFFFFFFF
+
+    if not timescale or not duration or duration == unknown:
+        return None
+    return MediaInfo(
+        duration_sec=duration / timescale,
+        creation_time=_mp4_time_to_local(created),
+    )
+
+
+def _mp4_time_to_local(seconds: int) -> Optional[datetime]:
+    """Converte un tempo mvhd (UTC, epoca 1904) in ora locale; None se non valido."""
+    if not seconds:
+        return None
+    try:
+        utc = _MP4_EPOCH + timedelta(seconds=seconds)
+        if utc.year < _MIN_CREATION_YEAR:
+            return None
+        return utc.astimezone().replace(tzinfo=None)
+    except (OverflowError, OSError, ValueError):
+        return None
+
+
+def read_mp4_info(file_path: Path) -> Optional[MediaInfo]:
+    """
+    Legge durata e creation_time dal box moov/mvhd di un file MP4/MOV.
+
+    Legge solo gli header dei box con seek, quindi funziona anche con moov
+    in fondo al file e con box a 64 bit. Restituisce None se il parsing
+    non riesce (il chiamante ricade su ffprobe).
+    """
+    try:
+        with open(file_path, "rb") as f:
+            f.seek(0, 2)
+            file_end = f.tell()
+
+            moov = _find_child(f, 0, file_end, b"moov")
+            if moov is None:
+                return None
+
+            mvhd = _find_child(f, moov[0], moov[1], b"mvhd")
+            if mvhd is None:
+                return None
+
+            return _parse_mvhd(f, mvhd[0], mvhd[1])
+    except (OSError, struct.error):
+        return None
+
+
+def read_mp4_duration(file_path: Path) -> Optional[float]:
+    """Durata (secondi) dal box mvhd di un file MP4/MOV, o None."""
+    info = read_mp4_info(file_path)
+    return info.duration_sec if info is not None else None
@@ -0,0 +1,186 @@
+"""Lettura nativa della durata da MPEG-TS / AVCHD (.MTS), senza ffprobe."""
+from pathlib import Path
+from typing import Optional, List, Tuple, Dict
+
+# Estensioni MPEG transport stream gestite da questo lettore
+TS_EXTENSIONS = {'.mts', '.m2ts', '.ts'}
+
+TS_PACKET_SIZE = 188
+M2TS_PACKET_SIZE = 192   # 4 byte TP_extra_header + pacchetto TS
+SYNC_BYTE = 0x47
+
+# Pacchetti letti in testa e in coda (~100 KB totali per file)
+SCAN_PACKETS = 256
+
+# PTS/PCR sono contatori a 33 bit a 90 kHz
+_CLOCK_HZ = 90000
+_WRAP = 1 << 33
+
+
+def _detect_layout(data: bytes) -> Optional[Tuple[int, int]]:
+    """
+    Riconosce il formato dai byte di sync.
+    Restituisce (dimensione_pacchetto, offset_sync) o None.
+    """
+    for size, offset in ((M2TS_PACKET_SIZE, 4), (TS_PACKET_SIZE, 0)):
+        checks = min(8, len(data) // size)
+        if checks < 2:
+            continue
+        if all(data[offset + i * size] == SYNC_BYTE for i in range(checks)):
+            return size, offset
+    return None
+
+
+def _resync(data: bytes, packet_size: int, sync_offset: int) -> int:
+    """Primo indice in data allineato su un pacchetto (sync su più pacchetti)."""
+    for start in range(packet_size):
+        pos = start + sync_offset
+        if pos + 2 * packet_size >= len(data):
+            break
+        if (data[pos] == SYNC_BYTE
+                and data[pos + packet_size] == SYNC_BYTE
+                and data[pos + 2 * packet_size] == SYNC_BYTE):
+            return start
+    return -1
+
+
+def _parse_pts(b: bytes, i: int) -> int:
+    """Decodifica un timestamp PES a 33 bit (5 byte)."""
+    return (
+        ((b[i] >> 1) & 0x07) << 30
+        | b[i + 1] << 22
+        | (b[i + 2] >> 1) << 15
+        | b[i + 3] << 7
+        | b[i + 4] >> 1
+    )
+
+
+def _scan_timestamps(
+    data: bytes,
+    packet_size: int,
+    sync_offset: int,
+) -> Tuple[Dict[int, List[int]], Dict[int, List[int]]]:
+    """
+    Estrae i PTS (per PID) e i PCR (per PID) dai pacchetti in data.
+    Restituisce (pts_per_pid, pcr_per_pid) in ordine di lettura.
+    """
+    pts: Dict[int, List[int]] = {}
+    pcr: Dict[int, List[int]] = {}
+
+    start = _resync(data, packet_size, sync_offset)
+    if start < 0:
+        return pts, pcr
+
+    for base in range(start, len(data) - packet_size + 1, packet_size):
+        p = base + sync_offset
+        if data[p] != SYNC_BYTE:
+            continue
+        flags = data[p + 1]
+        pid = ((flags & 0x1F) << 8) | data[p + 2]
+        payload_start = flags & 0x40
+        afc = (data[p + 3] >> 4) & 0x03
+        idx = p + 4
+
+        # Adaptation field (eventuale PCR)
+        if afc & 0x02:
+            af_len = data[idx]
+            if af_len >= 7 and data[idx + 1] & 0x10:
+                j = idx + 2
+                pcr_base = (
+                    data[j] << 25 | data[j + 1] << 17 | data[j + 2] << 9
+                    | data[j + 3] << 1 | data[j + 4] >> 7
+                )
+                pcr.setdefault(pid, []).append(pcr_base)
+            idx += 1 + af_len
+
+        # Header PES con PTS
+        if not (afc & 0x01) or not payload_start:
+            continue
+        end = p + TS_PACKET_SIZE
+        if idx + 14 > end:
+            continue
+        if data[idx] != 0 or data[idx + 1] != 0 or data[idx + 2] != 1:
+            continue
+        stream_id = data[idx + 3]
+        if not (0xC0 <= stream_id <= 0xEF or stream_id == 0xFD):
+            continue
+        if data[idx + 7] & 0x80:
+            pts.setdefault(pid, []).append(_parse_pts(data, idx + 9))
+
+    return pts, pcr
+
+
+def _earliest(values: List[int]) -> int:
+    """Timestamp più vecchio (i B-frame possono precedere il primo PTS letto)."""
+    ref = values[0]
+    half = _WRAP >> 1
+    return min(values, key=lambda v: ((v - ref + half) % _WRAP) - half)
+
+
+def _span(first: int, values: List[int]) -> Tuple[int, int]:
+    """
+    Distanza massima (con wraparound a 33 bit) da first a values e
+    il passo minimo tra timestamp consecutivi (durata di un frame).
+    """
+    rel = sorted({(v - first) % _WRAP for v in values})
+    step = 0
+    for a, b in zip(rel, rel[1:]):
+        if b - a > 0 and (step == 0 or b - a < step):
+            step = b - a
+    return (rel[-1] if rel else 0), step
+
+
+def _duration_from(
+    head: Dict[int, List[int]],
+    tail: Dict[int, List[int]],
+    add_frame: bool,
+) -> Optional[float]:
+    """
+    Durata dal primo timestamp in testa all'ultimo in coda, sullo stesso PID.
+    add_frame: aggiunge la durata dell'ultimo frame (per i PTS).
+    """
+    for pid, head_values in head.items():
+        tail_values = tail.get(pid)
+        if not head_values or not tail_values:
+            continue
+        last, step = _span(_earliest(head_values), tail_values)
+        if last <= 0:
+            continue
+        return (last + (step if add_frame else 0)) / _CLOCK_HZ
+    return None
+
+
+def read_ts_duration(file_path: Path, packets: int = SCAN_PACKETS) -> Optional[float]:
+    """
+    Calcola la durata (secondi) di un file MPEG-TS/M2TS leggendo solo
+    i primi e gli ultimi `packets` pacchetti: primo e ultimo PTS (o PCR
+    in mancanza di PTS), con gestione del wraparound a 33 bit.
+
+    Restituisce None se il parsing non riesce (il chiamante ricade su ffprobe).
+    """
+    try:
+        with open(file_path, "rb") as f:
+            f.seek(0, 2)
+            size = f.tell()
+            f.seek(0)
+            head = f.read(packets * M2TS_PACKET_SIZE)
+
+            layout = _detect_layout(head)
+            if layout is None:
+                return None
+            packet_size, sync_offset = layout
+
+            tail_start = max(0, size - packets * packet_size)
+            tail_start -= tail_start % packet_size
+            f.seek(tail_start)
+            tail = f.read(size - tail_start)
+    except OSError:
+        return None
+
+    head_pts, head_pcr = _scan_timestamps(head, packet_size, sync_offset)
+    tail_pts, tail_pcr = _scan_timestamps(tail, packet_size, sync_offset)
+
+    duration = _duration_from(head_pts, tail_pts, add_frame=True)
+    if duration is None:
+        duration = _duration_from(head_pcr, tail_pcr, add_frame=False)
+    return duration
@@ -0,0 +1,197 @@
+"""Template del nome file: un'unica specifica per comporre e per riconoscere i nomi."""
+import re
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .config import NAME_PATTERN
+from .models import InputData
+
+# Campi del template -> attributo di InputData (date/time sono calcolati)
+INPUT_FIELDS = {
+    "pup": "pup",
+    "mama": "mama_name",
+    "month": "month",
+    "year": "year",
+    "part": "part",
+    "initials": "initials",
+}
+STAMP_FIELDS = ("date", "time")
+
+# Espressione di ogni campo quando si riconosce un nome già rinominato
+FIELD_REGEX = {
+    "date": r"\d{8}",
+    "time": r"\d{4}",
+    "pup": r"\w+",
+    "mama": r"[^_]+",
+    "month": r"[a-z]{3}",
+    "year": r"\d{2}",
+    "part": r"Part\d+",
+    "initials": r"[A-Z]+",
+}
+
+_TOKEN_RE = re.compile(r"\{(\w+)\}|\[|\]|[^{}\[\]]+")
+
+# Segmento compilato: testo fisso, campo, o sezione opzionale
+_Segment = Tuple[str, object]
+
+
+def _parse_spec(spec: str) -> List[_Segment]:
+    """Specifica -> segmenti ("text", s) / ("field", nome) / ("optional", [segmenti])."""
+    stack: List[List[_Segment]] = [[]]
+    pos = 0
+    for match in _TOKEN_RE.finditer(spec):
+        if match.start() != pos:
+            break
+        pos = match.end()
+        token = match.group(0)
+        if match.group(1) is not None:
+            name = match.group(1)
+            if name not in FIELD_REGEX:
+                raise ValueError(f"Campo sconosciuto nel template: {{{name}}}")
+            stack[-1].append(("field", name))
+        elif token == "[":
+            stack.append([])
+        elif token == "]":
+            if len(stack) == 1:
+                raise ValueError(f"']' senza '[' nel template: {spec}")
+            section = stack.pop()
+            stack[-1].append(("optional", section))
+        else:
+            stack[-1].append(("text", token))
+    if pos != len(spec):
+        raise ValueError(f"Template non valido vicino a: {spec[pos:]!r}")
+    if len(stack) != 1:
+        raise ValueError(f"'[' non chiusa nel template: {spec}")
+    return stack[0]
+
+
+def _section_fields(segments: List[_Segment]) -> List[str]:
+    fields = []
+    for kind, value in segments:
+        if kind == "field":
+            fields.append(value)
+        elif kind == "optional":
+            fields.extend(_section_fields(value))
+    return fields
+
+
+class NameTemplate:
+    """
+    Template compilato: la specifica (es. NAME_PATTERN) viene letta una
+    volta sola e produce sia il formatter sia la regex di parsing.
+
+    Le sezioni tra [ ] vengono omesse se uno dei loro campi è vuoto
+    (es. "[_{part}]"). I campi di input sono risolti una volta per
+    InputData distinto (bind), così per ogni riga restano solo data e ora.
+    """
+
+    def __init__(self, spec: str):
+        self.spec = spec
+        self._segments = _parse_spec(spec)
+        self.fields = _section_fields(self._segments)
+        self._regex = re.compile(
+            "^" + self._regex_for(self._segments, set()) + "$"
+        )
+        self._bound: Dict[Tuple[str, ...], Callable[[str, str], str]] = {}
+
+    # ── Composizione ─────────────────────────────────────────────────────────
+
+    def bind(self, input_data: InputData) -> Callable[[str, str], str]:
+        """
+        Formatter (yyyymmdd, hhmm) -> nome senza estensione, con i campi di
+        input già inseriti. Memorizzato per valori di input.
+        """
+        key = (
+            input_data.pup, input_data.mama_name, input_data.month,
+            input_data.year, input_data.part, input_data.initials,
+        )  # stesso ordine di INPUT_FIELDS
+        formatter = self._bound.get(key)
+        if formatter is None:
+            values = dict(zip(INPUT_FIELDS, key))
+            pieces = self._render(self._segments, values)
+            if len(self._bound) >= 4096:
+                self._bound.clear()
+            formatter = self._bound[key] = self._compile_formatter(pieces)
+        return formatter
+
+    def format(self, yyyymmdd: str, hhmm: str, input_data: InputData, extension: str = "") -> str:
+        """Nome completo per data, ora, input ed estensione."""
+        return self.bind(input_data)(yyyymmdd, hhmm) + extension
+
+    def _render(self, segments: List[_Segment], values: Dict[str, str]) -> List[Tuple[str, str]]:
+        """
+        Risolve i campi di input: pezzi ("text", s) e ("stamp", "date"/"time")
+        per i campi che cambiano a ogni riga.
+        """
+        pieces: List[Tuple[str, str]] = []
+        for kind, value in segments:
+            if kind == "text":
+                pieces.append(("text", value))
+            elif kind == "field":
+                if value in STAMP_FIELDS:
+                    pieces.append(("stamp", value))
+                else:
+                    pieces.append(("text", values[value]))
+            # Sezione opzionale: solo se tutti i campi di input sono valorizzati
+            elif all(values[f] for f in _section_fields(value) if f not in STAMP_FIELDS):
+                pieces.extend(self._render(value, values))
+        return pieces
+
+    @staticmethod
+    def _compile_formatter(pieces: List[Tuple[str, str]]) -> Callable[[str, str], str]:
+        # Testo fisso unito tra un campo data/ora e il successivo
+        fixed = [""]
+        order = []
+        for kind, value in pieces:
+            if kind == "text":
+                fixed[-1] += value
+            else:
+                order.append(value)
+                fixed.append("")
+
+        if order == ["date", "time"]:
+            # Caso del pattern standard: una sola concatenazione per riga
+            head, middle, tail = fixed
+            return lambda yyyymmdd, hhmm: head + yyyymmdd + middle + hhmm + tail
+
+        def formatter(yyyymmdd: str, hhmm: str) -> str:
+            stamps = {"date": yyyymmdd, "time": hhmm}
+            out = [fixed[0]]
+            for name, text in zip(order, fixed[1:]):
+                out.append(stamps[name])
+                out.append(text)
+            return "".join(out)
+        return formatter
+
+    # ── Riconoscimento ───────────────────────────────────────────────────────
+
+    def _regex_for(self, segments: List[_Segment], seen: set) -> str:
+        out = []
+        for kind, value in segments:
+            if kind == "text":
+                out.append(re.escape(value))
+            elif kind == "field":
+                if value in seen:
+                    out.append(f"(?P={value})")
+                else:
+                    seen.add(value)
+                    out.append(f"(?P<{value}>{FIELD_REGEX[value]})")
+            else:
+                out.append(f"(?:{self._regex_for(value, seen)})?")
+        return "".join(out)
+
+    def parse(self, stem: str) -> Optional[Dict[str, str]]:
+        """
+        Campi di un nome (senza estensione) conforme al template, o None.
+        I campi delle sezioni opzionali assenti valgono "".
+        """
+        match = self._regex.match(stem)
+        if not match:
+            return None
+        return {name: value or "" for name, value in match.groupdict().items()}
+
+
+@lru_cache(maxsize=16)
+def compile_template(spec: str = NAME_PATTERN) -> NameTemplate:
+    """Template compilato per spec (memorizzato)."""
+    return NameTemplate(spec)
@@ -0,0 +1,393 @@
+"""Rinomina in due fasi: piano (ordinato, serializzabile) e applicazione."""
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from .config import (
+    RENAME_PLAN_VERSION, RENAME_PROGRESS_EVERY, RENAME_MAX_WORKERS, RENAME_DIR_CONCURRENCY,
+)
+from .conflicts import DirectoryCache
+from .core import is_remote_path
+from .journal import RenameJournal, file_fingerprint
+from .models import CancelToken, PlanStep, RenameOperation, RenamePlan
+
+# Nome d'appoggio per spezzare i cicli (A -> B, B -> A)
+_TEMP_NAME = ".{name}.etho-tmp{n}"
+
+PLAN_CONFLICT_MSG = "File target esiste già"
+PLAN_DUPLICATE_MSG = "Stesso nuovo nome di altri file nel piano"
+PLAN_SOURCE_MISSING_MSG = "File non trovato"
+PLAN_SKIPPED_MSG = "Saltato: passo precedente non riuscito"
+
+
+def _key(path: Path) -> str:
+    return os.path.normcase(str(path))
+
+
+def _folder_listing(folder: str) -> Tuple[Optional[int], Set[str]]:
+    """(mtime_ns, nomi normalizzati) della cartella; (None, vuoto) se illeggibile."""
+    try:
+        mtime_ns = os.stat(folder).st_mtime_ns
+        names = {os.path.normcase(n) for n in os.listdir(folder)}
+    except OSError:
+        return None, set()
+    return mtime_ns, names
+
+
+def build_plan(
+    renames: Iterable[Tuple[Path, Path]],
+    dir_cache: Optional[DirectoryCache] = None,
+) -> Tuple[RenamePlan, List[Tuple[Path, str]]]:
+    """
+    Costruisce il piano per le coppie (path attuale, nuovo path).
+
+    Le cartelle coinvolte vengono lette una volta (snapshot); con dir_cache
+    si usano gli snapshot già in memoria. Se nel frattempo una cartella è
+    cambiata, check_plan() lo rileva dall'mtime registrato nel piano. Un target
+    occupato da un altro file del piano non è un conflitto: le catene
+    vengono ordinate dalla fine e i cicli spezzati con un nome d'appoggio.
+    Coppie con nome invariato vengono ignorate.
+
+    Restituisce (piano, [(path, errore)]) per le coppie escluse.
+    """
+    pairs = [(Path(src), Path(dst)) for src, dst in renames]
+    pairs = [(src, dst) for src, dst in pairs if str(src) != str(dst)]
+
+    folders: Dict[str, Tuple[Optional[int], Set[str]]] = {}
+    for src, dst in pairs:
+        for folder in (str(src.parent), str(dst.parent)):
+            if folder not in folders:
+                folders[folder] = (
+                    dir_cache.listing(Path(folder)) if dir_cache is not None
+                    else _folder_listing(folder)
+                )
+
+    def on_disk(path: Path) -> bool:
+        return os.path.normcase(path.name) in folders[str(path.parent)][1]
+
+    errors: Dict[int, str] = {}
+    src_index = {_key(src): i for i, (src, _) in enumerate(pairs)}
+    by_target: Dict[str, List[int]] = {}
+    for i, (src, dst) in enumerate(pairs):
+        by_target.setdefault(_key(dst), []).append(i)
+        if not on_disk(src):
+            errors[i] = PLAN_SOURCE_MISSING_MSG
+    for group in by_target.values():
+        if len(group) > 1:
+            for i in group:
+                errors.setdefault(i, PLAN_DUPLICATE_MSG)
+
+    # nxt[i] = coppia il cui file occupa il target di i (deve spostarsi prima)
+    nxt: Dict[int, int] = {}
+    prev: Dict[int, int] = {}
+    for i, (src, dst) in enumerate(pairs):
+        j = src_index.get(_key(dst))
+        if j is not None and _key(src) != _key(dst):
+            nxt[i] = j
+            prev[j] = i
+        elif on_disk(dst) and _key(src) != _key(dst):
+            errors.setdefault(i, PLAN_CONFLICT_MSG)
+
+    # Chi punta a un file che resta al suo posto è in conflitto (a catena)
+    pending = [i for i in errors]
+    while pending:
+        j = pending.pop()
+        i = prev.get(j)
+        if i is not None and i not in errors:
+            errors[i] = PLAN_CONFLICT_MSG
+            pending.append(i)
+
+    steps: List[PlanStep] = []
+    done: Set[int] = set()
+
+    def emit_back_from(i: int, stop: Optional[int] = None) -> None:
+        # i ha il target libero: poi chi puntava alla sorgente di i, e così via
+        while i is not None and i != stop and i not in done and i not in errors:
+            done.add(i)
+            src, dst = pairs[i]
+            steps.append(PlanStep(src, dst))
+            i = prev.get(i)
+
+    valid = [i for i in range(len(pairs)) if i not in errors]
+    for i in valid:
+        if i not in nxt:
+            emit_back_from(i)
+
+    # Rimasti: solo cicli. Il primo file va su un nome d'appoggio
+    used_temps: Set[str] = set()
+    for i in valid:
+        if i in done:
+            continue
+        src, dst = pairs[i]
+        temp = _temp_path(src, folders[str(src.parent)][1], used_temps)
+        done.add(i)
+        steps.append(PlanStep(src, temp, temporary=True))
+        emit_back_from(prev[i], stop=i)
+        steps.append(PlanStep(temp, dst))
+
+    plan = RenamePlan(
+        steps=steps,
+        folders={f: mtime for f, (mtime, _) in folders.items() if mtime is not None},
+    )
+    return plan, [(pairs[i][0], msg) for i, msg in sorted(errors.items())]
+
+
+def _temp_path(src: Path, names: Set[str], used: Set[str]) -> Path:
+    n = 1
+    while True:
+        candidate = _TEMP_NAME.format(name=src.name, n=n)
+        key = os.path.normcase(str(src.parent / candidate))
+        if os.path.normcase(candidate) not in names and key not in used:
+            used.add(key)
+            return src.parent / candidate
+        n += 1
+
+
+def check_plan(plan: RenamePlan) -> List[Tuple[Path, str]]:
+    """
+    Confronta il piano con lo stato attuale delle cartelle.
+
+    Le cartelle con lo stesso mtime dello snapshot non vengono rilette;
+    le altre vengono rilette una volta e ogni passo viene ricontrollato.
+    Restituisce [(path, problema)]; vuota se il piano è ancora valido.
+    """
+    changed: Dict[str, Set[str]] = {}
+    for folder, mtime_ns in plan.folders.items():
+        current, names = _folder_listing(folder)
+        if current != mtime_ns:
+            changed[folder] = names
+    if not changed:
+        return []
+
+    problems: List[Tuple[Path, str]] = []
+    # Path che il piano libera o occupa man mano
+    present: Dict[str, bool] = {}
+
+    def exists(path: Path) -> Optional[bool]:
+        key = _key(path)
+        if key in present:
+            return present[key]
+        names = changed.get(str(path.parent))
+        if names is None:
+            return None  # cartella invariata: coerente con il piano
+        return os.path.normcase(path.name) in names
+
+    for step in plan.steps:
+        if exists(step.from_path) is False:
+            problems.append((step.from_path, PLAN_SOURCE_MISSING_MSG))
+        if exists(step.to_path) and _key(step.from_path) != _key(step.to_path):
+            problems.append((step.to_path, PLAN_CONFLICT_MSG))
+        present[_key(step.from_path)] = False
+        present[_key(step.to_path)] = True
+    return problems
+
+
+def plan_groups(plan: RenamePlan) -> List[List[int]]:
+    """
+    Indici dei passi raggruppati per dipendenza: una catena o un ciclo per
+    gruppo (passi nell'ordine del piano). Gruppi diversi non toccano gli
+    stessi path e possono essere eseguiti in parallelo.
+    """
+    parent: Dict[str, str] = {}
+
+    def find(key: str) -> str:
+        root = key
+        while parent.setdefault(root, root) != root:
+            root = parent[root]
+        while parent[key] != root:
+            parent[key], key = root, parent[key]
+        return root
+
+    for step in plan.steps:
+        a, b = find(_key(step.from_path)), find(_key(step.to_path))
+        if a != b:
+            parent[b] = a
+
+    groups: Dict[str, List[int]] = {}
+    for seq, step in enumerate(plan.steps):
+        groups.setdefault(find(_key(step.from_path)), []).append(seq)
+    return list(groups.values())
+
+
+def _plan_is_remote(plan: RenamePlan) -> bool:
+    return any(is_remote_path(folder) for folder in plan.folders)
+
+
+def apply_plan(
+    plan: RenamePlan,
+    dir_cache: Optional[DirectoryCache] = None,
+    on_progress: Optional[Callable[[int, int], None]] = None,
+    progress_every: int = RENAME_PROGRESS_EVERY,
+    journal: Optional[RenameJournal] = None,
+    token: Optional[CancelToken] = None,
+    max_workers: Optional[int] = None,
+    dir_concurrency: int = RENAME_DIR_CONCURRENCY,
+    on_operations: Optional[Callable[[List[RenameOperation]], None]] = None,
+) -> Tuple[List[RenameOperation], List[Tuple[Path, str]]]:
+    """
+    Esegue i passi del piano.
+
+    Catene e cicli (plan_groups) vengono eseguiti ognuno in ordine; gruppi
+    indipendenti su max_workers thread (None = in parallelo solo su share
+    di rete), con al massimo dir_concurrency rinomine per cartella.
+    Ogni passo controlla che il target sia libero (mai sovrascrivere);
+    se un passo fallisce, i passi che dipendono dal suo file vengono saltati.
+
+    journal: tutti i passi vengono registrati (intent + fsync) prima del
+    primo rename; le conferme vanno su disco ogni fsync_every passi e il
+    batch viene chiuso alla fine.
+    token: annullato, nessun nuovo gruppo viene avviato; un ciclo già
+    iniziato viene completato, così non restano nomi d'appoggio e il
+    batch di undo contiene solo rinomine complete.
+    on_progress(fatti, totale) e on_operations(nuove operazioni): ogni
+    progress_every passi e alla fine, anche dai thread di lavoro.
+
+    Restituisce (operazioni eseguite, in un ordine valido per l'undo;
+    [(path, errore)]).
+    """
+    operations: List[RenameOperation] = []
+    errors: List[Tuple[Path, str]] = []
+    total = len(plan.steps)
+    batch_id = None
+    if journal is not None:
+        # Write-ahead: tutto il piano su disco (un solo fsync) prima dei rename
+        batch_id = journal.begin()
+        arriving: Dict[str, Optional[tuple]] = {}  # nome d'appoggio -> file che vi arriva
+        for seq, step in enumerate(plan.steps):
+            fingerprint = arriving.pop(_key(step.from_path), None) \
+                or file_fingerprint(step.from_path)
+            if step.temporary:
+                arriving[_key(step.to_path)] = fingerprint
+            journal.intend(batch_id, seq, step.from_path, step.to_path,
+                           step.temporary, fingerprint)
+        journal.flush()
+
+    lock = threading.Lock()
+    dir_slots: Dict[str, threading.Semaphore] = {}
+    for folder in {str(step.from_path.parent) for step in plan.steps}:
+        dir_slots[folder] = threading.Semaphore(dir_concurrency)
+    counters = {"done": 0}
+    unreported: List[RenameOperation] = []
+
+    def report(final: bool = False) -> None:
+        # Chiamata con lock acquisito
+        if not final and counters["done"] % progress_every != 0:
+            return
+        if on_operations is not None and unreported:
+            on_operations(list(unreported))
+        unreported.clear()
+        if on_progress is not None:
+            on_progress(counters["done"], total)
+
+    def run_group(seqs: List[int]) -> None:
+        missing: Set[str] = set()  # path dove il file atteso non è mai arrivato
+        in_cycle = plan.steps[seqs[0]].temporary
+        for n, seq in enumerate(seqs):
+            if token is not None and token.cancelled and (n == 0 or not in_cycle):
+                return
+            step = plan.steps[seq]
+            with dir_slots[str(step.from_path.parent)]:
+                op, err = _apply_step(step, seq, missing, dir_cache, batch_id)
+            with lock:
+                counters["done"] += 1
+                if op is not None:
+                    if journal is not None:
+                        journal.done(batch_id, seq)
+                        if counters["done"] % journal.fsync_every == 0:
+                            journal.flush()
+                    operations.append(op)
+                    unreported.append(op)
+                else:
+                    errors.append(err)
+                report()
+
+    groups = plan_groups(plan)
+    if max_workers is None:
+        max_workers = RENAME_MAX_WORKERS if _plan_is_remote(plan) else 1
+    workers = min(max_workers, len(groups))
+    if workers > 1:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="rename") as executor:
+            for future in [executor.submit(run_group, seqs) for seqs in groups]:
+                future.result()
+    else:
+        for seqs in groups:
+            run_group(seqs)
+
+    with lock:
+        report(final=True)
+    if journal is not None:
+        journal.commit(batch_id)
+    return operations, errors
+
+
+def _apply_step(
+    step: PlanStep,
+    seq: int,
+    missing: Set[str],
+    dir_cache: Optional[DirectoryCache],
+    batch_id: Optional[int],
+) -> Tuple[Optional[RenameOperation], Optional[Tuple[Path, str]]]:
+    """Un passo del piano: (operazione, None) o (None, (path, errore))."""
+    src, dst = step.from_path, step.to_path
+    if _key(src) in missing:
+        missing.add(_key(dst))
+        return None, (src, PLAN_SKIPPED_MSG)
+    if os.path.lexists(dst) and _key(src) != _key(dst):
+        missing.add(_key(dst))
+        return None, (src, f"{PLAN_CONFLICT_MSG}: {dst.name}")
+    try:
+        os.rename(src, dst)
+    except OSError as e:
+        missing.add(_key(dst))
+        return None, (src, f"Errore: {str(e)}")
+    if dir_cache is not None:
+        dir_cache.note_rename(src, dst)
+    return RenameOperation(
+        from_path=src,
+        to_path=dst,
+        timestamp=datetime.now(),
+        message="temporaneo" if step.temporary else "",
+        batch_id=batch_id,
+        seq=seq,
+    ), None
+
+
+# ── Serializzazione ──────────────────────────────────────────────────────────
+
+def save_plan(plan: RenamePlan, file_path: Path) -> None:
+    """Salva il piano in JSON (rivedibile e riapplicabile)."""
+    data = {
+        "version": RENAME_PLAN_VERSION,
+        "created_at": plan.created_at.isoformat(),
+        "folders": plan.folders,
+        "steps": [
+            {"from": str(s.from_path), "to": str(s.to_path), "temporary": s.temporary}
+            for s in plan.steps
+        ],
+    }
+    with open(file_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=1)
+
+
+def load_plan(file_path: Path) -> Tuple[Optional[RenamePlan], str]:
+    """Carica un piano salvato. Restituisce (piano, "") o (None, errore)."""
+    try:
+        with open(file_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") != RENAME_PLAN_VERSION:
+            return None, f"Versione del piano non supportata: {data.get('version')}"
+        plan = RenamePlan(
+            steps=[
+                PlanStep(Path(s["from"]), Path(s["to"]), bool(s.get("temporary", False)))
+                for s in data["steps"]
+            ],
+            folders={str(k): int(v) for k, v in data["folders"].items()},
+            created_at=datetime.fromisoformat(data["created_at"]),
+        )
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        return None, f"Piano non leggibile: {str(e)}"
+    return plan, ""
@@ -0,0 +1,141 @@
+"""Registro dei file caricati: ID stabili, indici per path e per riga, override."""
+import itertools
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from .models import FileInfo, InputOverrides
+
+
+class FileRegistry:
+    """
+    File caricati nell'ordine di visualizzazione.
+
+    Ogni file riceve un ID stabile che non cambia se le righe vengono
+    rimosse o riordinate: gli override per file e i probe in corso sono
+    legati all'ID, non all'indice di riga. Aggiunta, ricerca per path o
+    per ID e aggiornamento del path (rinomina/undo) sono O(1).
+    """
+
+    def __init__(self):
+        self._ids = itertools.count(1)
+        self._infos: Dict[int, FileInfo] = {}
+        self._order: List[int] = []          # riga -> ID
+        self._rows: Dict[int, int] = {}      # ID -> riga
+        self._by_path: Dict[Path, int] = {}  # path -> ID
+        self._overrides: Dict[int, InputOverrides] = {}
+
+    # ── Contenuto ────────────────────────────────────────────────────────────
+
+    def add(self, file_info: FileInfo) -> Optional[int]:
+        """Aggiunge il file in fondo; restituisce il suo ID o None se già presente."""
+        if file_info.path in self._by_path:
+            return None
+        file_id = next(self._ids)
+        self._infos[file_id] = file_info
+        self._rows[file_id] = len(self._order)
+        self._order.append(file_id)
+        self._by_path[file_info.path] = file_id
+        return file_id
+
+    def remove(self, file_id: int) -> Optional[FileInfo]:
+        """Rimuove il file (e i suoi override); le righe successive scalano di uno."""
+        file_info = self._infos.pop(file_id, None)
+        if file_info is None:
+            return None
+        row = self._rows.pop(file_id)
+        del self._order[row]
+        for shifted in self._order[row:]:
+            self._rows[shifted] -= 1
+        self._by_path.pop(file_info.path, None)
+        self._overrides.pop(file_id, None)
+        return file_info
+
+    def clear(self) -> None:
+        """Svuota il registro (gli ID già assegnati non vengono riusati)."""
+        self._infos.clear()
+        self._order.clear()
+        self._rows.clear()
+        self._by_path.clear()
+        self._overrides.clear()
+
+    def reorder(self, file_ids: List[int]) -> None:
+        """Imposta un nuovo ordine delle righe (stessi ID, es. dopo un ordinamento)."""
+        if sorted(file_ids) != sorted(self._order):
+            raise ValueError("reorder() richiede esattamente gli ID presenti")
+        self._order = list(file_ids)
+        self._rows = {file_id: row for row, file_id in enumerate(self._order)}
+
+    def update_path(self, file_id: int, new_path: Path) -> None:
+        """Aggiorna path e nome originale dopo una rinomina (o il suo undo)."""
+        file_info = self._infos[file_id]
+        self._by_path.pop(file_info.path, None)
+        file_info.path = new_path
+        file_info.original_filename = new_path.name
+        self._by_path[new_path] = file_id
+
+    # ── Lookup ───────────────────────────────────────────────────────────────
+
+    def __len__(self) -> int:
+        return len(self._order)
+
+    def __iter__(self) -> Iterator[FileInfo]:
+        """FileInfo in ordine di riga."""
+        return (self._infos[file_id] for file_id in self._order)
+
+    def __contains__(self, path: Path) -> bool:
+        return path in self._by_path
+
+    def ids(self) -> List[int]:
+        """ID in ordine di riga."""
+        return list(self._order)
+
+    def get(self, file_id: int) -> Optional[FileInfo]:
+        return self._infos.get(file_id)
+
+    def id_at(self, row: int) -> Optional[int]:
+        if 0 <= row < len(self._order):
+            return self._order[row]
+        return None
+
+    def info_at(self, row: int) -> Optional[FileInfo]:
+        file_id = self.id_at(row)
+        return self._infos[file_id] if file_id is not None else None
+
+    def row_of(self, file_id: int) -> Optional[int]:
+        return self._rows.get(file_id)
+
+    def id_of_path(self, path: Path) -> Optional[int]:
+        return self._by_path.get(path)
+
+    # ── Override per file ────────────────────────────────────────────────────
+
+    def overrides(self, file_id: int) -> Optional[InputOverrides]:
+        """Override del file o None se non ne ha."""
+        return self._overrides.get(file_id)
+
+    def overrides_for_edit(self, file_id: int) -> InputOverrides:
+        """Override del file, creati vuoti se non esistono."""
+        overrides = self._overrides.get(file_id)
+        if overrides is None:
+            overrides = self._overrides[file_id] = InputOverrides()
+        return overrides
+
+    def clear_overrides(self) -> None:
+        self._overrides.clear()
+
+    def inheriting(self, fields: Iterable[str]) -> List[int]:
+        """
+        ID (in ordine di riga) dei file che prendono almeno uno dei campi
+        dall'input globale, cioè senza override su quel campo: sono le sole
+        righe da ricalcolare quando cambiano quei campi globali.
+        """
+        fields = list(fields)
+        if not fields:
+            return []
+        fixed = {
+            file_id for file_id, overrides in self._overrides.items()
+            if all(getattr(overrides, field) is not None for field in fields)
+        }
+        if not fixed:
+            return list(self._order)
+        return [file_id for file_id in self._order if file_id not in fixed]
@@ -0,0 +1,105 @@
+"""Scansione ricorsiva in streaming delle cartelle video (os.scandir)."""
+import fnmatch
+import os
+import re
+import time
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, List, Optional, TypeVar
+
+from .config import SCAN_BATCH_SIZE, SCAN_BATCH_MAX_SEC
+from .models import CancelToken, ScanOptions
+
+T = TypeVar("T")
+
+
+def parse_patterns(text: str) -> List[str]:
+    """Pattern glob separati da ';' o ',' (es. "GOPR*; *_proxy*")."""
+    return [p.strip() for p in re.split(r"[;,]", text) if p.strip()]
+
+
+def _matches_any(name: str, patterns: List[str]) -> bool:
+    lowered = name.lower()
+    return any(fnmatch.fnmatchcase(lowered, p.lower()) for p in patterns)
+
+
+def scan_videos(
+    root: Path,
+    options: Optional[ScanOptions] = None,
+    token: Optional[CancelToken] = None,
+    on_error: Optional[Callable[[Path, str], None]] = None,
+) -> Iterator[os.DirEntry]:
+    """
+    Percorre root in un solo passaggio e restituisce man mano i DirEntry
+    dei file video trovati (estensione case-insensitive), senza raccogliere
+    prima l'intero albero.
+
+    In ogni cartella i file escono in ordine di nome, prima di scendere
+    nelle sottocartelle (anch'esse in ordine). I link simbolici a cartelle
+    non vengono seguiti. token: interrompe la scansione al prossimo file.
+    on_error(cartella, messaggio): cartelle non leggibili (vengono saltate).
+    """
+    options = options or ScanOptions()
+    extensions = {e.lower() for e in options.extensions}
+    # Pila di (cartella, profondità): visita in profondità, ordine stabile
+    stack = [(Path(root), 0)]
+
+    while stack:
+        folder, depth = stack.pop()
+        if token is not None and token.cancelled:
+            return
+        try:
+            with os.scandir(folder) as it:
+                entries = sorted(it, key=lambda e: e.name.lower())
+        except OSError as e:
+            if on_error is not None:
+                on_error(folder, str(e))
+            continue
+
+        subdirs = []
+        for entry in entries:
+            if token is not None and token.cancelled:
+                return
+            name = entry.name
+            if options.skip_hidden and name.startswith("."):
+                continue
+            if options.exclude and _matches_any(name, options.exclude):
+                continue
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if options.max_depth is None or depth < options.max_depth:
+                        subdirs.append(Path(entry.path))
+                    continue
+                if not entry.is_file():
+                    continue
+            except OSError:
+                continue
+            if os.path.splitext(name)[1].lower() not in extensions:
+                continue
+            if options.include and not _matches_any(name, options.include):
+                continue
+            yield entry
+
+        stack.extend((d, depth + 1) for d in reversed(subdirs))
+
+
+def iter_batches(
+    items: Iterable[T],
+    batch_size: int = SCAN_BATCH_SIZE,
+    max_delay: float = SCAN_BATCH_MAX_SEC,
+) -> Iterator[List[T]]:
+    """
+    Raggruppa items in liste di al massimo batch_size elementi; un blocco
+    viene consegnato anche prima se è aperto da più di max_delay secondi,
+    così le prime righe arrivano subito anche su dischi lenti.
+    """
+    batch: List[T] = []
+    started = 0.0
+    for item in items:
+        if not batch:
+            started = time.monotonic()
+        batch.append(item)
+        if len(batch) >= batch_size or time.monotonic() - started >= max_delay:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
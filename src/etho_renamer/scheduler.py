@@ -0,0 +1,304 @@
+"""Scheduler del probing in background con concorrenza adattiva per dispositivo."""
+import heapq
+import itertools
+import os
+import sys
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, Optional, Any, List, Tuple
+
+from .config import (
+    PROBE_MAX_WORKERS, PROBE_INITIAL_DEVICE_CONCURRENCY,
+    PROBE_MAX_DEVICE_CONCURRENCY,
+)
+from .models import CancelToken
+
+# Dispositivo sconosciuto (stat della cartella fallito)
+UNKNOWN_DEVICE = -1
+
+# Priorità dei probe (valore più basso = prima)
+PRIORITY_VISIBLE = 0      # righe visibili nella tabella
+PRIORITY_CHECKED = 1      # righe spuntate (quelle che verranno rinominate)
+PRIORITY_BACKGROUND = 2   # tutto il resto
+
+# Variazione minima di throughput considerata significativa (5%)
+_THROUGHPUT_TOLERANCE = 0.05
+# Latenza media oltre questo multiplo della migliore = dispositivo in thrashing
+_LATENCY_THRASH_FACTOR = 4.0
+
+
+def lower_thread_io_priority() -> None:
+    """
+    Abbassa (best-effort) la priorità CPU/I-O del thread corrente.
+    Windows: THREAD_MODE_BACKGROUND_BEGIN; Linux: nice del thread
+    (gli scheduler I/O CFQ/BFQ ne derivano la priorità I/O).
+    """
+    try:
+        if sys.platform.startswith("win"):
+            import ctypes
+            kernel32 = ctypes.windll.kernel32
+            THREAD_MODE_BACKGROUND_BEGIN = 0x00010000
+            kernel32.SetThreadPriority(kernel32.GetCurrentThread(), THREAD_MODE_BACKGROUND_BEGIN)
+        elif sys.platform.startswith("linux"):
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 10)
+    except (OSError, AttributeError):
+        pass
+
+
+class _DeviceState:
+    """
+    Coda a priorità e controllo di concorrenza per un dispositivo (st_dev).
+
+    Il limite si adatta con un hill-climbing sul throughput misurato a
+    finestre: se aumentare i worker migliora il throughput si continua,
+    se peggiora (o la latenza esplode) si torna indietro.
+    """
+
+    def __init__(self, device: int, limit: int, max_limit: int):
+        self.device = device
+        # Heap di [priorità, seq, path, future]; path None = voce superata
+        self.pending: List[list] = []
+        self.queued = 0
+        self.active = 0
+        self.limit = limit
+        self.max_limit = max_limit
+        self.completed = 0
+        self.last_throughput: Optional[float] = None
+        self.best_latency: Optional[float] = None
+        self.direction = 1
+        self._reset_window()
+
+    def _reset_window(self) -> None:
+        self.window_start = time.monotonic()
+        self.window_done = 0
+        self.window_latency = 0.0
+        self.window_saturated = True
+
+    def mark_idle_slot(self) -> None:
+        """Registra che la coda era vuota con slot liberi: misura non valida."""
+        self.window_saturated = False
+
+    def on_complete(self, latency: float) -> None:
+        """Aggiorna le statistiche e, a fine finestra, il limite di concorrenza."""
+        self.completed += 1
+        self.window_done += 1
+        self.window_latency += latency
+
+        if self.window_done < max(4, 2 * self.limit):
+            return
+
+        elapsed = max(time.monotonic() - self.window_start, 1e-6)
+        throughput = self.window_done / elapsed
+        avg_latency = self.window_latency / self.window_done
+        saturated = self.window_saturated
+        self._reset_window()
+        if not saturated:
+            return
+
+        if self.best_latency is None or avg_latency < self.best_latency:
+            self.best_latency = avg_latency
+
+        if self.last_throughput is not None:
+            if throughput < self.last_throughput * (1 - _THROUGHPUT_TOLERANCE):
+                self.direction = -self.direction or -1
+            elif throughput <= self.last_throughput * (1 + _THROUGHPUT_TOLERANCE):
+                self.direction = 0 if self.direction else 1
+        if avg_latency > self.best_latency * _LATENCY_THRASH_FACTOR:
+            self.direction = -1
+
+        self.last_throughput = throughput
+        self.limit = max(1, min(self.max_limit, self.limit + self.direction))
+
+    def stats(self) -> dict:
+        return {
+            "limit": self.limit,
+            "active": self.active,
+            "pending": self.queued,
+            "completed": self.completed,
+            "throughput": self.last_throughput or 0.0,
+        }
+
+
+class ProbeScheduler:
+    """
+    Esegue func(path, token) in background raggruppando i file per dispositivo.
+
+    Ogni dispositivo ha il proprio limite di concorrenza adattivo, così una
+    scheda SD lenta e un NAS vengono saturati insieme senza che uno affami
+    l'altro. I worker girano a priorità I/O bassa (low_priority=True).
+    Dentro ogni dispositivo i probe partono in ordine di priorità, che può
+    essere cambiata finché il probe è in coda (reprioritize). cancel()
+    toglie un probe dalla coda o annulla il suo CancelToken se è in corso.
+    """
+
+    def __init__(
+        self,
+        func: Callable[[Path, CancelToken], Any],
+        max_workers: int = PROBE_MAX_WORKERS,
+        initial_limit: int = PROBE_INITIAL_DEVICE_CONCURRENCY,
+        max_limit: int = PROBE_MAX_DEVICE_CONCURRENCY,
+        low_priority: bool = True,
+    ):
+        self.func = func
+        self.initial_limit = initial_limit
+        self.max_limit = max_limit
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix="probe",
+            initializer=lower_thread_io_priority if low_priority else None,
+        )
+        self._lock = threading.Lock()
+        self._devices: Dict[int, _DeviceState] = {}
+        self._dir_devices: Dict[Path, int] = {}
+        self._queued: Dict[Path, tuple] = {}   # path -> (stato, voce heap)
+        self._running: Dict[Future, Tuple[Path, CancelToken]] = {}
+        self._seq = itertools.count()
+        self._shutdown = False
+
+    def submit(self, file_path: Path, priority: int = PRIORITY_BACKGROUND) -> Future:
+        """Accoda il probe di file_path; restituisce un Future con il risultato di func."""
+        future: Future = Future()
+        device = self._device_of(file_path)
+        with self._lock:
+            if self._shutdown:
+                future.cancel()
+                return future
+            state = self._devices.get(device)
+            if state is None:
+                state = _DeviceState(device, self.initial_limit, self.max_limit)
+                self._devices[device] = state
+            entry = [priority, next(self._seq), file_path, future]
+            heapq.heappush(state.pending, entry)
+            state.queued += 1
+            self._queued[file_path] = (state, entry)
+            self._dispatch(state)
+        return future
+
+    def reprioritize(self, priorities: Dict[Path, int]) -> int:
+        """
+        Cambia la priorità dei probe ancora in coda ({path: priorità}).
+        I path già avviati o sconosciuti vengono ignorati.
+        Restituisce il numero di probe spostati.
+        """
+        moved = 0
+        with self._lock:
+            for file_path, priority in priorities.items():
+                queued = self._queued.get(file_path)
+                if queued is None or queued[1][0] == priority:
+                    continue
+                state, old = queued
+                old[2] = None  # superata: scartata quando esce dall'heap
+                entry = [priority, next(self._seq), file_path, old[3]]
+                heapq.heappush(state.pending, entry)
+                self._queued[file_path] = (state, entry)
+                moved += 1
+        return moved
+
+    def cancel(self, file_path: Path) -> bool:
+        """
+        Annulla il probe di file_path: se è in coda viene rimosso, se è in
+        corso il suo token viene annullato (ffprobe terminato).
+        Restituisce True se c'era qualcosa da annullare.
+        """
+        with self._lock:
+            queued = self._queued.pop(file_path, None)
+            if queued is not None:
+                state, entry = queued
+                entry[2] = None
+                state.queued -= 1
+                pending_future = entry[3]
+            else:
+                pending_future = None
+                tokens = [
+                    token for path, token in self._running.values()
+                    if path == file_path
+                ]
+        # Fuori dal lock: i callback del Future possono richiamare lo scheduler
+        if pending_future is not None:
+            pending_future.cancel()
+            return True
+        for token in tokens:
+            token.cancel()
+        return bool(tokens)
+
+    def _device_of(self, file_path: Path) -> int:
+        """st_dev della cartella del file (un solo stat per cartella)."""
+        parent = file_path.parent
+        with self._lock:
+            device = self._dir_devices.get(parent)
+        if device is not None:
+            return device
+        try:
+            device = os.stat(parent).st_dev
+        except OSError:
+            device = UNKNOWN_DEVICE
+        with self._lock:
+            self._dir_devices[parent] = device
+        return device
+
+    def _dispatch(self, state: _DeviceState) -> None:
+        """Avvia task finché il dispositivo ha slot liberi (chiamare con lock acquisito)."""
+        while state.active < state.limit and state.queued:
+            entry = heapq.heappop(state.pending)
+            _, _, file_path, future = entry
+            if file_path is None:
+                continue
+            state.queued -= 1
+            queued = self._queued.get(file_path)
+            if queued is not None and queued[1] is entry:
+                del self._queued[file_path]
+            if not future.set_running_or_notify_cancel():
+                continue
+            state.active += 1
+            token = CancelToken()
+            self._running[future] = (file_path, token)
+            self._executor.submit(self._run, state, file_path, future, token)
+        if state.active < state.limit and not state.queued:
+            state.mark_idle_slot()
+
+    def _run(
+        self,
+        state: _DeviceState,
+        file_path: Path,
+        future: Future,
+        token: CancelToken,
+    ) -> None:
+        t0 = time.monotonic()
+        try:
+            result = self.func(file_path, token)
+        except BaseException as e:
+            future.set_exception(e)
+        else:
+            future.set_result(result)
+        finally:
+            latency = time.monotonic() - t0
+            with self._lock:
+                self._running.pop(future, None)
+                state.active -= 1
+                state.on_complete(latency)
+                if not self._shutdown:
+                    self._dispatch(state)
+
+    def device_stats(self) -> Dict[int, dict]:
+        """Per dispositivo: limite corrente, attivi, in coda, completati, throughput."""
+        with self._lock:
+            return {dev: st.stats() for dev, st in self._devices.items()}
+
+    def shutdown(self, wait: bool = False) -> None:
+        """Annulla i probe in coda e quelli in corso, poi ferma i worker."""
+        with self._lock:
+            self._shutdown = True
+            pending = []
+            for state in self._devices.values():
+                pending.extend(e[3] for e in state.pending if e[2] is not None)
+                state.pending.clear()
+                state.queued = 0
+            self._queued.clear()
+            running = [token for _, token in self._running.values()]
+        for future in pending:
+            future.cancel()
+        for token in running:
+            token.cancel()
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,285 @@
+"""Modello della tabella file (model/view): nessun widget o item per riga."""
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+from PySide6.QtCore import Qt, QAbstractTableModel, QModelIndex, Signal
+from PySide6.QtGui import QBrush, QColor, QPalette
+from PySide6.QtWidgets import QStyledItemDelegate
+
+from ..models import FileInfo
+from ..registry import FileRegistry
+
+# ── Column indices ────────────────────────────────────────────────────────────
+COL_CHECK    = 0
+COL_NAME     = 1
+COL_PUP      = 2
+COL_DURATION = 3
+COL_MTIME    = 4
+COL_NEWNAME  = 5
+COL_STATUS   = 6
+COL_MSG      = 7
+
+TABLE_HEADERS = [
+    "✓", "Nome attuale", "Pup", "Durata", "mtime",
+    "Nuovo nome", "Stato", "Messaggio",
+]
+
+# ── Cell colors ───────────────────────────────────────────────────────────────
+COLOR_PUP_FROM_LIST = QColor("#D1FAE5")   # green-100
+COLOR_PUP_OVERRIDE  = QColor("#EDE9FE")   # violet-100
+
+STATUS_BG: dict = {
+    "ok":       QColor("#ECFDF5"),
+    "error":    QColor("#FEF2F2"),
+    "conflict": QColor("#FFFBEB"),
+    "loading":  QColor("#EFF6FF"),
+    "estimated": QColor("#F5F3FF"),
+}
+STATUS_FG: dict = {
+    "ok":       QColor("#065F46"),
+    "error":    QColor("#991B1B"),
+    "conflict": QColor("#92400E"),
+    "loading":  QColor("#1E40AF"),
+    "estimated": QColor("#5B21B6"),
+}
+
+_FLAGS = Qt.ItemIsEnabled | Qt.ItemIsSelectable
+_CHECK_FLAGS = _FLAGS | Qt.ItemIsUserCheckable
+
+
+def media_tooltip(file_info: FileInfo) -> str:
+    """Codec, risoluzione, fps, bitrate e creation_time letti dal probe."""
+    parts = []
+    if file_info.codec:
+        parts.append(file_info.codec)
+    else:
+        # I lettori nativi (mvhd, PTS/PCR, indici AVCHD) danno solo la durata
+        parts.append("codec/risoluzione non letti (lettore rapido)")
+    if file_info.width and file_info.height:
+        parts.append(f"{file_info.width}x{file_info.height}")
+    if file_info.fps:
+        parts.append(f"{file_info.fps:.2f} fps")
+    if file_info.bit_rate:
+        parts.append(f"{file_info.bit_rate / 1e6:.1f} Mbit/s")
+    if file_info.creation_time:
+        parts.append(f"creato {file_info.creation_time:%Y-%m-%d %H:%M:%S}")
+    return " · ".join(parts)
+
+
+class FileTableModel(QAbstractTableModel):
+    """
+    Righe della tabella lette dal FileRegistry: la vista chiede solo le
+    celle visibili, quindi non esistono widget o item per riga.
+
+    Nome, durata e mtime vengono dal FileInfo; nuovo nome, stato e messaggio
+    dell'anteprima e il pup mostrato sono tenuti per ID file, con il numero
+    di righe per stato. Le spunte sono un flag per ID (bytearray), letto
+    senza passare dalla vista.
+    """
+
+    # Spunta cambiata dall'utente (per riordinare i probe)
+    check_toggled = Signal()
+
+    def __init__(self, registry: FileRegistry, parent=None):
+        super().__init__(parent)
+        self._registry = registry
+        self._checked = bytearray()
+        self._status: Dict[int, Tuple[str, str, str]] = {}   # ID -> (nuovo nome, stato, msg)
+        # Righe per stato, aggiornate a ogni cambio: la barra di stato le legge in O(1)
+        self._counts: Counter = Counter()
+        self._pup: Dict[int, Tuple[str, Optional[QColor]]] = {}
+        # Celle cambiate durante batch_updates(): (riga min, col min, riga max, col max)
+        self._batch_depth = 0
+        self._dirty: Optional[List[int]] = None
+
+    # ── Righe ────────────────────────────────────────────────────────────────
+
+    def add(self, file_info: FileInfo, checked: bool = True) -> Optional[int]:
+        """Aggiunge il file in fondo; restituisce il suo ID o None se già presente."""
+        if file_info.path in self._registry:
+            return None
+        row = len(self._registry)
+        self.beginInsertRows(QModelIndex(), row, row)
+        file_id = self._registry.add(file_info)
+        if file_id >= len(self._checked):
+            self._checked.extend(bytes(file_id + 1 - len(self._checked)))
+        self._checked[file_id] = checked
+        self._status[file_id] = ("", "pending", "")
+        self._counts["pending"] += 1
+        self.endInsertRows()
+        return file_id
+
+    def clear(self) -> None:
+        """Svuota registro e tabella."""
+        self.beginResetModel()
+        self._registry.clear()
+        self._dirty = None
+        self._checked = bytearray()
+        self._status.clear()
+        self._counts.clear()
+        self._pup.clear()
+        self.endResetModel()
+
+    def refresh(self, row: int, first_col: int, last_col: Optional[int] = None) -> None:
+        """Ridisegna le celle della riga (dopo una modifica al FileInfo)."""
+        if last_col is None:
+            last_col = first_col
+        if self._batch_depth:
+            dirty = self._dirty
+            if dirty is None:
+                self._dirty = [row, first_col, row, last_col]
+            else:
+                dirty[0] = min(dirty[0], row)
+                dirty[1] = min(dirty[1], first_col)
+                dirty[2] = max(dirty[2], row)
+                dirty[3] = max(dirty[3], last_col)
+            return
+        self.dataChanged.emit(self.index(row, first_col), self.index(row, last_col))
+
+    @contextmanager
+    def batch_updates(self):
+        """
+        Raccoglie le modifiche di molte righe in un solo dataChanged (il
+        rettangolo che le contiene): la vista ridisegna comunque solo le
+        celle visibili.
+        """
+        self._batch_depth += 1
+        try:
+            yield
+        finally:
+            self._batch_depth -= 1
+            if not self._batch_depth and self._dirty is not None:
+                top, left, bottom, right = self._dirty
+                self._dirty = None
+                self.dataChanged.emit(self.index(top, left), self.index(bottom, right))
+
+    # ── Spunte ───────────────────────────────────────────────────────────────
+
+    def is_checked(self, row: int) -> bool:
+        file_id = self._registry.id_at(row)
+        return file_id is not None and bool(self._checked[file_id])
+
+    def set_checked(self, row: int, checked: bool) -> None:
+        file_id = self._registry.id_at(row)
+        if file_id is not None and bool(self._checked[file_id]) != checked:
+            self._checked[file_id] = checked
+            self.refresh(row, COL_CHECK)
+            self.check_toggled.emit()
+
+    def checked_rows(self) -> List[int]:
+        """Indici delle righe spuntate, in ordine."""
+        checked = self._checked
+        return [row for row, file_id in enumerate(self._registry.ids()) if checked[file_id]]
+
+    # ── Anteprima ────────────────────────────────────────────────────────────
+
+    def set_status(self, row: int, new_name: str, status: str, msg: str) -> None:
+        """Nuovo nome, stato e messaggio della riga (ridisegna solo se cambiano)."""
+        file_id = self._registry.id_at(row)
+        old = self._status[file_id]
+        if old == (new_name, status, msg):
+            return
+        self._status[file_id] = (new_name, status, msg)
+        if old[1] != status:
+            self._counts[old[1]] -= 1
+            self._counts[status] += 1
+        changed = [col for col, a, b in zip(
+            (COL_NEWNAME, COL_STATUS, COL_MSG), old, (new_name, status, msg)) if a != b]
+        self.refresh(row, changed[0], changed[-1])
+
+    def status(self, row: int) -> str:
+        return self._status[self._registry.id_at(row)][1]
+
+    def status_count(self, *statuses: str) -> int:
+        """Numero di righe con uno degli stati dati."""
+        return sum(self._counts[status] for status in statuses)
+
+    def new_name(self, row: int) -> str:
+        return self._status[self._registry.id_at(row)][0]
+
+    def set_pup(self, row: int, pup: str, color: Optional[QColor] = None) -> None:
+        """Pup mostrato; con un colore è un valore da lista o override (non ricalcolato)."""
+        file_id = self._registry.id_at(row)
+        if self._pup.get(file_id) == (pup, color):
+            return
+        self._pup[file_id] = (pup, color)
+        self.refresh(row, COL_PUP)
+
+    def pup_is_override(self, row: int) -> bool:
+        pup = self._pup.get(self._registry.id_at(row))
+        return pup is not None and pup[1] is not None
+
+    # ── QAbstractTableModel ──────────────────────────────────────────────────
+
+    def rowCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self._registry)
+
+    def columnCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(TABLE_HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return TABLE_HEADERS[section]
+        return None
+
+    def flags(self, index):
+        return _CHECK_FLAGS if index.column() == COL_CHECK else _FLAGS
+
+    def data(self, index, role=Qt.DisplayRole):
+        file_id = self._registry.id_at(index.row())
+        if file_id is None:
+            return None
+        col = index.column()
+
+        if role == Qt.DisplayRole:
+            if col >= COL_NEWNAME:
+                return self._status[file_id][col - COL_NEWNAME]
+            file_info = self._registry.get(file_id)
+            if col == COL_NAME:
+                return file_info.original_filename
+            if col == COL_PUP:
+                return self._pup.get(file_id, ("", None))[0]
+            if col == COL_DURATION:
+                if file_info.duration_sec is not None:
+                    prefix = "~" if file_info.duration_provisional else ""
+                    return f"{prefix}{file_info.duration_sec:.1f}s"
+                return "ERR" if file_info.error else "..."
+            if col == COL_MTIME:
+                return (file_info.mtime.strftime("%Y-%m-%d %H:%M:%S")
+                        if file_info.mtime else "")
+            return None
+
+        if role == Qt.CheckStateRole and col == COL_CHECK:
+            return Qt.Checked if self._checked[file_id] else Qt.Unchecked
+
+        if role == Qt.BackgroundRole and col == COL_PUP:
+            return self._pup.get(file_id, ("", None))[1]
+
+        if role == Qt.ToolTipRole and col == COL_DURATION:
+            file_info = self._registry.get(file_id)
+            if file_info.duration_provisional:
+                return "Stima da dimensione file, in attesa del probe esatto"
+            if file_info.duration_sec is not None:
+                return media_tooltip(file_info)
+            return str(file_info.error) if file_info.error else None
+        return None
+
+    def setData(self, index, value, role=Qt.EditRole) -> bool:
+        if role != Qt.CheckStateRole or index.column() != COL_CHECK:
+            return False
+        self.set_checked(index.row(), Qt.CheckState(value) == Qt.Checked)
+        return True
+
+
+class StatusDelegate(QStyledItemDelegate):
+    """Colonna Stato: sfondo e testo colorati da STATUS_BG / STATUS_FG."""
+
+    def initStyleOption(self, option, index):
+        super().initStyleOption(option, index)
+        status = index.data()
+        option.displayAlignment = Qt.AlignCenter
+        if status in STATUS_BG:
+            option.backgroundBrush = QBrush(STATUS_BG[status])
+        if status in STATUS_FG:
+            option.palette.setColor(QPalette.Text, STATUS_FG[status])
@@ -1,68 +1,62 @@
 """Finestra principale UI con PySide6."""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import fields
 from pathlib import Path
 from datetime import datetime
+from collections import deque
 from typing import List, Optional, Dict
-from concurrent.futures import ThreadPoolExecutor
 
 from PySide6.QtWidgets import (
     QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QGridLayout,
-    QLineEdit, QComboBox, QPushButton, QTableWidget, QTableWidgetItem,
+    QLineEdit, QComboBox, QPushButton, QTableView,
     QFileDialog, QCheckBox, QLabel, QTextEdit, QStatusBar,
-    QHeaderView, QAbstractItemView, QPlainTextEdit, QGroupBox,
+    QHeaderView, QAbstractItemView, QPlainTextEdit, QGroupBox, QSpinBox,
+    QMessageBox,
 )
-from PySide6.QtCore import Qt, QTimer, Signal, QObject
-from PySide6.QtGui import QColor
+from PySide6.QtCore import Qt, QTimer, Signal, QObject, QFileSystemWatcher
 
 from ..models import (
-    FileInfo, InputData, InputOverrides, ObservationRecord,
-    RenameOperation, UndoManager,
+    FileInfo, InputData, InputOverrides, ObservationRecord, RenameResult, RenamePlan,
+    RenameOperation, UndoManager, CancelToken, ScanOptions, RateMeter,
 )
 from ..config import (
     SUPPORTED_EXTENSIONS, MONTHS, DEFAULT_INITIALS, DEFAULT_PART,
-    PREVIEW_DEBOUNCE_MS,
+    PREVIEW_DEBOUNCE_MS, PREVIEW_DEBOUNCE_MAX_MS, PREVIEW_ASYNC_MIN_ROWS,
+    PREVIEW_CHUNK_ROWS, DEFAULT_USE_CREATION_TIME, SCAN_DEFAULT_MAX_DEPTH,
+    DIR_WATCH_MAX, AUTO_RENAME_BATCH_MS, PROBE_FLUSH_MS,
 )
 from ..validation import (
     validate_all, normalize_pup, normalize_mama_name, normalize_year,
     normalize_initials, normalize_part, normalize_month,
 )
-from ..ffprobe import get_duration
+from ..ffprobe import get_default_engine
+from ..scheduler import (
+    ProbeScheduler, PRIORITY_VISIBLE, PRIORITY_CHECKED, PRIORITY_BACKGROUND,
+)
+from ..cache import get_default_cache
+from ..journal import get_default_journal
+from ..avchd import find_stream_dir, fill_durations_from_index
+from ..estimate import BitrateModel, apply_provisional_duration
+from ..registry import FileRegistry
+from ..conflicts import DirectoryCache, CollisionIndex, suggest_parts
+from ..scanner import scan_videos, iter_batches, parse_patterns
+from ..batch import compute_new_filenames_for
+from ..planner import build_plan, check_plan, apply_plan, save_plan, load_plan
 from ..core import (
-    prepare_file_info, compute_new_filename, handle_rename,
-    extract_observation_from_file, resolve_input,
+    prepare_file_info, prepare_file_infos,
+    extract_observation_from_file, resolve_input, apply_media_info,
 )
 from ..report import export_csv, export_observations_csv
+from .file_table import (
+    FileTableModel, StatusDelegate,
+    COL_CHECK, COL_NAME, COL_PUP, COL_DURATION, COL_STATUS,
+    COLOR_PUP_FROM_LIST, COLOR_PUP_OVERRIDE,
+)
 
-# ── Column indices ────────────────────────────────────────────────────────────
-COL_CHECK    = 0
-COL_NAME     = 1
-COL_PUP      = 2
-COL_DURATION = 3
-COL_MTIME    = 4
-COL_NEWNAME  = 5
-COL_STATUS   = 6
-COL_MSG      = 7
-
-TABLE_HEADERS = [
-    "✓", "Nome attuale", "Pup", "Durata", "mtime",
-    "Nuovo nome", "Stato", "Messaggio",
-]
-
-# ── Cell colors ───────────────────────────────────────────────────────────────
-COLOR_PUP_FROM_LIST = QColor("#D1FAE5")   # green-100
-COLOR_PUP_OVERRIDE  = QColor("#EDE9FE")   # violet-100
-
-STATUS_BG: dict = {
-    "ok":       QColor("#ECFDF5"),
-    "error":    QColor("#FEF2F2"),
-    "conflict": QColor("#FFFBEB"),
-    "loading":  QColor("#EFF6FF"),
-}
-STATUS_FG: dict = {
-    "ok":       QColor("#065F46"),
-    "error":    QColor("#991B1B"),
-    "conflict": QColor("#92400E"),
-    "loading":  QColor("#1E40AF"),
-}
+# Campi dell'input globale che una riga può ereditare (o sovrascrivere)
+INPUT_FIELDS = [f.name for f in fields(InputOverrides)]
 
 # ── Application stylesheet ────────────────────────────────────────────────────
 APP_STYLESHEET = """
@@ -168,7 +162,7 @@ QLineEdit:focus, QComboBox:focus, QPlainTextEdit:focus {
 QComboBox::drop-down { border: none; width: 20px; }
 
 /* Table */
-QTableWidget {
+QTableView {
     background-color: #FFFFFF;
     border: 1px solid #E5E7EB;
     border-radius: 8px;
@@ -177,7 +171,7 @@ QTableWidget {
     selection-color: #1E40AF;
     alternate-background-color: #F9FAFB;
 }
-QTableWidget::item { padding: 3px 6px; }
+QTableView::item { padding: 3px 6px; }
 QHeaderView::section {
     background-color: #F9FAFB;
     border: none;
@@ -230,7 +224,17 @@ QLabel {
 
 class UpdateSignal(QObject):
     """Segnale thread-safe per aggiornamenti da worker."""
-    preview_updated = Signal(int, str, str, str)
+    # Probe concluso (file_id, future): consegnato al thread della UI
+    probe_done = Signal(int, object)
+    # Scansione cartella: blocco di FileInfo pronti; fine (trovati, annullata, errori)
+    scan_batch = Signal(object)
+    scan_finished = Signal(int, bool, object)
+    # Rinomina in background: avanzamento, blocco di operazioni eseguite, fine
+    rename_progress = Signal(int, int)
+    rename_operations = Signal(object)
+    rename_finished = Signal(object)
+    # Anteprima in background: blocco di nomi calcolati per una generazione
+    preview_chunk = Signal(object)
 
 
 class MainWindow(QMainWindow):
@@ -242,15 +246,65 @@ class MainWindow(QMainWindow):
         self.setGeometry(100, 100, 1450, 950)
 
         # ── State ──────────────────────────────────────────────────────────────
-        self.files: List[FileInfo] = []
-        self.per_file_overrides: Dict[int, InputOverrides] = {}
+        # File in tabella: ID stabili, indici path/riga e override per file
+        self.registry = FileRegistry()
+        self.table_model = FileTableModel(self.registry)
+        self.table_model.check_toggled.connect(self._schedule_reprioritize)
+        # Conflitti: nomi per cartella in memoria + nuovi nomi uguali nel batch
+        self.dir_cache = DirectoryCache()
+        self.collisions = CollisionIndex()
+        self.dir_watcher = QFileSystemWatcher()
+        self.dir_watcher.directoryChanged.connect(self._on_directory_changed)
+        self.watched_dirs: set = set()
+        self.last_global_input: Optional[InputData] = None
+        # Input con cui è stata calcolata l'intera anteprima: al debounce si
+        # ricalcolano solo le righe che ereditano i campi cambiati
+        self.preview_input: Optional[InputData] = None
+        self.preview_use_creation_time = False
+        self.preview_stale = True
+        # Anteprima in background: ogni calcolo ha un numero di generazione e
+        # i risultati di generazioni superate vengono scartati
+        self.preview_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="preview")
+        self.preview_future = None
+        self.preview_generation = 0
+        self.preview_job: Optional[tuple] = None   # (gen, input, creation_time, completa, t0)
+        self.preview_renamed_targets: List[Path] = []
+        self.preview_chunks: deque = deque()       # blocchi arrivati, uno per giro di eventi
+        self.preview_touched: set = set()          # righe aggiornate da sole nel frattempo
+        self.preview_cost_ms: Optional[float] = None
+        self.preview_debounce_ms = PREVIEW_DEBOUNCE_MS
         self.rename_results = []
         self.observations: List[ObservationRecord] = []
-        self.undo_manager = UndoManager()
+        # Journal delle rinomine: recupero dopo un crash e undo tra sessioni
+        self.journal = get_default_journal()
+        self.undo_manager = UndoManager(self.journal)
 
         # ── Threading ──────────────────────────────────────────────────────────
-        self.executor = ThreadPoolExecutor(max_workers=4)
-        self.pending_previews: dict = {}
+        self.probe_engine = get_default_engine()
+        # Concorrenza per dispositivo (SD, SSD, NAS), adattiva e a bassa priorità I/O
+        self.probe_scheduler = ProbeScheduler(self._probe_file)
+        # Con "Ora da creation_time" i file senza creation_time nativo vanno a ffprobe
+        self.probe_creation_time = DEFAULT_USE_CREATION_TIME
+        self.pending_probes: Dict[int, object] = {}   # file_id -> Future
+        # Probe conclusi in attesa di essere mostrati: applicati a blocchi
+        self.probe_results: List[tuple] = []          # (file_id, future)
+        self.probe_flush_timer = QTimer()
+        self.probe_flush_timer.setSingleShot(True)
+        self.probe_flush_timer.timeout.connect(self._flush_probe_results)
+        # File con durata nota al secondo (probe o indice AVCHD), e rinomine al secondo
+        self.probe_rate = RateMeter()
+        self.rename_rate = RateMeter()
+
+        # Durate provvisorie da dimensione/bitrate, apprese dai probe esatti
+        self.bitrate_model = BitrateModel()
+        cache = get_default_cache()
+        if cache is not None:
+            self.bitrate_model.learn_many(cache.samples())
+
+        # Riordino delle priorità dei probe (scroll / selezione)
+        self.reprioritize_timer = QTimer()
+        self.reprioritize_timer.setSingleShot(True)
+        self.reprioritize_timer.timeout.connect(self._reprioritize_probes)
 
         # ── Debounce ───────────────────────────────────────────────────────────
         self.preview_timer = QTimer()
@@ -258,10 +312,32 @@ class MainWindow(QMainWindow):
         self.preview_timer.setSingleShot(True)
 
         self.update_signal = UpdateSignal()
+        self.update_signal.scan_batch.connect(self._on_scan_batch)
+        self.update_signal.scan_finished.connect(self._on_scan_finished)
+        self.scan_token: Optional[CancelToken] = None
+        self.update_signal.rename_progress.connect(self._on_rename_progress)
+        self.update_signal.rename_operations.connect(self._on_rename_operations)
+        self.update_signal.rename_finished.connect(self._on_rename_finished)
+        self.rename_token: Optional[CancelToken] = None
+        self.rename_thread: Optional[threading.Thread] = None
+
+        # Rinomina automatica: righe pronte dopo il probe, raccolte a blocchi
+        self.auto_rename = False
+        self.auto_rename_ids: List[int] = []
+        # Input non valido: la coda resta in attesa della prossima modifica
+        self.auto_rename_paused = False
+        self.auto_rename_timer = QTimer()
+        self.auto_rename_timer.setSingleShot(True)
+        self.auto_rename_timer.timeout.connect(self._flush_auto_rename)
+        self.update_signal.probe_done.connect(self._on_probe_done)
+        self.update_signal.preview_chunk.connect(self._on_preview_chunk)
 
         self._setup_ui()
         self.setStyleSheet(APP_STYLESHEET)
 
+        if self.journal is not None and self.journal.incomplete():
+            QTimer.singleShot(0, self._recover_interrupted_renames)
+
     # ══════════════════════════════════════════════════════════════════════════
     #  UI Setup
     # ══════════════════════════════════════════════════════════════════════════
@@ -310,16 +386,53 @@ class MainWindow(QMainWindow):
         self.btn_choose_folder.setObjectName("btn_open_folder")
         self.btn_choose_folder.clicked.connect(self._on_choose_folder)
 
+        self.btn_cancel_scan = QPushButton("Annulla scansione")
+        self.btn_cancel_scan.setEnabled(False)
+        self.btn_cancel_scan.clicked.connect(self._on_cancel_scan)
+
+        self.spin_scan_depth = QSpinBox()
+        self.spin_scan_depth.setRange(-1, 99)
+        self.spin_scan_depth.setSpecialValueText("illimitata")
+        self.spin_scan_depth.setValue(
+            -1 if SCAN_DEFAULT_MAX_DEPTH is None else SCAN_DEFAULT_MAX_DEPTH
+        )
+        self.spin_scan_depth.setToolTip(
+            "Livelli di sottocartelle da esplorare (0 = solo la cartella scelta)"
+        )
+
+        self.input_scan_include = QLineEdit()
+        self.input_scan_include.setPlaceholderText("Includi (es. GOPR*)")
+        self.input_scan_include.setToolTip(
+            "Pattern sul nome file separati da ; — vuoto = tutti i video"
+        )
+        self.input_scan_exclude = QLineEdit()
+        self.input_scan_exclude.setPlaceholderText("Escludi (es. BACKUP; *_proxy*)")
+        self.input_scan_exclude.setToolTip(
+            "Pattern su nomi di file e cartelle da saltare, separati da ;"
+        )
+
+        self.btn_clear_files = QPushButton("Svuota lista")
+        self.btn_clear_files.setToolTip(
+            "Rimuove tutti i file dalla tabella e annulla le analisi in corso"
+        )
+        self.btn_clear_files.clicked.connect(self._on_clear_files)
+
         layout.addWidget(self.btn_choose_files)
         layout.addWidget(self.btn_choose_folder)
+        layout.addWidget(self.btn_cancel_scan)
+        layout.addWidget(QLabel("Profondità:"))
+        layout.addWidget(self.spin_scan_depth)
+        layout.addWidget(self.input_scan_include)
+        layout.addWidget(self.input_scan_exclude)
         layout.addStretch()
+        layout.addWidget(self.btn_clear_files)
         return layout
 
-    def _build_table(self) -> QTableWidget:
-        """Tabella file."""
-        self.table = QTableWidget()
-        self.table.setColumnCount(len(TABLE_HEADERS))
-        self.table.setHorizontalHeaderLabels(TABLE_HEADERS)
+    def _build_table(self) -> QTableView:
+        """Tabella file (vista sul FileTableModel)."""
+        self.table = QTableView()
+        self.table.setModel(self.table_model)
+        self.table.setItemDelegateForColumn(COL_STATUS, StatusDelegate(self.table))
         self.table.setAlternatingRowColors(True)
         self.table.verticalHeader().setVisible(False)
         self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
@@ -332,6 +445,10 @@ class MainWindow(QMainWindow):
         hh.setSectionResizeMode(COL_PUP,      QHeaderView.ResizeToContents)
         hh.setSectionResizeMode(COL_DURATION, QHeaderView.ResizeToContents)
         hh.setSectionResizeMode(COL_STATUS,   QHeaderView.ResizeToContents)
+        # Larghezze calcolate sulle sole righe visibili, non a ogni blocco su 1000 righe
+        hh.setResizeContentsPrecision(0)
+
+        self.table.verticalScrollBar().valueChanged.connect(self._schedule_reprioritize)
         return self.table
 
     def _build_common_fields_group(self) -> QGroupBox:
@@ -465,17 +582,47 @@ class MainWindow(QMainWindow):
 
         self.checkbox_dryrun = QCheckBox("Dry-run (solo anteprima)")
         self.checkbox_dryrun.setChecked(True)
+        self.checkbox_dryrun.toggled.connect(self._sync_auto_rename)
         layout.addWidget(self.checkbox_dryrun)
 
+        self.checkbox_auto_rename = QCheckBox("Rinomina automatica")
+        self.checkbox_auto_rename.setToolTip(
+            "Rinomina ogni file appena la durata è nota, se la riga è spuntata "
+            "e senza conflitti (solo con Dry-run disattivato). Le altre righe "
+            "restano per il pulsante Rinomina"
+        )
+        self.checkbox_auto_rename.toggled.connect(self._sync_auto_rename)
+        layout.addWidget(self.checkbox_auto_rename)
+
+        self.checkbox_creation_time = QCheckBox("Ora da creation_time")
+        self.checkbox_creation_time.setChecked(DEFAULT_USE_CREATION_TIME)
+        self.checkbox_creation_time.setToolTip(
+            "Usa l'ora di creazione scritta dalla camera nel video invece di "
+            "mtime - durata (per file copiati con data di modifica reimpostata). "
+            "MP4/MOV la leggono subito; per MTS/M2TS serve ffprobe, che viene "
+            "lanciato solo quando l'opzione è attiva"
+        )
+        self.checkbox_creation_time.toggled.connect(self._on_creation_time_toggled)
+        self.checkbox_creation_time.toggled.connect(self._on_input_changed)
+        layout.addWidget(self.checkbox_creation_time)
+
         self.btn_update_preview = QPushButton("Aggiorna anteprima")
-        self.btn_update_preview.clicked.connect(self._on_update_preview)
+        self.btn_update_preview.clicked.connect(lambda: self._on_update_preview())
         layout.addWidget(self.btn_update_preview)
 
+        self.btn_resolve_collisions = QPushButton("PartN ai duplicati")
+        self.btn_resolve_collisions.setToolTip(
+            "Assegna Part1, Part2, ... (in ordine di riga) ai file che "
+            "otterrebbero lo stesso nuovo nome"
+        )
+        self.btn_resolve_collisions.clicked.connect(self._on_resolve_collisions)
+        layout.addWidget(self.btn_resolve_collisions)
+
         layout.addStretch()
 
         self.btn_undo = QPushButton("⟲ Annulla ultima rinomina")
         self.btn_undo.setObjectName("btn_undo")
-        self.btn_undo.setEnabled(False)
+        self.btn_undo.setEnabled(self.undo_manager.can_undo())
         self.btn_undo.setToolTip(
             "Ripristina i nomi originali dell'ultimo batch di rinomina"
         )
@@ -487,6 +634,23 @@ class MainWindow(QMainWindow):
         self.btn_export_csv.clicked.connect(self._on_export_csv)
         layout.addWidget(self.btn_export_csv)
 
+        self.btn_save_plan = QPushButton("Salva piano…")
+        self.btn_save_plan.setToolTip(
+            "Salva le rinomine previste (in ordine, scambi inclusi) in un file "
+            "JSON da rivedere o riapplicare"
+        )
+        self.btn_save_plan.clicked.connect(self._on_save_plan)
+        layout.addWidget(self.btn_save_plan)
+
+        self.btn_apply_plan = QPushButton("Applica piano…")
+        self.btn_apply_plan.clicked.connect(self._on_apply_plan_file)
+        layout.addWidget(self.btn_apply_plan)
+
+        self.btn_cancel_rename = QPushButton("Annulla rinomina")
+        self.btn_cancel_rename.setVisible(False)
+        self.btn_cancel_rename.clicked.connect(self._on_cancel_rename)
+        layout.addWidget(self.btn_cancel_rename)
+
         self.btn_rename = QPushButton("Rinomina")
         self.btn_rename.setObjectName("btn_rename")
         self.btn_rename.clicked.connect(self._on_rename)
@@ -514,66 +678,182 @@ class MainWindow(QMainWindow):
             "",
             f"Video ({ext_filter});;Tutti (*.*)",
         )
-        for fp in files:
-            self._add_file(Path(fp))
+        file_infos, errors = prepare_file_infos(Path(fp) for fp in files)
+        for _, err in errors:
+            self._log(f"[ERROR] {err}")
+        for file_info in file_infos:
+            self._add_file_info(file_info)
         self._update_status_bar()
 
     def _on_choose_folder(self):
-        """Dialog selezione cartella (non ricorsivo)."""
+        """
+        Dialog selezione cartella: scansione ricorsiva in background.
+        Le righe compaiono a blocchi mentre la scansione procede.
+        Se la cartella è una scheda AVCHD, le durate vengono lette dagli
+        indici CLIPINF/PLAYLIST e solo le clip non coperte vanno a ffprobe.
+        """
         folder = QFileDialog.getExistingDirectory(self, "Seleziona cartella")
         if not folder:
             return
-        folder_path = Path(folder)
-        found = []
-        for ext in SUPPORTED_EXTENSIONS:
-            found.extend(folder_path.glob(f"*{ext}"))
-            found.extend(folder_path.glob(f"*{ext.upper()}"))
-        for fp in sorted(set(found)):
-            self._add_file(fp)
+        self._start_scan(Path(folder))
+
+    def _start_scan(self, folder_path: Path):
+        """Avvia la scansione di folder_path su un thread (una alla volta)."""
+        if self.scan_token is not None:
+            self.scan_token.cancel()
+
+        stream_dir = find_stream_dir(folder_path)
+        if stream_dir is not None and stream_dir != folder_path:
+            self._log(f"[INFO] Scheda AVCHD: uso {stream_dir}")
+            folder_path = stream_dir
+
+        depth = self.spin_scan_depth.value()
+        options = ScanOptions(
+            max_depth=None if depth < 0 else depth,
+            include=parse_patterns(self.input_scan_include.text()),
+            exclude=parse_patterns(self.input_scan_exclude.text()),
+        )
+        token = CancelToken()
+        self.scan_token = token
+        self.btn_cancel_scan.setEnabled(True)
+        self._log(f"[INFO] Scansione di {folder_path}...")
+
+        signals = self.update_signal
+
+        def worker():
+            errors = []
+            found = 0
+            card_index = {}   # indici AVCHD per cartella, letti una volta per scansione
+            entries = scan_videos(
+                folder_path, options, token,
+                on_error=lambda p, msg: errors.append(f"{p}: {msg}"),
+            )
+            for batch in iter_batches(entries):
+                if token.cancelled:
+                    break
+                # stat (anche concorrenti su share di rete) fuori dal thread UI
+                file_infos, file_errors = prepare_file_infos(batch)
+                found += len(file_infos)
+                errors.extend(msg for _, msg in file_errors)
+                fill_durations_from_index(file_infos, card_index)
+                signals.scan_batch.emit((token, file_infos))
+            signals.scan_finished.emit(found, token.cancelled, (token, errors))
+
+        threading.Thread(target=worker, name="scan", daemon=True).start()
+
+    def _on_cancel_scan(self):
+        """Interrompe la scansione in corso (le righe già aggiunte restano)."""
+        if self.scan_token is not None:
+            self.scan_token.cancel()
+
+    def _on_scan_batch(self, payload):
+        """Blocco di file dalla scansione: aggiunge le righe e avvia i probe."""
+        token, file_infos = payload
+        if token is not self.scan_token or token.cancelled:
+            return
+
+        from_index = 0
+        self.table.setUpdatesEnabled(False)
+        try:
+            rows = []
+            for file_info in file_infos:
+                # Durate dagli indici AVCHD già lette dal thread di scansione
+                row = self._add_file_info(file_info, queue_probe=False, preview=False)
+                if row is None:
+                    continue
+                file_info = self.registry.info_at(row)
+                if file_info.duration_sec is None or file_info.duration_provisional:
+                    self._queue_preview(row)
+                else:
+                    from_index += 1
+                    if self.probe_creation_time:   # non è negli indici AVCHD
+                        self._queue_preview(row)
+                if file_info.duration_sec is not None:
+                    rows.append(row)
+            # Un solo calcolo per le righe con durata esatta o stimata
+            self._update_preview_for_rows(rows)
+            self.probe_rate.add(from_index)
+        finally:
+            self.table.setUpdatesEnabled(True)
+        if from_index:
+            self._log(f"[OK] Durate lette dagli indici AVCHD: {from_index} file")
         self._update_status_bar()
 
-    def _add_file(self, file_path: Path):
-        """Aggiunge un file alla tabella."""
-        if any(f.path == file_path for f in self.files):
-            self._log(f"[WARN] File già in lista: {file_path.name}")
+    def _on_scan_finished(self, found: int, cancelled: bool, payload):
+        """Fine scansione: riepilogo nel log."""
+        token, errors = payload
+        if token is not self.scan_token:
             return
+        self.scan_token = None
+        self.btn_cancel_scan.setEnabled(False)
+        for err in errors[:5]:
+            self._log(f"[WARN] Non leggibile: {err}")
+        if len(errors) > 5:
+            self._log(f"[WARN] ... altri {len(errors) - 5} elementi non leggibili")
+        if cancelled:
+            self._log(f"[INFO] Scansione annullata ({found} video trovati)")
+        else:
+            self._log(f"[OK] Scansione completata: {found} video trovati")
+
+    def _on_clear_files(self):
+        """Svuota la tabella annullando scansione e probe ancora in coda o in corso."""
+        self._on_cancel_scan()
+        for file_id in list(self.pending_probes):
+            file_info = self.registry.get(file_id)
+            if file_info is not None:
+                self.probe_scheduler.cancel(file_info.path)
+        self.pending_probes.clear()
+        self.table_model.clear()
+        self.collisions.clear()
+        if self.watched_dirs:
+            self.dir_watcher.removePaths(list(self.watched_dirs))
+            self.watched_dirs.clear()
+        self._update_status_bar()
+
+    def _add_file(self, file_path: Path, queue_probe: bool = True) -> Optional[int]:
+        """
+        Aggiunge un file alla tabella.
+        Restituisce l'indice di riga o None se il file non è stato aggiunto.
+        """
+        if file_path in self.registry:
+            self._log(f"[WARN] File già in lista: {file_path.name}")
+            return None
 
         file_info, err = prepare_file_info(file_path)
         if err:
             self._log(f"[ERROR] {err}")
-            return
-
-        self.files.append(file_info)
-        row = len(self.files) - 1
-        self.table.insertRow(row)
-
-        # Col 0: checkbox
-        cb = QCheckBox()
-        cb.setChecked(True)
-        self.table.setCellWidget(row, COL_CHECK, cb)
-
-        # Col 1: nome file originale
-        self.table.setItem(row, COL_NAME, QTableWidgetItem(file_path.name))
-
-        # Col 2: pup (vuoto finché non assegnato)
-        self.table.setItem(row, COL_PUP, QTableWidgetItem(""))
+            return None
+        return self._add_file_info(file_info, queue_probe)
 
-        # Col 3: durata
-        self.table.setItem(row, COL_DURATION, QTableWidgetItem("..."))
+    def _add_file_info(
+        self,
+        file_info: FileInfo,
+        queue_probe: bool = True,
+        preview: bool = True,
+    ) -> Optional[int]:
+        """
+        Aggiunge alla tabella un FileInfo già preparato.
+        Con preview=False l'anteprima della durata stimata è lasciata al
+        chiamante (che la calcola per tutto il blocco).
+        Restituisce l'indice di riga o None se il file era già in lista.
+        """
+        file_path = file_info.path
+        file_id = self.table_model.add(file_info)
+        if file_id is None:
+            self._log(f"[WARN] File già in lista: {file_path.name}")
+            return None
 
-        # Col 4: mtime
-        mtime_str = (
-            file_info.mtime.strftime("%Y-%m-%d %H:%M:%S")
-            if file_info.mtime else ""
-        )
-        self.table.setItem(row, COL_MTIME, QTableWidgetItem(mtime_str))
+        apply_provisional_duration(file_info, self.bitrate_model)
+        row = self.registry.row_of(file_id)
+        self._watch_directory(file_path.parent)
 
-        # Col 5-7: vuoti
-        self.table.setItem(row, COL_NEWNAME, QTableWidgetItem(""))
-        self.table.setItem(row, COL_STATUS,  QTableWidgetItem("pending"))
-        self.table.setItem(row, COL_MSG,     QTableWidgetItem(""))
+        if file_info.duration_provisional and preview:
+            self._show_duration(row)
+            self._update_preview_for_row(row)
 
-        self._queue_preview(row)
+        if queue_probe:
+            self._queue_preview(row)
+        return row
 
     # ══════════════════════════════════════════════════════════════════════════
     #  Pup List
@@ -614,25 +894,21 @@ class MainWindow(QMainWindow):
             return
 
         applied = 0
-        for row in range(len(self.files)):
+        for row, file_id in enumerate(self.registry.ids()):
             if row >= len(pup_list):
                 break
             pup_val = pup_list[row]
-            if row not in self.per_file_overrides:
-                self.per_file_overrides[row] = InputOverrides()
-            self.per_file_overrides[row].pup = pup_val
+            self.registry.overrides_for_edit(file_id).pup = pup_val
 
-            item = QTableWidgetItem(pup_val)
-            item.setBackground(COLOR_PUP_FROM_LIST)
-            self.table.setItem(row, COL_PUP, item)
+            self.table_model.set_pup(row, pup_val, COLOR_PUP_FROM_LIST)
             applied += 1
 
         self._log(f"[OK] Lista pup applicata a {applied} file")
-        if len(pup_list) < len(self.files):
+        if len(pup_list) < len(self.registry):
             self._log(
                 f"[WARN] Lista pup più corta del numero di file "
-                f"({len(pup_list)} pup, {len(self.files)} file): "
-                f"ultimi {len(self.files) - len(pup_list)} file senza pup dalla lista"
+                f"({len(pup_list)} pup, {len(self.registry)} file): "
+                f"ultimi {len(self.registry) - len(pup_list)} file senza pup dalla lista"
             )
 
         self._on_update_preview()
@@ -660,9 +936,7 @@ class MainWindow(QMainWindow):
 
         applied = 0
         for row in selected_rows:
-            if row not in self.per_file_overrides:
-                self.per_file_overrides[row] = InputOverrides()
-            ov = self.per_file_overrides[row]
+            ov = self.registry.overrides_for_edit(self.registry.id_at(row))
 
             if pup_raw:
                 norm, err = normalize_pup(pup_raw)
@@ -692,9 +966,7 @@ class MainWindow(QMainWindow):
             # Aggiorna colonna Pup con il valore risolto
             resolved_pup = ov.pup if ov.pup is not None else pup_raw
             if resolved_pup:
-                item = QTableWidgetItem(resolved_pup)
-                item.setBackground(COLOR_PUP_OVERRIDE)
-                self.table.setItem(row, COL_PUP, item)
+                self.table_model.set_pup(row, resolved_pup, COLOR_PUP_OVERRIDE)
 
             applied += 1
 
@@ -703,61 +975,184 @@ class MainWindow(QMainWindow):
 
     def _get_checked_rows(self) -> List[int]:
         """Restituisce indici delle righe con checkbox spuntato."""
-        rows = []
-        for row in range(len(self.files)):
-            cb = self.table.cellWidget(row, COL_CHECK)
-            if cb and cb.isChecked():
-                rows.append(row)
-        return rows
+        return self.table_model.checked_rows()
 
     # ══════════════════════════════════════════════════════════════════════════
     #  Preview
     # ══════════════════════════════════════════════════════════════════════════
 
+    def _probe_file(self, file_path: Path, token: CancelToken):
+        """Probe di un file (thread del pool)."""
+        return self.probe_engine.probe(
+            file_path, token, need_creation_time=self.probe_creation_time,
+        )
+
+    def _on_creation_time_toggled(self, checked: bool):
+        """
+        Attivando "Ora da creation_time" si riprobano con ffprobe i file letti
+        dai lettori nativi senza creation_time (MTS/M2TS, MP4 senza data).
+        """
+        self.probe_creation_time = checked
+        if not checked:
+            return
+        rows = [
+            row for row, file_id in enumerate(self.registry.ids())
+            if file_id not in self.pending_probes
+            and self._needs_creation_probe(self.registry.get(file_id))
+        ]
+        for row in rows:
+            self._queue_preview(row)
+        if rows:
+            self._log(f"[INFO] Lettura creation_time con ffprobe: {len(rows)} file")
+
+    @staticmethod
+    def _needs_creation_probe(file_info: FileInfo) -> bool:
+        """Durata esatta da un lettore nativo (niente codec) ma senza creation_time."""
+        return (
+            file_info.duration_sec is not None
+            and not file_info.duration_provisional
+            and file_info.creation_time is None
+            and file_info.codec is None
+        )
+
     def _queue_preview(self, row: int):
         """Manda il calcolo ffprobe in background per la riga data."""
-        if row < 0 or row >= len(self.files):
+        file_id = self.registry.id_at(row)
+        if file_id is None:
             return
-        file_info = self.files[row]
-        future = self.executor.submit(get_duration, file_info.path)
-        self.pending_previews[future] = row
-        future.add_done_callback(lambda f: self._on_ffprobe_done(f, row))
+        file_info = self.registry.get(file_id)
+        future = self.probe_scheduler.submit(file_info.path, self._probe_priority(row))
+        self.pending_probes[file_id] = future
+        future.add_done_callback(lambda f: self._on_ffprobe_done(f, file_id))
+
+    def _visible_row_range(self) -> tuple:
+        """(prima, ultima) riga visibile nella tabella; (0, -1) se nessuna."""
+        first = self.table.rowAt(0)
+        if first < 0:
+            return 0, -1
+        last = self.table.rowAt(self.table.viewport().height() - 1)
+        if last < 0:
+            last = self.table_model.rowCount() - 1
+        return first, last
+
+    def _probe_priority(self, row: int, visible: Optional[tuple] = None) -> int:
+        """Priorità del probe: righe visibili, poi spuntate, poi le altre."""
+        first, last = visible if visible is not None else self._visible_row_range()
+        if first <= row <= last:
+            return PRIORITY_VISIBLE
+        if self.table_model.is_checked(row):
+            return PRIORITY_CHECKED
+        return PRIORITY_BACKGROUND
+
+    def _schedule_reprioritize(self, *_):
+        """Scroll o selezione cambiati: riordina i probe in coda (con debounce)."""
+        if self.pending_probes:
+            self.reprioritize_timer.start(50)
+
+    def _reprioritize_probes(self):
+        """Ricalcola la priorità dei probe ancora in coda."""
+        visible = self._visible_row_range()
+        priorities = {}
+        for file_id in list(self.pending_probes):
+            row = self.registry.row_of(file_id)
+            if row is not None:
+                priorities[self.registry.get(file_id).path] = self._probe_priority(row, visible)
+        self.probe_scheduler.reprioritize(priorities)
+
+    def _on_ffprobe_done(self, future, file_id: int):
+        """
+        Callback quando ffprobe ha finito per un file. Gira sul thread del
+        probe: passa solo il risultato alla UI (segnale in coda).
+        """
+        self.update_signal.probe_done.emit(file_id, future)
 
-    def _on_ffprobe_done(self, future, row: int):
-        """Callback quando ffprobe ha finito per una riga."""
-        try:
-            duration, error = future.result()
-        except Exception as e:
-            duration, error = None, str(e)
+    def _on_probe_done(self, file_id: int, future):
+        """Probe concluso (thread UI): accumulato fino al prossimo flush."""
+        self.probe_results.append((file_id, future))
+        if not self.probe_flush_timer.isActive():
+            self.probe_flush_timer.start(PROBE_FLUSH_MS)
 
-        if row < 0 or row >= len(self.files):
-            return
+    def _flush_probe_results(self):
+        """
+        Applica i probe conclusi dall'ultimo flush: durate, un solo calcolo
+        dei nomi per tutto il blocco e un solo aggiornamento della tabella.
+        """
+        results, self.probe_results = self.probe_results, []
+        rows = []
+        provisional_names = {}
+        for file_id, future in results:
+            # Probe annullato o superato (es. lista svuotata): risultato da scartare
+            if future.cancelled() or self.pending_probes.get(file_id) is not future:
+                continue
+            self.pending_probes.pop(file_id, None)
+            try:
+                info, error = future.result()
+            except Exception as e:
+                info, error = None, str(e)
 
-        file_info = self.files[row]
-        file_info.duration_sec = duration
-        file_info.error = error
+            row = self.registry.row_of(file_id)
+            if row is None:
+                continue
 
-        dur_item = self.table.item(row, COL_DURATION)
-        if dur_item:
-            if duration is not None:
-                dur_item.setText(f"{duration:.1f}s")
+            file_info = self.registry.get(file_id)
+            if file_info.duration_provisional and file_info.new_filename:
+                provisional_names[file_id] = file_info.new_filename
+            if info is not None:
+                apply_media_info(file_info, info)
             else:
-                dur_item.setText("ERR")
-                dur_item.setToolTip(str(error))
+                file_info.duration_sec = None
+                file_info.duration_provisional = False
+            file_info.error = error
+
+            if file_info.duration_sec is not None and file_info.size_bytes:
+                self.bitrate_model.learn(
+                    file_info.path, file_info.extension, file_info.size_bytes,
+                    file_info.duration_sec,
+                )
+            rows.append(row)
+        if not rows:
+            return
+        self.probe_rate.add(len(rows))
+
+        with self.table_model.batch_updates():
+            for row in rows:
+                self._show_duration(row)
+            self._update_preview_for_rows(rows)
+
+            # La stima aveva prodotto un nome diverso (HHMM cambiato): segnala la riga
+            for file_id, provisional_name in provisional_names.items():
+                file_info = self.registry.get(file_id)
+                if file_info.new_filename and provisional_name != file_info.new_filename:
+                    file_info.message = f"Orario corretto dal probe esatto (era: {provisional_name})"
+                    self._apply_row_status(self.registry.row_of(file_id))
+
+        if self.auto_rename:
+            for row in rows:
+                self._on_probe_ready(self.registry.id_at(row))
+        self._update_status_bar()
 
-        self._update_preview_for_row(row)
+    def _show_duration(self, row: int):
+        """Mostra la durata (o l'errore di probe) nella colonna Durata."""
+        self.table_model.refresh(row, COL_DURATION)
 
     def _on_input_changed(self):
         """Handler cambio input: avvia/resetta debounce."""
         self.preview_timer.stop()
-        self.preview_timer.start(PREVIEW_DEBOUNCE_MS)
+        self.preview_timer.start(self.preview_debounce_ms)
+        if self.auto_rename_paused and self.auto_rename_ids:
+            # Riprova con il nuovo input (dopo l'anteprima aggiornata)
+            self.auto_rename_timer.start(AUTO_RENAME_BATCH_MS)
 
     def _on_preview_timeout(self):
-        """Timeout debounce: aggiorna anteprima."""
-        self._on_update_preview()
+        """Timeout debounce: aggiorna l'anteprima delle righe interessate."""
+        self._on_update_preview(incremental=True)
 
-    def _on_update_preview(self):
-        """Aggiorna l'anteprima per tutti i file."""
+    def _on_update_preview(self, incremental: bool = False):
+        """
+        Aggiorna l'anteprima per tutti i file. Con incremental=True solo le
+        righe che ereditano un campo globale cambiato dall'ultimo calcolo
+        (gli override per file non cambiano da soli).
+        """
         try:
             input_data, warnings = validate_all(
                 self.input_pup.text(),
@@ -776,14 +1171,141 @@ class MainWindow(QMainWindow):
             self._log(f"[WARN] {w}")
 
         global_input = InputData(**input_data)
-        for row in range(len(self.files)):
-            self._update_preview_for_row(row, global_input)
+        self.last_global_input = global_input
+        use_creation_time = self.checkbox_creation_time.isChecked()
+
+        # Differenze rispetto all'ultima anteprima completata (una generazione
+        # superata a metà viene così ricoperta per intero)
+        if self.preview_job is not None and self.preview_job[3]:
+            self.preview_stale = True
+        full = (not incremental or self.preview_stale or self.preview_input is None
+                or use_creation_time != self.preview_use_creation_time)
+        if full:
+            file_ids = self.registry.ids()
+        else:
+            changed = [
+                field for field in INPUT_FIELDS
+                if getattr(global_input, field) != getattr(self.preview_input, field)
+            ]
+            file_ids = self.registry.inheriting(changed)
+
+        if full:
+            self.preview_stale = False
+        self.preview_generation += 1
+        generation = self.preview_generation
+        if self.preview_future is not None:
+            self.preview_future.cancel()
+            self.preview_future = None
+        self.preview_job = (generation, global_input, use_creation_time, full, time.monotonic())
+        self.preview_renamed_targets = []
+        self.preview_chunks.clear()
+        self.preview_touched = set()
+
+        rows = [self.registry.row_of(file_id) for file_id in file_ids]
+        file_infos = [self.registry.get(file_id) for file_id in file_ids]
+        resolved = [self._get_resolved_input(row, global_input) for row in rows]
+        if len(file_ids) < PREVIEW_ASYNC_MIN_ROWS:
+            results = compute_new_filenames_for(
+                file_infos, resolved, use_creation_time=use_creation_time,
+            )
+            self._apply_preview_chunk((generation, file_ids, resolved, results, True))
+            return
+
+        self.status_bar.showMessage(f"Anteprima in aggiornamento ({len(file_ids)} file)...")
+        self.preview_future = self.preview_executor.submit(
+            self._compute_preview, generation, file_ids, file_infos, resolved,
+            use_creation_time,
+        )
 
+    def _compute_preview(self, generation: int, file_ids, file_infos, resolved,
+                         use_creation_time: bool):
+        """
+        Worker: nomi a blocchi di PREVIEW_CHUNK_ROWS righe, inviati alla UI
+        man mano. Si ferma appena parte una generazione più nuova.
+        """
+        total = len(file_ids)
+        for start in range(0, total, PREVIEW_CHUNK_ROWS):
+            if generation != self.preview_generation:
+                return
+            end = start + PREVIEW_CHUNK_ROWS
+            results = compute_new_filenames_for(
+                file_infos[start:end], resolved[start:end],
+                use_creation_time=use_creation_time,
+            )
+            self.update_signal.preview_chunk.emit(
+                (generation, file_ids[start:end], resolved[start:end], results, end >= total)
+            )
+
+    def _on_preview_chunk(self, payload):
+        """
+        Blocco dal worker: accodato e applicato un blocco per giro del loop
+        eventi, così input e ridisegno passano tra un blocco e l'altro.
+        """
+        if self.preview_job is None or payload[0] != self.preview_job[0]:
+            return
+        self.preview_chunks.append(payload)
+        if len(self.preview_chunks) == 1:
+            QTimer.singleShot(0, self._apply_next_preview_chunk)
+
+    def _apply_next_preview_chunk(self):
+        if not self.preview_chunks:
+            return
+        self._apply_preview_chunk(self.preview_chunks.popleft())
+        if self.preview_chunks:
+            QTimer.singleShot(0, self._apply_next_preview_chunk)
+
+    def _apply_preview_chunk(self, payload):
+        """Applica alla tabella un blocco di nomi della generazione corrente."""
+        generation, file_ids, resolved, results, last = payload
+        if self.preview_job is None or generation != self.preview_job[0]:
+            return
+
+        touched = self.preview_touched
+        with self.table_model.batch_updates():
+            for file_id, row_input, (new_name, err) in zip(file_ids, resolved, results):
+                row = self.registry.row_of(file_id)
+                if row is None or file_id in touched:
+                    continue   # rimossa, o già aggiornata dal suo probe
+                file_info = self.registry.get(file_id)
+                if file_info.error or file_info.duration_sec is None:
+                    new_name, err = None, ""
+                if new_name != file_info.new_filename:
+                    self.preview_renamed_targets.append(file_info.path)
+                self._show_preview_for_row(row, row_input, new_name, err)
+        if last:
+            self._finish_preview()
+
+    def _finish_preview(self):
+        """Fine generazione: stati dipendenti, debounce adattivo, barra di stato."""
+        _, global_input, use_creation_time, _, started = self.preview_job
+        self.preview_job = None
+        self.preview_future = None
+
+        # Chi punta al path di un file che ora cambia (o non cambia più) nome:
+        # lo stato "target esiste" dipende da _target_moves_away
+        with self.table_model.batch_updates():
+            for path in self.preview_renamed_targets:
+                for other_id in self.collisions.targeting(path):
+                    self._apply_row_status(self.registry.row_of(other_id))
+        self.preview_renamed_targets = []
+
+        self.preview_input = global_input
+        self.preview_use_creation_time = use_creation_time
+
+        # Debounce pari al costo medio dell'anteprima (entro i limiti)
+        cost_ms = (time.monotonic() - started) * 1000
+        if self.preview_cost_ms is None:
+            self.preview_cost_ms = cost_ms
+        else:
+            self.preview_cost_ms = 0.7 * self.preview_cost_ms + 0.3 * cost_ms
+        self.preview_debounce_ms = int(min(
+            PREVIEW_DEBOUNCE_MAX_MS, max(PREVIEW_DEBOUNCE_MS, self.preview_cost_ms)
+        ))
         self._update_status_bar()
 
     def _get_resolved_input(self, row: int, global_input: InputData) -> InputData:
         """Merge global input con override per-file del row dato."""
-        overrides = self.per_file_overrides.get(row)
+        overrides = self.registry.overrides(self.registry.id_at(row))
         if overrides is None:
             return global_input
         return resolve_input(global_input, overrides)
@@ -794,7 +1316,16 @@ class MainWindow(QMainWindow):
         global_input: Optional[InputData] = None,
     ):
         """Calcola e mostra il nuovo nome per la riga indicata."""
-        if row < 0 or row >= len(self.files):
+        self._update_preview_for_rows([row], global_input)
+
+    def _update_preview_for_rows(
+        self,
+        rows: List[int],
+        global_input: Optional[InputData] = None,
+    ):
+        """Calcola (in un solo calcolo a colonne) e mostra i nuovi nomi delle righe."""
+        rows = [row for row in rows if self.registry.id_at(row) is not None]
+        if not rows:
             return
 
         if global_input is None:
@@ -812,15 +1343,58 @@ class MainWindow(QMainWindow):
             except ValueError:
                 return
 
-        file_info = self.files[row]
-        resolved = self._get_resolved_input(row, global_input)
+        self.last_global_input = global_input
+        file_infos = [self.registry.info_at(row) for row in rows]
+        resolved = [self._get_resolved_input(row, global_input) for row in rows]
+        if self.preview_job is not None:
+            # I blocchi in arrivo per queste righe sono più vecchi del probe
+            self.preview_touched.update(self.registry.id_at(row) for row in rows)
+
+        results = compute_new_filenames_for(
+            file_infos, resolved,
+            use_creation_time=self.checkbox_creation_time.isChecked(),
+        )
+        with self.table_model.batch_updates():
+            for row, file_info, row_input, (new_name, err) in zip(
+                    rows, file_infos, resolved, results):
+                if file_info.error or file_info.duration_sec is None:
+                    new_name, err = None, ""
+                self._show_preview_for_row(row, row_input, new_name, err)
+
+    def _show_preview_for_row(
+        self,
+        row: int,
+        resolved: InputData,
+        new_name: Optional[str],
+        err: str,
+    ):
+        """Mostra il nome calcolato per la riga e aggiorna le collisioni."""
+        file_info = self.registry.info_at(row)
 
         # Mostra pup risolto nella colonna
-        pup_item = self.table.item(row, COL_PUP)
-        if pup_item and not pup_item.background().color().isValid():
-            pup_item.setText(resolved.pup or "")
-        elif not pup_item:
-            self.table.setItem(row, COL_PUP, QTableWidgetItem(resolved.pup or ""))
+        if not self.table_model.pup_is_override(row):
+            self.table_model.set_pup(row, resolved.pup or "")
+
+        file_info.new_filename = new_name
+
+        # Aggiorna l'indice collisioni e lo stato delle righe coinvolte
+        file_id = self.registry.id_at(row)
+        target = file_info.path.parent / new_name if new_name else None
+        affected = self.collisions.set(file_id, target)
+        self._apply_row_status(row, err, target)
+        for other_id in affected:
+            other_row = self.registry.row_of(other_id)
+            if other_row is not None:
+                self._apply_row_status(other_row)
+
+    def _apply_row_status(self, row: int, name_error: str = "", new_path: Optional[Path] = None):
+        """
+        Stato della riga da errori, durata, conflitti su disco e nel batch.
+        new_path: path del nuovo nome, se già calcolato dal chiamante.
+        """
+        file_id = self.registry.id_at(row)
+        file_info = self.registry.get(file_id)
+        new_name = file_info.new_filename
 
         if file_info.error:
             self._set_row_status(row, "", "error", file_info.error)
@@ -830,29 +1404,74 @@ class MainWindow(QMainWindow):
             self._set_row_status(row, "", "loading", "Attendo durata...")
             return
 
-        new_name, err = compute_new_filename(file_info, resolved, file_info.duration_sec)
-        if err:
-            self._set_row_status(row, "", "error", err)
-        else:
+        if not new_name:
+            self._set_row_status(row, "", "error", name_error)
+            return
+
+        if new_path is None:
             new_path = file_info.path.parent / new_name
-            if new_path.exists() and new_path != file_info.path:
-                self._set_row_status(row, new_name, "conflict", "File target esiste già")
-            else:
-                self._set_row_status(row, new_name, "ok", "")
+        others = self.collisions.colliding(file_id)
+        if new_path != file_info.path and self.dir_cache.exists(new_path) \
+                and not self._target_moves_away(new_path):
+            self._set_row_status(row, new_name, "conflict", "File target esiste già")
+        elif others:
+            msg = f"Stesso nuovo nome di altri {len(others)} file in lista"
+            if (self.last_global_input is not None
+                    and not self._get_resolved_input(row, self.last_global_input).part):
+                group = sorted([file_id] + others, key=self.registry.row_of)
+                msg += f" (suggerito: {suggest_parts(group)[file_id]})"
+            self._set_row_status(row, new_name, "conflict", msg)
+        elif file_info.duration_provisional:
+            self._set_row_status(row, new_name, "estimated", "Durata stimata, attendo probe esatto")
+        else:
+            self._set_row_status(row, new_name, "ok", file_info.message)
 
-    def _set_row_status(self, row: int, new_name: str, status: str, msg: str):
-        """Aggiorna le colonne Nuovo nome / Stato / Messaggio per una riga."""
-        self.table.setItem(row, COL_NEWNAME, QTableWidgetItem(new_name))
+    def _target_moves_away(self, target: Path) -> bool:
+        """True se target è un file in lista che verrà rinominato (catena o scambio)."""
+        other = self.registry.get(self.registry.id_of_path(target))
+        return (other is not None and bool(other.new_filename)
+                and other.new_filename != other.original_filename)
+
+    def _on_resolve_collisions(self):
+        """Assegna PartN (in ordine di riga) ai gruppi di file con lo stesso nuovo nome."""
+        if self.last_global_input is None:
+            return
+        assigned = 0
+        skipped = 0
+        for group in self.collisions.groups():
+            rows = sorted(self.registry.row_of(file_id) for file_id in group)
+            if any(self._get_resolved_input(r, self.last_global_input).part for r in rows):
+                # Un PartN esplicito c'è già: lasciamo decidere all'utente
+                skipped += 1
+                continue
+            ordered = [self.registry.id_at(r) for r in rows]
+            for file_id, part in suggest_parts(ordered).items():
+                self.registry.overrides_for_edit(file_id).part = part
+                assigned += 1
+        if assigned:
+            self._log(f"[OK] PartN assegnato a {assigned} file con nome duplicato")
+        if skipped:
+            self._log(f"[WARN] {skipped} gruppi duplicati hanno già un Part: da correggere a mano")
+        if not assigned and not skipped:
+            self._log("[INFO] Nessun nome duplicato in lista")
+        self._on_update_preview()
 
-        status_item = QTableWidgetItem(status)
-        if status in STATUS_BG:
-            status_item.setBackground(STATUS_BG[status])
-        if status in STATUS_FG:
-            status_item.setForeground(STATUS_FG[status])
-        status_item.setTextAlignment(Qt.AlignCenter)
-        self.table.setItem(row, COL_STATUS, status_item)
+    def _watch_directory(self, folder: Path):
+        """Osserva la cartella per invalidare lo snapshot dei nomi quando cambia."""
+        key = str(folder)
+        if key not in self.watched_dirs and len(self.watched_dirs) < DIR_WATCH_MAX:
+            self.watched_dirs.add(key)
+            self.dir_watcher.addPath(key)
 
-        self.table.setItem(row, COL_MSG, QTableWidgetItem(msg))
+    def _on_directory_changed(self, folder: str):
+        """Una cartella osservata è cambiata: rilegge i nomi e aggiorna l'anteprima."""
+        self.dir_cache.invalidate(Path(folder))
+        self.preview_stale = True
+        self._on_input_changed()
+
+    def _set_row_status(self, row: int, new_name: str, status: str, msg: str):
+        """Aggiorna le colonne Nuovo nome / Stato / Messaggio per una riga."""
+        self.table_model.set_status(row, new_name, status, msg)
 
     # ══════════════════════════════════════════════════════════════════════════
     #  Rename
@@ -862,8 +1481,66 @@ class MainWindow(QMainWindow):
         """Esegui rename (o dry-run se la checkbox è spuntata)."""
         is_dry_run = self.checkbox_dryrun.isChecked()
 
+        plan, count_error = self._build_rename_plan()
+        if plan is None:
+            return
+
+        if is_dry_run:
+            renames = plan.renames()
+            for step in renames:
+                self._log(f"[DRY-RUN] {step.from_path.name} → {step.to_path.name}")
+                self.rename_results.append(RenameResult(
+                    original_path=step.from_path, new_filename=step.to_path.name,
+                    status="ok", message="[DRY-RUN] Pronto per rinominare",
+                ))
+            cycles = sum(1 for step in plan.steps if step.temporary)
+            if cycles:
+                self._log(f"[DRY-RUN] {cycles} scambi/cicli risolti con nomi temporanei")
+            self._log(
+                f"[SUMMARY] [DRY-RUN] Rinominati: {len(renames)}, "
+                f"Errori: {count_error}, Osservazioni: 0"
+            )
+            self._update_status_bar()
+            return
+
+        self._execute_plan(plan, count_error)
+
+    def _on_save_plan(self):
+        """Salva il piano di rinomina (JSON) per rivederlo o riapplicarlo."""
+        plan, _ = self._build_rename_plan()
+        if plan is None:
+            return
+        fp, _ = QFileDialog.getSaveFileName(
+            self, "Salva piano di rinomina", "rename_plan.json", "JSON (*.json)"
+        )
+        if not fp:
+            return
         try:
-            input_data, _ = validate_all(
+            save_plan(plan, Path(fp))
+            self._log(f"[OK] Piano salvato ({len(plan.steps)} passi): {fp}")
+        except OSError as e:
+            self._log(f"[ERROR] Salvataggio piano: {str(e)}")
+
+    def _on_apply_plan_file(self):
+        """Riapplica un piano salvato (ricontrollato sulle cartelle attuali)."""
+        fp, _ = QFileDialog.getOpenFileName(
+            self, "Applica piano di rinomina", "", "JSON (*.json)"
+        )
+        if not fp:
+            return
+        plan, err = load_plan(Path(fp))
+        if plan is None:
+            self._log(f"[ERROR] {err}")
+            return
+        self._execute_plan(plan, 0)
+
+    def _build_rename_plan(self):
+        """
+        Piano per le righe spuntate e pronte.
+        Restituisce (piano, righe escluse) o (None, 0) se l'input non è valido.
+        """
+        try:
+            validate_all(
                 self.input_pup.text(),
                 self.input_mama.text(),
                 self.combo_month.currentText(),
@@ -872,98 +1549,296 @@ class MainWindow(QMainWindow):
                 self.input_part.text(),
                 MONTHS,
             )
-            global_input = InputData(**input_data)
         except ValueError as e:
             self._log(f"[ERROR] {str(e)}")
-            return
+            return None, 0
+        if self.preview_job is not None:
+            self._log("[WARN] Anteprima in aggiornamento: riprova tra un attimo")
+            return None, 0
 
-        count_ok = 0
         count_error = 0
-        new_observations: List[ObservationRecord] = []
-        batch_ops: List[RenameOperation] = []
-        next_obs_number = self._get_next_obs_number()
-        activity_override = self.combo_activity.currentText()
-
-        for row, file_info in enumerate(self.files):
-            cb = self.table.cellWidget(row, COL_CHECK)
-            if not cb or not cb.isChecked():
+        renames = []
+        for row in range(len(self.registry)):
+            if not self.table_model.is_checked(row):
                 continue
-
-            if file_info.error or file_info.duration_sec is None:
+            target = self._row_rename_target(row)
+            if target is None:
                 count_error += 1
                 continue
+            renames.append((self.registry.info_at(row).path, target))
+
+        plan, errors = build_plan(renames, self.dir_cache)
+        for path, err in errors:
+            self._log(f"[ERROR] {path.name}: {err}")
+            self.rename_results.append(RenameResult(
+                original_path=path, new_filename="", status="conflict", message=err,
+            ))
+        return plan, count_error + len(errors)
+
+    def _row_rename_target(self, row: int) -> Optional[Path]:
+        """Nuovo path della riga, o None se non è pronta (durata, errori, conflitti)."""
+        file_info = self.registry.info_at(row)
+        if (file_info.error or file_info.duration_sec is None
+                or file_info.duration_provisional):
+            return None
+
+        if self.table_model.status(row) in ("error", "conflict"):
+            return None
+
+        new_name = self.table_model.new_name(row)
+        if not new_name:
+            return None
+        return file_info.path.parent / new_name
+
+    def _execute_plan(self, plan: RenamePlan, count_error: int):
+        """Avvia il piano in background; tabella e log si aggiornano man mano."""
+        if self.rename_token is not None:
+            self._log("[WARN] Rinomina già in corso")
+            return
 
-            status_item = self.table.item(row, COL_STATUS)
-            if status_item and status_item.text() in ("error", "conflict"):
-                count_error += 1
-                continue
+        token = CancelToken()
+        self.rename_token = token
+        self.rename_origin: Dict[int, Path] = {}
+        self.renamed_ids: List[int] = []
+        self.rename_count_error = count_error
+        self.rename_done = 0
+        self.rename_rate.reset()
+        self._set_renaming(True)
+
+        def worker():
+            problems = check_plan(plan)
+            if problems:
+                self.update_signal.rename_finished.emit((token, [], problems, True))
+                return
+            operations, errors = apply_plan(
+                plan,
+                dir_cache=self.dir_cache,
+                on_progress=self.update_signal.rename_progress.emit,
+                journal=self.journal,
+                token=token,
+                on_operations=self.update_signal.rename_operations.emit,
+            )
+            self.update_signal.rename_finished.emit((token, operations, errors, False))
+
+        self.rename_thread = threading.Thread(target=worker, daemon=True)
+        self.rename_thread.start()
+
+    def _set_renaming(self, running: bool):
+        """Pulsanti durante la rinomina in background."""
+        for btn in (self.btn_rename, self.btn_save_plan, self.btn_apply_plan):
+            btn.setEnabled(not running)
+        self.btn_undo.setEnabled(not running and self.undo_manager.can_undo())
+        self.btn_cancel_rename.setVisible(running)
+        self.btn_cancel_rename.setEnabled(running)
+
+    def _on_cancel_rename(self):
+        """Ferma la rinomina: i gruppi già avviati (cicli) vengono completati."""
+        if self.rename_token is not None:
+            self.rename_token.cancel()
+            self.btn_cancel_rename.setEnabled(False)
+            self._log("[WARN] Annullamento rinomina richiesto...")
+
+    def _on_rename_progress(self, done: int, total: int):
+        self.rename_rate.add(done - self.rename_done)
+        self.rename_done = done
+        self.status_bar.showMessage(
+            f"Rinomina: {done}/{total} passi ({self.rename_rate.rate():.0f} file/s)"
+        )
 
-            name_item = self.table.item(row, COL_NEWNAME)
-            new_name = name_item.text() if name_item else ""
-            if not new_name:
-                count_error += 1
+    def _on_rename_operations(self, operations: List[RenameOperation]):
+        """Blocco di rinomine eseguite: i path in tabella seguono ogni passo (anche temporaneo)."""
+        for op in operations:
+            file_id = self.registry.id_of_path(op.from_path)
+            if file_id is None:
                 continue
+            self.rename_origin.setdefault(file_id, op.from_path)
+            self.registry.update_path(file_id, op.to_path)
+            if op.message:  # nome d'appoggio di un ciclo
+                continue
+            origin = self.rename_origin[file_id]
+            self.renamed_ids.append(file_id)
+            self._log(f"[OK] {origin.name} → {op.to_path.name}")
+            self.rename_results.append(RenameResult(
+                original_path=origin, new_filename=op.to_path.name,
+                status="ok", message="Rinominato con successo", renamed=True,
+            ))
+            self.registry.get(file_id).message = ""
+            self.table_model.refresh(self.registry.row_of(file_id), COL_NAME)
+
+    def _on_rename_finished(self, payload):
+        """Fine del piano: errori, osservazioni, batch di undo e riepilogo."""
+        token, operations, errors, aborted = payload
+        if token is not self.rename_token:
+            return
+        self.rename_token = None
+        self._set_renaming(False)
+
+        if aborted:
+            for path, err in errors:
+                self._log(f"[ERROR] {path.name}: {err}")
+            self._log("[ERROR] Le cartelle sono cambiate dal piano: rinomina annullata, aggiorna l'anteprima")
+            self._update_status_bar()
+            return
 
-            result = handle_rename(file_info, new_name, dry_run=is_dry_run)
-            self.rename_results.append(result)
-
-            if result.status == "ok":
-                if is_dry_run:
-                    self._log(f"[DRY-RUN] {file_info.original_filename} → {new_name}")
-                    count_ok += 1
-                elif result.renamed:
-                    count_ok += 1
-                    self._log(f"[OK] {file_info.original_filename} → {new_name}")
-
-                    old_path = file_info.path
-                    new_path = old_path.parent / new_name
-                    batch_ops.append(RenameOperation(
-                        from_path=old_path,
-                        to_path=new_path,
-                        timestamp=datetime.now(),
-                    ))
-
-                    # Aggiorna FileInfo con il nuovo path
-                    file_info.path = new_path
-                    file_info.original_filename = new_name
-                    self.table.setItem(row, COL_NAME, QTableWidgetItem(new_name))
-
-                    # Crea osservazione
-                    obs = extract_observation_from_file(
-                        new_path, file_info.duration_sec, next_obs_number
-                    )
-                    if obs:
-                        obs.weather      = self.combo_weather.currentText()
-                        obs.wind         = self.combo_wind.currentText()
-                        obs.temperature  = self.input_temperature.text()
-                        obs.observer     = self.input_initials.text()
-                        obs.notes        = self.input_notes.text()
-                        if activity_override != "auto":
-                            obs.activity = activity_override
-                        new_observations.append(obs)
-                        next_obs_number += 1
-            else:
-                count_error += 1
-                self._log(f"[ERROR] {file_info.original_filename}: {result.message}")
+        for path, err in errors:
+            self._log(f"[ERROR] {path.name}: {err}")
+            self.rename_results.append(RenameResult(
+                original_path=path, new_filename="", status="error", message=err,
+            ))
+
+        new_observations: List[ObservationRecord] = []
+        next_obs_number = self._get_next_obs_number()
+        activity_override = self.combo_activity.currentText()
+        renamed_ids = [i for i in self.renamed_ids if self.registry.get(i) is not None]
+        for file_id in sorted(renamed_ids, key=self.registry.row_of):
+            file_info = self.registry.get(file_id)
 
-        # Registra il batch per undo
-        if not is_dry_run and batch_ops:
-            self.undo_manager.push_transaction(batch_ops)
+            # Crea osservazione
+            obs = extract_observation_from_file(
+                file_info.path, file_info.duration_sec, next_obs_number
+            )
+            if obs:
+                obs.weather      = self.combo_weather.currentText()
+                obs.wind         = self.combo_wind.currentText()
+                obs.temperature  = self.input_temperature.text()
+                obs.observer     = self.input_initials.text()
+                obs.notes        = self.input_notes.text()
+                if activity_override != "auto":
+                    obs.activity = activity_override
+                new_observations.append(obs)
+                next_obs_number += 1
+
+        # Registra il batch per undo (passi fisici: l'undo li ripercorre al contrario)
+        if operations:
+            self.undo_manager.push_transaction(operations)
             self.btn_undo.setEnabled(True)
 
         self.observations.extend(new_observations)
 
-        mode_lbl = "[DRY-RUN] " if is_dry_run else ""
+        cancelled_lbl = " (annullata)" if token.cancelled else ""
         self._log(
-            f"[SUMMARY] {mode_lbl}Rinominati: {count_ok}, "
-            f"Errori: {count_error}, Osservazioni: {len(new_observations)}"
+            f"[SUMMARY] Rinominati{cancelled_lbl}: {len(renamed_ids)}, "
+            f"Errori: {self.rename_count_error + len(errors)}, "
+            f"Osservazioni: {len(new_observations)}"
         )
         self._update_status_bar()
 
+        # Righe pronte arrivate durante la rinomina
+        if self.auto_rename_ids and not token.cancelled:
+            self.auto_rename_timer.start(AUTO_RENAME_BATCH_MS)
+
+    # ══════════════════════════════════════════════════════════════════════════
+    #  Rinomina automatica
+    # ══════════════════════════════════════════════════════════════════════════
+
+    def _sync_auto_rename(self, *_):
+        """Attiva/disattiva la rinomina automatica e accoda le righe già pronte."""
+        active = (self.checkbox_auto_rename.isChecked()
+                  and not self.checkbox_dryrun.isChecked())
+        if active == self.auto_rename:
+            return
+        self.auto_rename = active
+        if not active:
+            self.auto_rename_timer.stop()
+            self.auto_rename_ids.clear()
+            self.auto_rename_paused = False
+            return
+        self._log("[INFO] Rinomina automatica attiva: i file pronti vengono rinominati subito")
+        self.auto_rename_ids.extend(
+            file_id for file_id in self.registry.ids()
+            if file_id not in self.pending_probes
+        )
+        self.auto_rename_timer.start(AUTO_RENAME_BATCH_MS)
+
+    def _on_probe_ready(self, file_id: int):
+        """Durata nota per un file: lo accoda al prossimo blocco automatico."""
+        if not self.auto_rename:
+            return
+        self.auto_rename_ids.append(file_id)
+        if not self.auto_rename_timer.isActive():
+            self.auto_rename_timer.start(AUTO_RENAME_BATCH_MS)
+
+    def _flush_auto_rename(self):
+        """Rinomina le righe accodate che sono pronte e senza conflitti."""
+        if not self.auto_rename or not self.auto_rename_ids:
+            return
+        if self.rename_token is not None:
+            return   # ripreso alla fine della rinomina in corso
+        if self.preview_timer.isActive() or self.preview_job is not None:
+            # Input appena modificato: si aspetta l'anteprima aggiornata
+            self.auto_rename_timer.start(AUTO_RENAME_BATCH_MS)
+            return
+        try:
+            validate_all(
+                self.input_pup.text(),
+                self.input_mama.text(),
+                self.combo_month.currentText(),
+                self.input_year.text(),
+                self.input_initials.text(),
+                self.input_part.text(),
+                MONTHS,
+            )
+        except ValueError as e:
+            # Le righe restano in coda: ripartono quando l'input cambia
+            if not self.auto_rename_paused:
+                self._log(f"[WARN] Rinomina automatica in pausa: {str(e)}")
+                self.auto_rename_paused = True
+            return
+        if self.auto_rename_paused:
+            self._log("[INFO] Rinomina automatica ripresa")
+            self.auto_rename_paused = False
+
+        renames = []
+        for file_id in dict.fromkeys(self.auto_rename_ids):
+            row = self.registry.row_of(file_id)
+            if row is None:
+                continue
+            if not self.table_model.is_checked(row):
+                continue
+            target = self._row_rename_target(row)
+            file_info = self.registry.get(file_id)
+            # Catene e scambi (target ancora occupato) restano per il pulsante Rinomina
+            if (target is None or target == file_info.path
+                    or self.dir_cache.exists(target)):
+                continue
+            renames.append((file_info.path, target))
+        self.auto_rename_ids.clear()
+        if not renames:
+            return
+
+        plan, errors = build_plan(renames, self.dir_cache)
+        for path, err in errors:
+            self._log(f"[ERROR] {path.name}: {err}")
+        if plan.steps:
+            self._execute_plan(plan, len(errors))
+
     # ══════════════════════════════════════════════════════════════════════════
     #  Undo
     # ══════════════════════════════════════════════════════════════════════════
 
+    def _recover_interrupted_renames(self):
+        """All'avvio: chiude le rinomine interrotte (crash, batteria, sospensione)."""
+        batches = self.journal.incomplete()
+        steps = sum(len(b.steps) for b in batches)
+        answer = QMessageBox.question(
+            self,
+            "Rinomina interrotta",
+            f"L'ultima sessione si è interrotta durante una rinomina "
+            f"({len(batches)} batch, {steps} passi).\n\n"
+            "Sì = completa la rinomina\nNo = ripristina i nomi originali",
+            QMessageBox.Yes | QMessageBox.No,
+            QMessageBox.No,
+        )
+        replay = answer == QMessageBox.Yes
+        errors = self.journal.recover(replay=replay)
+        for path, err in errors:
+            self._log(f"[RECOVERY ERR] {path.name}: {err}")
+        action = "completate" if replay else "ripristinate"
+        self._log(f"[RECOVERY] Rinomine interrotte {action}, errori: {len(errors)}")
+
+        self.undo_manager = UndoManager(self.journal)
+        self.btn_undo.setEnabled(self.undo_manager.can_undo())
+
     def _on_undo_rename(self):
         """Annulla l'ultimo batch di rinomina."""
         if not self.undo_manager.can_undo():
@@ -982,18 +1857,11 @@ class MainWindow(QMainWindow):
             else:
                 self._log(f"[UNDO OK] {op.to_path.name} → {op.from_path.name}")
                 ok_count += 1
-                # Aggiorna FileInfo in memoria
-                for fi in self.files:
-                    if fi.path == op.to_path:
-                        fi.path = op.from_path
-                        fi.original_filename = op.from_path.name
-                        break
-
-        # Aggiorna colonna Nome nella tabella
-        for row, fi in enumerate(self.files):
-            item = self.table.item(row, COL_NAME)
-            if item:
-                item.setText(fi.original_filename)
+                # Aggiorna FileInfo in memoria e colonna Nome
+                file_id = self.registry.id_of_path(op.to_path)
+                if file_id is not None:
+                    self.registry.update_path(file_id, op.from_path)
+                    self.table_model.refresh(self.registry.row_of(file_id), COL_NAME)
 
         self._log(f"[UNDO SUMMARY] Ripristinati: {ok_count}, Errori: {err_count}")
 
@@ -1046,22 +1914,27 @@ class MainWindow(QMainWindow):
 
     def _update_status_bar(self):
         """Aggiorna la barra di stato con i contatori correnti."""
-        total = len(self.files)
-        ok = sum(
-            1 for i in range(total)
-            if self.table.item(i, COL_STATUS)
-            and self.table.item(i, COL_STATUS).text() == "ok"
-        )
-        error = sum(
-            1 for i in range(total)
-            if self.table.item(i, COL_STATUS)
-            and self.table.item(i, COL_STATUS).text() in ("error", "conflict")
-        )
+        total = len(self.registry)
+        ok = self.table_model.status_count("ok")
+        error = self.table_model.status_count("error", "conflict")
         pending = total - ok - error
 
+        rate_str = ""
+        rate = self.probe_rate.rate() if pending else 0.0
+        if rate:
+            rate_str = f"   |   {rate:.1f} file/s"
+
+        cache = get_default_cache()
+        cache_str = ""
+        if cache is not None:
+            stats = cache.stats()
+            cache_str = f"   |   Cache durate: {stats['hits']} hit / {stats['misses']} miss"
+
         self.status_bar.showMessage(
             f"Totali: {total}   |   OK: {ok}   |   Errori: {error}   |   "
-            f"In elaborazione: {pending}   |   Osservazioni: {len(self.observations)}"
+            f"In elaborazione: {pending}{rate_str}   |   "
+            f"Osservazioni: {len(self.observations)}"
+            f"{cache_str}"
             f"    •    Powered by Qursor — qursor.it"
         )
 
@@ -1073,5 +1946,17 @@ class MainWindow(QMainWindow):
 
     def closeEvent(self, event):
         """Pulizia al chiudimento."""
-        self.executor.shutdown(wait=False)
+        self._on_cancel_scan()
+        if self.rename_token is not None:
+            # I cicli già iniziati vengono completati; il resto lo chiude il journal
+            self.rename_token.cancel()
+            self.rename_thread.join(timeout=10)
+        self.probe_scheduler.shutdown(wait=False)
+        self.preview_generation += 1   # il worker si ferma al prossimo blocco
+        self.preview_executor.shutdown(wait=False)
+        cache = get_default_cache()
+        if cache is not None:
+            cache.close()
+        if self.journal is not None:
+            self.journal.flush()
         event.accept()
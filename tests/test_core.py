@@ -1,9 +1,11 @@
 """Test unitari — core, validation, UndoManager, resolve_input, pup list."""
+import os
 import sys
 import tempfile
 import shutil
 from pathlib import Path
-from datetime import datetime
+import random
+from datetime import datetime, timedelta
 
 # Aggiungi src al path
 sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
@@ -16,8 +18,16 @@ from etho_renamer.validation import (
 from etho_renamer.core import (
     parse_prefix_date, compute_new_filename, resolve_input,
     apply_pup_list, determine_activity, extract_observation_from_file,
+    handle_rename,
 )
-from etho_renamer.models import FileInfo, InputData, InputOverrides, RenameOperation, UndoManager
+from etho_renamer.models import (
+    FileInfo, InputData, InputOverrides, RenameOperation, UndoManager, RateMeter,
+)
+from etho_renamer.registry import FileRegistry
+from etho_renamer.conflicts import DirectoryCache, CollisionIndex, suggest_parts
+from etho_renamer.planner import build_plan, check_plan, PLAN_CONFLICT_MSG
+from etho_renamer.naming import NameTemplate, compile_template
+from etho_renamer.batch import compute_new_filenames, compute_new_filenames_for, numpy_available
 from etho_renamer.config import MONTHS
 
 
@@ -129,6 +139,10 @@ class TestParsing:
         result = parse_prefix_date("20261313_qualcosa.MTS")
         assert result is None
 
+    def test_parse_prefix_date_not_calendar_date(self):
+        assert parse_prefix_date("20260231_qualcosa.MTS") is None
+        assert parse_prefix_date("20240229_qualcosa.MTS") == (2024, 2, 29)
+
     def test_parse_prefix_date_no_prefix(self):
         result = parse_prefix_date("qualcosa.MTS")
         assert result is None
@@ -205,6 +219,163 @@ class TestComputeFilename:
         assert "Part" not in new_name
         assert new_name == "20260315_pup1_Luna_mar_26_0955_AB.mts"
 
+    def test_compute_new_filename_creation_time(self):
+        # mtime reimpostato dalla copia: il creation_time del container ha la precedenza
+        file_info = FileInfo(
+            path=Path("clip.mp4"),
+            original_filename="clip.mp4",
+            extension=".mp4",
+            mtime=datetime(2026, 3, 20, 18, 0, 0),
+            creation_time=datetime(2026, 3, 15, 9, 55, 0),
+        )
+        input_data = InputData(
+            pup="pup1", mama_name="Luna", month="mar",
+            year="26", initials="AB", part="",
+        )
+        new_name, err = compute_new_filename(file_info, input_data, 300, use_creation_time=True)
+        assert err == ""
+        assert new_name == "20260315_pup1_Luna_mar_26_0955_AB.mp4"
+        # Senza l'opzione resta mtime - durata
+        new_name, _ = compute_new_filename(file_info, input_data, 300)
+        assert new_name == "20260320_pup1_Luna_mar_26_1755_AB.mp4"
+
+    def test_compute_new_filename_creation_time_missing(self):
+        file_info = FileInfo(
+            path=Path("test.mts"),
+            original_filename="test.mts",
+            extension=".mts",
+            mtime=datetime(2026, 3, 15, 10, 0, 0),
+        )
+        input_data = InputData(
+            pup="pup1", mama_name="Luna", month="mar",
+            year="26", initials="AB", part="",
+        )
+        new_name, err = compute_new_filename(file_info, input_data, 300, use_creation_time=True)
+        assert new_name == "20260315_pup1_Luna_mar_26_0955_AB.mts"
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+#  Compute Filename in blocco
+# ══════════════════════════════════════════════════════════════════════════════
+
+def _random_file_infos(count: int, seed: int = 7):
+    rng = random.Random(seed)
+    infos = []
+    for i in range(count):
+        mtime = datetime(2026, 1, 1) + timedelta(
+            seconds=rng.randint(0, 10**7), microseconds=rng.randint(0, 999999),
+        )
+        # Durate che cadono anche esattamente sul cambio di minuto
+        duration = rng.choice([
+            None, 0, rng.uniform(1, 3600), float(rng.randint(1, 600)),
+            mtime.second + mtime.microsecond / 1e6,
+        ])
+        name = rng.choice([f"{i:05d}.MTS", f"202602{rng.randint(10, 31)}_x{i}.MTS", f"GOPR{i}.MP4"])
+        infos.append(FileInfo(
+            path=Path(name), original_filename=name, extension=Path(name).suffix.lower(),
+            mtime=rng.choice([mtime, mtime, None]), duration_sec=duration,
+            creation_time=rng.choice([None, mtime]),
+        ))
+    return infos
+
+
+class TestComputeFilenamesBatch:
+    """Test calcolo a colonne: stesso risultato di compute_new_filename riga per riga."""
+
+    def setup_method(self):
+        self.file_infos = _random_file_infos(2000)
+        self.inputs = [
+            InputData(
+                pup=f"pup{i % 3 + 1}", mama_name="Nova", month="feb",
+                year="26", initials="IM", part="Part2" if i % 5 == 0 else "",
+            )
+            for i in range(len(self.file_infos))
+        ]
+
+    def _expected(self, use_creation_time):
+        return [
+            compute_new_filename(fi, inp, fi.duration_sec, use_creation_time)
+            for fi, inp in zip(self.file_infos, self.inputs)
+        ]
+
+    @pytest.mark.parametrize("use_creation_time", [False, True])
+    def test_pure_python_matches_scalar(self, use_creation_time):
+        results = compute_new_filenames_for(
+            self.file_infos, self.inputs, use_creation_time, use_numpy=False,
+        )
+        assert results == self._expected(use_creation_time)
+
+    @pytest.mark.skipif(not numpy_available(), reason="NumPy non installato")
+    @pytest.mark.parametrize("use_creation_time", [False, True])
+    def test_numpy_matches_scalar(self, use_creation_time):
+        results = compute_new_filenames_for(
+            self.file_infos, self.inputs, use_creation_time, use_numpy=True,
+        )
+        assert results == self._expected(use_creation_time)
+
+    def test_single_input_and_errors(self):
+        input_data = InputData(
+            pup="pup4", mama_name="Nova", month="feb",
+            year="26", initials="IM", part="Part1",
+        )
+        results = compute_new_filenames(
+            [datetime(2026, 2, 2, 12, 30), None, datetime(2026, 2, 2, 12, 30)],
+            [600, 600, None],
+            ["20260101_a.mts", "b.mts", "c.mts"],
+            [".mts", ".mts", ".mts"],
+            input_data,
+        )
+        assert results[0] == ("20260101_pup4_Nova_feb_26_1220_Part1_IM.mts", "")
+        assert results[1][0] is None and "mtime" in results[1][1]
+        assert results[2][0] is None and "Durata" in results[2][1]
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+#  Template del nome
+# ══════════════════════════════════════════════════════════════════════════════
+
+class TestNameTemplate:
+    """Test template compilato: formatter e parser dalla stessa specifica."""
+
+    def setup_method(self):
+        self.input_data = InputData(
+            pup="pup4", mama_name="Nova", month="feb",
+            year="26", initials="IM", part="Part2",
+        )
+
+    def test_default_pattern_round_trip(self):
+        template = compile_template()
+        name = template.format("20260202", "1220", self.input_data, ".mts")
+        assert name == "20260202_pup4_Nova_feb_26_1220_Part2_IM.mts"
+        fields = template.parse(Path(name).stem)
+        assert fields["pup"] == "pup4" and fields["part"] == "Part2"
+        assert fields["time"] == "1220"
+
+    def test_optional_section_omitted(self):
+        template = compile_template()
+        self.input_data.part = ""
+        name = template.format("20260202", "1220", self.input_data)
+        assert name == "20260202_pup4_Nova_feb_26_1220_IM"
+        assert template.parse(name)["part"] == ""
+
+    def test_custom_pattern(self):
+        template = NameTemplate("{mama}-{pup}[-{part}]-{date}T{time}")
+        name = template.format("20260202", "1220", self.input_data, ".mp4")
+        assert name == "Nova-pup4-Part2-20260202T1220.mp4"
+        assert template.parse("Nova-pup4-20260202T1220")["date"] == "20260202"
+        assert template.parse("20260202_pup4_Nova_feb_26_1220_IM") is None
+
+    def test_compiled_once(self):
+        assert compile_template() is compile_template()
+        template = compile_template()
+        assert template.bind(self.input_data) is template.bind(InputData(**vars(self.input_data)))
+
+    def test_invalid_spec(self):
+        with pytest.raises(ValueError):
+            NameTemplate("{date}_{colore}")
+        with pytest.raises(ValueError):
+            NameTemplate("{date}[_{part}")
+
 
 # ══════════════════════════════════════════════════════════════════════════════
 #  resolve_input
@@ -382,6 +553,39 @@ class TestUndoManager:
         assert not mgr.can_undo()
 
 
+# ══════════════════════════════════════════════════════════════════════════════
+#  RateMeter
+# ══════════════════════════════════════════════════════════════════════════════
+
+class TestRateMeter:
+    """Test velocità su finestra mobile (file/s nella barra di stato)."""
+
+    def test_empty_is_zero(self):
+        assert RateMeter().rate() == 0.0
+
+    def test_rate_over_window(self):
+        meter = RateMeter(window_sec=5.0)
+        for t in range(10):
+            meter.add(20, now=100.0 + t)
+        # Restano gli eventi degli ultimi 5 s: 6 x 20 file
+        assert meter.rate(now=109.0) == pytest.approx(120 / 5.0)
+
+    def test_short_run_uses_elapsed_time(self):
+        meter = RateMeter(window_sec=5.0)
+        meter.add(10, now=0.0)
+        meter.add(10, now=2.0)
+        assert meter.rate(now=2.0) == pytest.approx(10.0)
+
+    def test_expires_and_reset(self):
+        meter = RateMeter(window_sec=5.0)
+        meter.add(50, now=0.0)
+        meter.add(0, now=1.0)
+        assert meter.rate(now=10.0) == 0.0
+        meter.add(5, now=11.0)
+        meter.reset()
+        assert meter.rate(now=11.0) == 0.0
+
+
 # ══════════════════════════════════════════════════════════════════════════════
 #  apply_pup_list
 # ══════════════════════════════════════════════════════════════════════════════
@@ -508,5 +712,144 @@ class TestExtractObservation:
         assert obs.time == "10:20"
 
 
+
+# ══════════════════════════════════════════════════════════════════════════════
+#  FileRegistry
+# ══════════════════════════════════════════════════════════════════════════════
+
+def _fi(name: str) -> FileInfo:
+    return FileInfo(path=Path("/card") / name, original_filename=name, extension=".mts")
+
+
+class TestFileRegistry:
+    """Test ID stabili, indici path/riga e override per file."""
+
+    def test_add_dedup_and_lookup(self):
+        reg = FileRegistry()
+        a = reg.add(_fi("a.mts"))
+        b = reg.add(_fi("b.mts"))
+        assert reg.add(_fi("a.mts")) is None
+        assert len(reg) == 2
+        assert Path("/card/b.mts") in reg
+        assert reg.id_of_path(Path("/card/b.mts")) == b
+        assert (reg.row_of(a), reg.row_of(b)) == (0, 1)
+        assert reg.info_at(1).original_filename == "b.mts"
+        assert reg.info_at(2) is None
+
+    def test_overrides_follow_file_after_remove(self):
+        reg = FileRegistry()
+        a, b, c = (reg.add(_fi(n)) for n in ("a.mts", "b.mts", "c.mts"))
+        reg.overrides_for_edit(c).pup = "pup3"
+        reg.remove(a)
+        assert reg.row_of(c) == 1
+        assert reg.overrides(reg.id_at(1)).pup == "pup3"
+        assert reg.overrides(b) is None
+
+    def test_reorder(self):
+        reg = FileRegistry()
+        a, b = reg.add(_fi("a.mts")), reg.add(_fi("b.mts"))
+        reg.reorder([b, a])
+        assert [fi.original_filename for fi in reg] == ["b.mts", "a.mts"]
+        assert reg.row_of(a) == 1
+        with pytest.raises(ValueError):
+            reg.reorder([a])
+
+    def test_update_path_reindexes(self):
+        reg = FileRegistry()
+        a = reg.add(_fi("a.mts"))
+        reg.update_path(a, Path("/card/new.mts"))
+        assert Path("/card/a.mts") not in reg
+        assert reg.id_of_path(Path("/card/new.mts")) == a
+        assert reg.get(a).original_filename == "new.mts"
+
+    def test_inheriting_skips_rows_overriding_all_fields(self):
+        reg = FileRegistry()
+        a, b, c = (reg.add(_fi(n)) for n in ("a.mts", "b.mts", "c.mts"))
+        reg.overrides_for_edit(a).part = "Part1"
+        reg.overrides_for_edit(b).part = "Part2"
+        reg.overrides_for_edit(b).pup = "pup2"
+        assert reg.inheriting(["part"]) == [c]
+        assert reg.inheriting(["part", "pup"]) == [a, c]
+        assert reg.inheriting(["mama_name"]) == [a, b, c]
+        assert reg.inheriting([]) == []
+
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+#  Conflitti di nome
+# ══════════════════════════════════════════════════════════════════════════════
+
+class TestDirectoryCache:
+    """Test snapshot dei nomi per cartella."""
+
+    def setup_method(self):
+        self.tmpdir = Path(tempfile.mkdtemp())
+        (self.tmpdir / "a.mts").write_text("x")
+
+    def teardown_method(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def test_exists_from_snapshot(self):
+        cache = DirectoryCache(recheck_sec=3600)
+        assert cache.exists(self.tmpdir / "a.mts")
+        assert not cache.exists(self.tmpdir / "b.mts")
+        # Nuovo file: invisibile finché lo snapshot non viene invalidato
+        (self.tmpdir / "b.mts").write_text("x")
+        assert not cache.exists(self.tmpdir / "b.mts")
+        cache.invalidate(self.tmpdir)
+        assert cache.exists(self.tmpdir / "b.mts")
+
+    def test_note_rename(self):
+        cache = DirectoryCache(recheck_sec=3600)
+        assert cache.exists(self.tmpdir / "a.mts")
+        cache.note_rename(self.tmpdir / "a.mts", self.tmpdir / "c.mts")
+        assert not cache.exists(self.tmpdir / "a.mts")
+        assert cache.exists(self.tmpdir / "c.mts")
+
+    def test_missing_folder_falls_back(self):
+        cache = DirectoryCache()
+        assert not cache.exists(self.tmpdir / "nope" / "a.mts")
+
+    def test_build_plan_uses_snapshot(self):
+        cache = DirectoryCache(recheck_sec=3600)
+        pair = (self.tmpdir / "a.mts", self.tmpdir / "b.mts")
+        plan, errors = build_plan([pair], cache)
+        assert errors == [] and len(plan.steps) == 1
+        (self.tmpdir / "b.mts").write_text("x")
+        os.utime(self.tmpdir, ns=(0, plan.folders[str(self.tmpdir)] + 10**9))
+        # Snapshot non ancora riletto: il cambio lo segnala check_plan
+        assert check_plan(plan) == [(pair[1], PLAN_CONFLICT_MSG)]
+        cache.invalidate()
+        _, errors = build_plan([pair], cache)
+        assert errors == [(pair[0], PLAN_CONFLICT_MSG)]
+
+
+class TestCollisionIndex:
+    """Test nuovi nomi uguali all'interno del batch."""
+
+    def test_collision_and_affected_rows(self):
+        index = CollisionIndex()
+        target = Path("/card/20260202_pup1_Nova_feb_26_1000_IM.mts")
+        assert index.set(1, target) == set()
+        assert index.set(2, target) == {1}
+        assert index.colliding(1) == [2]
+        assert index.groups() == [[1, 2]]
+        # Il file 2 cambia nome: il file 1 va riaggiornato
+        assert index.set(2, Path("/card/altro.mts")) == {1}
+        assert index.colliding(1) == []
+        assert index.groups() == []
+        assert index.targeting(target) == [1]
+
+    def test_discard(self):
+        index = CollisionIndex()
+        index.set(1, Path("/card/x.mts"))
+        index.set(2, Path("/card/x.mts"))
+        assert index.discard(1) == {2}
+        assert index.colliding(2) == []
+
+    def test_suggest_parts(self):
+        assert suggest_parts([7, 3]) == {7: "Part1", 3: "Part2"}
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
@@ -0,0 +1,161 @@
+"""Test unitari — journal delle rinomine (crash, recupero, undo persistente)."""
+import os
+import sys
+import tempfile
+import shutil
+from pathlib import Path
+
+# Aggiungi src al path
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+import pytest
+from etho_renamer import planner
+from etho_renamer.planner import build_plan, apply_plan
+from etho_renamer.journal import RenameJournal
+from etho_renamer.models import UndoManager
+
+
+class _Crash(Exception):
+    """Interruzione simulata (crash / batteria scarica) durante la rinomina."""
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+#  RenameJournal
+# ══════════════════════════════════════════════════════════════════════════════
+
+class TestRenameJournal:
+    """Test journal write-ahead: recupero dei batch interrotti e undo tra sessioni."""
+
+    def setup_method(self):
+        self.tmpdir = Path(tempfile.mkdtemp())
+        self.videos = self.tmpdir / "videos"
+        self.videos.mkdir()
+        for name in ("a.mts", "b.mts", "c.mts"):
+            (self.videos / name).write_text(name)
+        self.journal_path = self.tmpdir / "journal.jsonl"
+
+    def teardown_method(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def _contents(self):
+        return {p.name: p.read_text() for p in self.videos.iterdir()}
+
+    def _plan(self, pairs):
+        plan, errors = build_plan([(self.videos / a, self.videos / b) for a, b in pairs])
+        assert errors == []
+        return plan
+
+    def _crash_after(self, monkeypatch, renames):
+        real_rename = os.rename
+        calls = []
+
+        def rename(src, dst):
+            if len(calls) == renames:
+                raise _Crash()
+            calls.append(src)
+            real_rename(src, dst)
+        monkeypatch.setattr(planner.os, "rename", rename)
+        return real_rename
+
+    def test_undo_survives_restart(self):
+        journal = RenameJournal(self.journal_path, fsync_every=2)
+        apply_plan(self._plan([("a.mts", "x.mts"), ("b.mts", "y.mts"), ("c.mts", "z.mts")]),
+                   journal=journal)
+        journal.close()
+
+        # Nuova sessione: lo stack di undo riparte dal journal
+        journal = RenameJournal(self.journal_path)
+        undo = UndoManager(journal)
+        assert undo.can_undo()
+        assert all(err == "" for _, err in undo.undo_last())
+        assert self._contents() == {"a.mts": "a.mts", "b.mts": "b.mts", "c.mts": "c.mts"}
+        journal.close()
+        assert not UndoManager(RenameJournal(self.journal_path)).can_undo()
+
+    def test_partial_undo_keeps_failed_steps(self):
+        journal = RenameJournal(self.journal_path)
+        apply_plan(self._plan([("a.mts", "x.mts"), ("b.mts", "y.mts")]), journal=journal)
+        (self.videos / "b.mts").write_text("intruso")   # blocca l'undo di y -> b
+        undo = UndoManager(journal)
+        results = undo.undo_last()
+        assert sorted(err == "" for _, err in results) == [False, True]
+        assert undo.can_undo()   # l'operazione fallita torna nello stack
+        journal.close()
+
+        # Dopo il riavvio resta annullabile solo y -> b
+        (self.videos / "b.mts").unlink()
+        journal = RenameJournal(self.journal_path)
+        undo = UndoManager(journal)
+        results = undo.undo_last()
+        assert [(op.to_path.name, err) for op, err in results] == [("y.mts", "")]
+        assert not undo.can_undo()
+        assert self._contents() == {"a.mts": "a.mts", "b.mts": "b.mts", "c.mts": "c.mts"}
+        journal.close()
+        assert not UndoManager(RenameJournal(self.journal_path)).can_undo()
+
+    def test_rollback_interrupted_swap(self, monkeypatch):
+        journal = RenameJournal(self.journal_path, fsync_every=64)
+        plan = self._plan([("a.mts", "b.mts"), ("b.mts", "a.mts")])
+        real_rename = self._crash_after(monkeypatch, 2)   # a -> tmp, b -> a, crash
+        with pytest.raises(_Crash):
+            apply_plan(plan, journal=journal)
+        monkeypatch.setattr(planner.os, "rename", real_rename)
+        assert "a.mts" in self._contents() and "b.mts" not in self._contents()
+
+        # Riavvio senza chiudere il journal: i "done" in memoria sono persi
+        recovered = RenameJournal(self.journal_path)
+        assert len(recovered.incomplete()) == 1
+        assert recovered.recover(replay=False) == []
+        assert self._contents() == {"a.mts": "a.mts", "b.mts": "b.mts", "c.mts": "c.mts"}
+        assert recovered.incomplete() == []
+        assert not UndoManager(recovered).can_undo()
+
+    def test_replay_interrupted_chain(self, monkeypatch):
+        journal = RenameJournal(self.journal_path, fsync_every=1)
+        plan = self._plan([("a.mts", "b.mts"), ("b.mts", "c.mts"), ("c.mts", "d.mts")])
+        real_rename = self._crash_after(monkeypatch, 1)   # solo c -> d
+        with pytest.raises(_Crash):
+            apply_plan(plan, journal=journal)
+        monkeypatch.setattr(planner.os, "rename", real_rename)
+
+        recovered = RenameJournal(self.journal_path)
+        assert recovered.recover(replay=True) == []
+        assert self._contents() == {"b.mts": "a.mts", "c.mts": "b.mts", "d.mts": "c.mts"}
+        # Il batch completato è annullabile
+        undo = UndoManager(recovered)
+        assert all(err == "" for _, err in undo.undo_last())
+        assert self._contents() == {"a.mts": "a.mts", "b.mts": "b.mts", "c.mts": "c.mts"}
+
+    def test_compaction_keeps_recent_undo_batches(self):
+        journal = RenameJournal(self.journal_path)
+        names = ["a.mts", "x1.mts", "x2.mts", "x3.mts", "x4.mts"]
+        for old, new in zip(names, names[1:]):
+            apply_plan(self._plan([(old, new)]), journal=journal)
+        UndoManager(journal).undo_last()    # x4 -> x3: batch chiuso
+        size_before = self.journal_path.stat().st_size
+
+        journal.compact(max_undo_batches=2)
+        assert self.journal_path.stat().st_size < size_before
+        journal.close()
+
+        undo = UndoManager(RenameJournal(self.journal_path))
+        batches = undo.undo_last(), undo.undo_last()
+        assert [op.to_path.name for results in batches for op, _ in results] == [
+            "x3.mts", "x2.mts",
+        ]
+        assert not undo.can_undo()
+        assert "x1.mts" in self._contents()
+
+    def test_truncated_line_ignored(self):
+        journal = RenameJournal(self.journal_path)
+        apply_plan(self._plan([("a.mts", "x.mts")]), journal=journal)
+        journal.close()
+        with open(self.journal_path, "a", encoding="utf-8") as f:
+            f.write('{"t": "intent", "batch": 2, "se')
+        journal = RenameJournal(self.journal_path)
+        assert journal.incomplete() == []
+        assert UndoManager(journal).can_undo()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
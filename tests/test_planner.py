@@ -0,0 +1,213 @@
+"""Test unitari — piano di rinomina a due fasi (catene, cicli, snapshot)."""
+import os
+import sys
+import tempfile
+import shutil
+from pathlib import Path
+
+# Aggiungi src al path
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+import pytest
+from etho_renamer.planner import (
+    build_plan, check_plan, apply_plan, save_plan, load_plan, plan_groups,
+    PLAN_CONFLICT_MSG, PLAN_DUPLICATE_MSG,
+)
+from etho_renamer.models import UndoManager, CancelToken
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+#  build_plan / apply_plan
+# ══════════════════════════════════════════════════════════════════════════════
+
+class TestRenamePlan:
+    """Test piano: ordine dei passi, conflitti, applicazione e undo."""
+
+    def setup_method(self):
+        self.tmpdir = Path(tempfile.mkdtemp())
+        for name in ("a.mts", "b.mts", "c.mts", "other.mts"):
+            (self.tmpdir / name).write_text(name)
+
+    def teardown_method(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def _p(self, name):
+        return self.tmpdir / name
+
+    def _contents(self):
+        return {p.name: p.read_text() for p in self.tmpdir.iterdir()}
+
+    def test_chain_ordered_from_the_end(self):
+        # a -> b -> c -> d: prima c, poi b, poi a
+        plan, errors = build_plan([
+            (self._p("a.mts"), self._p("b.mts")),
+            (self._p("b.mts"), self._p("c.mts")),
+            (self._p("c.mts"), self._p("d.mts")),
+        ])
+        assert errors == []
+        assert [s.from_path.name for s in plan.steps] == ["c.mts", "b.mts", "a.mts"]
+        ops, errors = apply_plan(plan)
+        assert errors == [] and len(ops) == 3
+        assert self._contents() == {
+            "b.mts": "a.mts", "c.mts": "b.mts", "d.mts": "c.mts", "other.mts": "other.mts",
+        }
+
+    def test_swap_uses_temporary_name_and_undo(self):
+        plan, errors = build_plan([
+            (self._p("a.mts"), self._p("b.mts")),
+            (self._p("b.mts"), self._p("a.mts")),
+        ])
+        assert errors == []
+        assert [s.temporary for s in plan.steps] == [True, False, False]
+        assert [(s.from_path.name, s.to_path.name) for s in plan.renames()] == [
+            ("b.mts", "a.mts"), ("a.mts", "b.mts"),
+        ]
+        ops, errors = apply_plan(plan)
+        assert errors == []
+        assert self._contents()["a.mts"] == "b.mts"
+        assert self._contents()["b.mts"] == "a.mts"
+
+        undo = UndoManager()
+        undo.push_transaction(ops)
+        assert all(err == "" for _, err in undo.undo_last())
+        assert self._contents()["a.mts"] == "a.mts"
+        assert len(self._contents()) == 4
+
+    def test_conflicts_and_duplicates_excluded(self):
+        plan, errors = build_plan([
+            (self._p("a.mts"), self._p("other.mts")),   # occupato da un file fuori piano
+            (self._p("b.mts"), self._p("x.mts")),
+            (self._p("c.mts"), self._p("x.mts")),       # stesso target di b
+        ])
+        assert plan.steps == []
+        assert dict(errors) == {
+            self._p("a.mts"): PLAN_CONFLICT_MSG,
+            self._p("b.mts"): PLAN_DUPLICATE_MSG,
+            self._p("c.mts"): PLAN_DUPLICATE_MSG,
+        }
+
+    def test_chain_behind_conflict_is_excluded(self):
+        # b non può muoversi, quindi neanche a (che punta a b)
+        plan, errors = build_plan([
+            (self._p("a.mts"), self._p("b.mts")),
+            (self._p("b.mts"), self._p("other.mts")),
+        ])
+        assert plan.steps == []
+        assert len(errors) == 2
+
+    def test_check_plan_detects_changes(self):
+        plan, _ = build_plan([(self._p("a.mts"), self._p("new.mts"))])
+        assert check_plan(plan) == []
+        (self._p("new.mts")).write_text("arrivato dopo il piano")
+        os.utime(self.tmpdir, ns=(0, plan.folders[str(self.tmpdir)] + 10**9))
+        assert check_plan(plan) == [(self._p("new.mts"), PLAN_CONFLICT_MSG)]
+
+    def test_apply_never_overwrites(self):
+        plan, _ = build_plan([
+            (self._p("a.mts"), self._p("new.mts")),
+            (self._p("b.mts"), self._p("a.mts")),
+        ])
+        (self._p("new.mts")).write_text("intruso")
+        ops, errors = apply_plan(plan)
+        assert ops == []
+        assert len(errors) == 2
+        assert self._contents()["new.mts"] == "intruso"
+        assert self._contents()["a.mts"] == "a.mts"
+
+    def test_progress_and_save_load(self):
+        plan, _ = build_plan([
+            (self._p(n), self._p(f"r_{n}")) for n in ("a.mts", "b.mts", "c.mts")
+        ])
+        plan_file = self.tmpdir.parent / f"{self.tmpdir.name}_plan.json"
+        try:
+            save_plan(plan, plan_file)
+            loaded, err = load_plan(plan_file)
+        finally:
+            plan_file.unlink()
+        assert err == ""
+        assert loaded.steps == plan.steps and loaded.folders == plan.folders
+
+        progress = []
+        apply_plan(loaded, on_progress=lambda done, total: progress.append((done, total)),
+                   progress_every=2)
+        assert progress == [(2, 3), (3, 3)]
+
+    def test_load_invalid_plan(self):
+        bad = self._p("plan.json")
+        bad.write_text("{non json")
+        plan, err = load_plan(bad)
+        assert plan is None and "Piano non leggibile" in err
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+#  Esecuzione parallela e annullamento
+# ══════════════════════════════════════════════════════════════════════════════
+
+class TestParallelApply:
+    """Test esecuzione dei gruppi indipendenti su più thread."""
+
+    def setup_method(self):
+        self.tmpdir = Path(tempfile.mkdtemp())
+        self.dirs = [self.tmpdir / f"d{i}" for i in range(3)]
+        self.pairs = []
+        for folder in self.dirs:
+            folder.mkdir()
+            for i in range(40):
+                (folder / f"f{i}.mts").write_text(f"{folder.name}/{i}")
+            # Scambi a coppie e rinomine semplici nella stessa cartella
+            for i in range(0, 20, 2):
+                self.pairs.append((folder / f"f{i}.mts", folder / f"f{i + 1}.mts"))
+                self.pairs.append((folder / f"f{i + 1}.mts", folder / f"f{i}.mts"))
+            for i in range(20, 40):
+                self.pairs.append((folder / f"f{i}.mts", folder / f"new{i}.mts"))
+
+    def teardown_method(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def _contents(self):
+        return {
+            f"{p.parent.name}/{p.name}": p.read_text()
+            for folder in self.dirs for p in folder.iterdir()
+        }
+
+    def test_groups_are_chains_and_cycles(self):
+        plan, _ = build_plan(self.pairs)
+        groups = plan_groups(plan)
+        assert len(groups) == 3 * (10 + 20)
+        assert sorted(len(g) for g in groups)[-1] == 3   # scambio: tmp + 2 passi
+
+    def test_parallel_matches_sequential_and_undo(self):
+        original = self._contents()
+        plan, _ = build_plan(self.pairs)
+        ops, errors = apply_plan(plan, max_workers=8, dir_concurrency=2)
+        assert errors == [] and len(ops) == len(plan.steps)
+        contents = self._contents()
+        assert contents["d0/f0.mts"] == "d0/1" and contents["d2/new25.mts"] == "d2/25"
+        assert not any(".etho-tmp" in name for name in contents)
+
+        undo = UndoManager()
+        undo.push_transaction(ops)
+        assert all(err == "" for _, err in undo.undo_last())
+        assert self._contents() == original
+
+    def test_cancel_leaves_consistent_batch(self):
+        original = self._contents()
+        swaps = [(a, b) for a, b in self.pairs if b.name.startswith("f")]
+        plan, _ = build_plan(swaps)
+        token = CancelToken()
+        ops, errors = apply_plan(
+            plan, token=token, max_workers=1, progress_every=1,
+            on_operations=lambda new_ops: token.cancel(),
+        )
+        # Il primo gruppo è uno scambio: viene completato anche se annullato
+        assert errors == [] and len(ops) == 3
+        assert not any(".etho-tmp" in name for name in self._contents())
+
+        undo = UndoManager()
+        undo.push_transaction(ops)
+        assert all(err == "" for _, err in undo.undo_last())
+        assert self._contents() == original
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,693 @@
+"""Test unitari — probing durate: cache persistente, lettori nativi."""
+import os
+import sys
+import tempfile
+import shutil
+import sqlite3
+import struct
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+# Aggiungi src al path
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+import pytest
+from etho_renamer.cache import DurationCache
+from etho_renamer import ffprobe, avchd
+from etho_renamer.ffprobe import (
+    get_duration, ProbeEngine, ProbeBackend, CacheBackend, FfprobeBackend,
+    CircuitBreaker, probe_timeout, PROBE_CANCELLED,
+)
+from etho_renamer.mp4 import read_mp4_duration, read_mp4_info
+from etho_renamer.mpegts import read_ts_duration
+from etho_renamer.avchd import (
+    find_stream_dir, read_clpi_duration, read_mpls_durations,
+    fill_durations_from_index,
+)
+from etho_renamer.models import FileInfo, CancelToken, MediaInfo
+from etho_renamer.estimate import BitrateModel, apply_provisional_duration
+from etho_renamer.scheduler import (
+    ProbeScheduler, _DeviceState, PRIORITY_VISIBLE, PRIORITY_BACKGROUND,
+)
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+#  DurationCache
+# ══════════════════════════════════════════════════════════════════════════════
+
+class TestDurationCache:
+    """Test cache SQLite delle durate."""
+
+    def setup_method(self):
+        self.tmpdir = Path(tempfile.mkdtemp())
+        self.cache = DurationCache(self.tmpdir / "cache.sqlite3", max_entries=10)
+
+    def teardown_method(self):
+        self.cache.close()
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def _make_file(self, name: str, content: str = "dummy") -> Path:
+        p = self.tmpdir / name
+        p.write_text(content)
+        return p
+
+    def test_miss_then_hit(self):
+        fp = self._make_file("a.mts")
+        assert self.cache.get(fp) is None
+        self.cache.put(fp, 123.5)
+        assert self.cache.get(fp) == 123.5
+        stats = self.cache.stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+
+    def test_invalidated_when_file_changes(self):
+        fp = self._make_file("a.mts")
+        self.cache.put(fp, 60.0)
+        fp.write_text("contenuto diverso e più lungo")
+        st = fp.stat()
+        os.utime(fp, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+        assert self.cache.get(fp) is None
+        assert self.cache.stats()["invalidations"] == 1
+        assert len(self.cache) == 0
+
+    def test_persists_across_instances(self):
+        fp = self._make_file("a.mts")
+        self.cache.put(fp, 42.0)
+        self.cache.close()
+        self.cache = DurationCache(self.tmpdir / "cache.sqlite3")
+        assert self.cache.get(fp) == 42.0
+
+    def test_lru_eviction(self):
+        files = [self._make_file(f"f{i}.mts") for i in range(10)]
+        for fp in files:
+            self.cache.put(fp, 1.0)
+        # Il primo file è il più usato di recente
+        assert self.cache.get(files[0]) == 1.0
+        self.cache.put(self._make_file("extra.mts"), 2.0)
+        assert len(self.cache) <= 10
+        assert self.cache.get(files[0]) == 1.0
+        assert self.cache.get(files[1]) is None
+
+    def test_get_duration_uses_cache(self):
+        fp = self._make_file("a.mts")
+        self.cache.put(fp, 99.0)
+        duration, err = get_duration(fp, cache=self.cache)
+        assert err is None
+        assert duration == 99.0
+
+    def test_metadata_round_trip(self):
+        fp = self._make_file("a.mp4")
+        info = MediaInfo(
+            duration_sec=12.5, creation_time=datetime(2026, 2, 2, 9, 15),
+            codec="h264", width=1920, height=1080, fps=25.0,
+            bit_rate=24_000_000, complete=True,
+        )
+        self.cache.put_info(fp, info)
+        assert self.cache.get_info(fp) == info
+
+    def test_migrates_old_schema(self):
+        fp = self._make_file("a.mts")
+        old_db = self.tmpdir / "old.sqlite3"
+        conn = sqlite3.connect(str(old_db))
+        conn.execute(
+            "CREATE TABLE durations (path TEXT PRIMARY KEY, size INTEGER NOT NULL,"
+            " mtime_ns INTEGER NOT NULL, inode INTEGER NOT NULL,"
+            " duration REAL NOT NULL, last_access INTEGER NOT NULL)"
+        )
+        st = fp.stat()
+        conn.execute(
+            "INSERT INTO durations VALUES (?, ?, ?, ?, ?, ?)",
+            (str(fp), st.st_size, st.st_mtime_ns, st.st_ino, 30.0, 1),
+        )
+        conn.commit()
+        conn.close()
+        cache = DurationCache(old_db)
+        try:
+            info = cache.get_info(fp)
+            assert info.duration_sec == 30.0
+            assert info.codec is None and not info.complete
+        finally:
+            cache.close()
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+#  MP4/MOV nativo
+# ══════════════════════════════════════════════════════════════════════════════
+
+def _box(box_type: bytes, payload: bytes) -> bytes:
+    return struct.pack(">I4s", 8 + len(payload), box_type) + payload
+
+
+def _box64(box_type: bytes, payload: bytes) -> bytes:
+    return struct.pack(">I4sQ", 1, box_type, 16 + len(payload)) + payload
+
+
+def _mvhd_v0(timescale: int, duration: int, created: int = 0) -> bytes:
+    return _box(b"mvhd", struct.pack(">B3xIIII", 0, created, 0, timescale, duration) + bytes(80))
+
+
+def _mvhd_v1(timescale: int, duration: int) -> bytes:
+    return _box(b"mvhd", struct.pack(">B3xQQIQ", 1, 0, 0, timescale, duration) + bytes(80))
+
+
+class TestMp4Reader:
+    """Test lettura durata dal box mvhd."""
+
+    def setup_method(self):
+        self.tmpdir = Path(tempfile.mkdtemp())
+
+    def teardown_method(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def _write(self, name: str, data: bytes) -> Path:
+        p = self.tmpdir / name
+        p.write_bytes(data)
+        return p
+
+    def test_moov_at_start(self):
+        data = _box(b"ftyp", b"isom" + bytes(8)) + _box(b"moov", _mvhd_v0(1000, 7500))
+        data += _box(b"mdat", bytes(1024))
+        assert read_mp4_duration(self._write("a.mp4", data)) == 7.5
+
+    def test_moov_at_end_after_64bit_mdat(self):
+        data = _box(b"ftyp", b"qt  " + bytes(8)) + _box64(b"mdat", bytes(4096))
+        data += _box(b"moov", _box(b"udta", bytes(16)) + _mvhd_v1(600, 600 * 90))
+        assert read_mp4_duration(self._write("a.mov", data)) == 90.0
+
+    def test_missing_moov_returns_none(self):
+        data = _box(b"ftyp", b"isom" + bytes(8)) + _box(b"mdat", bytes(64))
+        assert read_mp4_duration(self._write("a.mp4", data)) is None
+
+    def test_truncated_file_returns_none(self):
+        data = _box(b"moov", _mvhd_v0(1000, 7500))[:20]
+        assert read_mp4_duration(self._write("a.mp4", data)) is None
+
+    def test_creation_time_from_1904_epoch(self):
+        utc = datetime(2026, 2, 2, 9, 15, tzinfo=timezone.utc)
+        created = int((utc - datetime(1904, 1, 1, tzinfo=timezone.utc)).total_seconds())
+        data = _box(b"moov", _mvhd_v0(1000, 7500, created))
+        info = read_mp4_info(self._write("a.mp4", data))
+        assert info.duration_sec == 7.5
+        assert info.creation_time == utc.astimezone().replace(tzinfo=None)
+        assert not info.complete
+
+    def test_unset_creation_time_is_none(self):
+        data = _box(b"moov", _mvhd_v0(1000, 7500))
+        assert read_mp4_info(self._write("a.mp4", data)).creation_time is None
+
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+#  MPEG-TS / M2TS nativo
+# ══════════════════════════════════════════════════════════════════════════════
+
+def _pes_packet(pid: int, pts: int, m2ts: bool) -> bytes:
+    """Pacchetto TS con header PES video e PTS."""
+    pts_bytes = bytes([
+        0x21 | ((pts >> 29) & 0x0E),
+        (pts >> 22) & 0xFF,
+        0x01 | ((pts >> 14) & 0xFE),
+        (pts >> 7) & 0xFF,
+        0x01 | ((pts << 1) & 0xFE),
+    ])
+    pes = b"\x00\x00\x01\xe0\x00\x00\x80\x80\x05" + pts_bytes
+    packet = bytes([0x47, 0x40 | (pid >> 8), pid & 0xFF, 0x10]) + pes
+    packet += b"\xff" * (188 - len(packet))
+    return (b"\x00" * 4 + packet) if m2ts else packet
+
+
+def _null_packet(m2ts: bool) -> bytes:
+    packet = bytes([0x47, 0x1F, 0xFF, 0x10]) + b"\xff" * 184
+    return (b"\x00" * 4 + packet) if m2ts else packet
+
+
+def _ts_stream(first_pts: int, frames: int, m2ts: bool, filler: int = 2000) -> bytes:
+    """Flusso con un PTS per frame a 25 fps e pacchetti di riempimento in mezzo."""
+    step = 90000 // 25
+    data = bytearray()
+    for i in range(frames):
+        data += _pes_packet(0x1011, (first_pts + i * step) % (1 << 33), m2ts)
+        if i == frames // 2:
+            data += _null_packet(m2ts) * filler
+    return bytes(data)
+
+
+class TestTsReader:
+    """Test lettura durata da primo/ultimo PTS."""
+
+    def setup_method(self):
+        self.tmpdir = Path(tempfile.mkdtemp())
+
+    def teardown_method(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def _write(self, name: str, data: bytes) -> Path:
+        p = self.tmpdir / name
+        p.write_bytes(data)
+        return p
+
+    def test_m2ts_192_byte_packets(self):
+        fp = self._write("a.mts", _ts_stream(90000, 250, m2ts=True))
+        assert read_ts_duration(fp) == pytest.approx(10.0)
+
+    def test_ts_188_byte_packets(self):
+        fp = self._write("a.ts", _ts_stream(0, 100, m2ts=False))
+        assert read_ts_duration(fp) == pytest.approx(4.0)
+
+    def test_pts_wraparound(self):
+        start = (1 << 33) - 90000  # wrap dopo 1 secondo
+        fp = self._write("a.mts", _ts_stream(start, 125, m2ts=True))
+        assert read_ts_duration(fp) == pytest.approx(5.0)
+
+    def test_not_a_transport_stream(self):
+        fp = self._write("a.mts", b"not a transport stream" * 100)
+        assert read_ts_duration(fp) is None
+
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+#  Indici AVCHD (CLIPINF / PLAYLIST)
+# ══════════════════════════════════════════════════════════════════════════════
+
+def _clpi(start_45k: int, end_45k: int) -> bytes:
+    """CLIPINF minimale: una sequenza ATC con una sequenza STC."""
+    seq = struct.pack(">IBB", 0, 0, 1)                 # length, reserved, num_atc
+    seq += struct.pack(">IBB", 0, 1, 0)                # spn_atc_start, num_stc, offset
+    seq += struct.pack(">HIII", 0x1001, 0, start_45k, end_45k)
+    header = b"HDMV0100" + struct.pack(">IIIII", 40, 0, 0, 0, 0)
+    header += bytes(40 - len(header))
+    return header + seq
+
+
+def _mpls(items) -> bytes:
+    """PLAYLIST minimale con i PlayItem (clip_id, in_45k, out_45k)."""
+    body = b""
+    for clip_id, in_t, out_t in items:
+        item = clip_id.encode("ascii") + b"M2TS" + struct.pack(">HBII", 1, 0, in_t, out_t)
+        body += struct.pack(">H", len(item)) + item
+    playlist = struct.pack(">IHHH", 0, 0, len(items), 0) + body
+    header = b"MPLS0100" + struct.pack(">III", 20, 0, 0)
+    return header + playlist
+
+
+class TestAvchdIndex:
+    """Test lettura durate dagli indici della scheda."""
+
+    def setup_method(self):
+        self.tmpdir = Path(tempfile.mkdtemp())
+        self.bdmv = self.tmpdir / "PRIVATE" / "AVCHD" / "BDMV"
+        for sub in ("STREAM", "CLIPINF", "PLAYLIST"):
+            (self.bdmv / sub).mkdir(parents=True)
+        self.stream = self.bdmv / "STREAM"
+
+    def teardown_method(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def _clip(self, name: str) -> FileInfo:
+        p = self.stream / name
+        p.write_bytes(b"\x00")
+        return FileInfo(path=p, original_filename=p.name, extension=".mts")
+
+    def test_read_clpi_duration(self):
+        fp = self.bdmv / "CLIPINF" / "00000.CPI"
+        fp.write_bytes(_clpi(45000, 45000 * 91))
+        assert read_clpi_duration(fp) == 90.0
+
+    def test_read_mpls_durations(self):
+        fp = self.bdmv / "PLAYLIST" / "00000.MPL"
+        fp.write_bytes(_mpls([("00000", 0, 45000 * 10), ("00001", 0, 45000 * 20)]))
+        assert read_mpls_durations(fp) == {"00000": 10.0, "00001": 20.0}
+
+    def test_find_stream_dir_from_card_root(self):
+        assert find_stream_dir(self.tmpdir) == self.stream
+        assert find_stream_dir(self.stream) == self.stream
+        assert find_stream_dir(self.bdmv / "PLAYLIST") is None
+
+    def test_fill_durations_falls_back_for_uncovered(self):
+        (self.bdmv / "CLIPINF" / "00000.CPI").write_bytes(_clpi(0, 45000 * 30))
+        (self.bdmv / "PLAYLIST" / "00000.MPL").write_bytes(
+            _mpls([("00000", 0, 45000 * 99), ("00001", 0, 45000 * 12)])
+        )
+        infos = [self._clip("00000.MTS"), self._clip("00001.MTS"), self._clip("00002.MTS")]
+        uncovered = fill_durations_from_index(infos)
+        assert infos[0].duration_sec == 30.0   # CLIPINF ha la precedenza
+        assert infos[1].duration_sec == 12.0   # solo dalla playlist
+        assert uncovered == [infos[2]]
+
+    def test_fill_durations_reuses_index_across_calls(self, monkeypatch):
+        (self.bdmv / "CLIPINF" / "00000.CPI").write_bytes(_clpi(0, 45000 * 30))
+        (self.bdmv / "CLIPINF" / "00001.CPI").write_bytes(_clpi(0, 45000 * 40))
+        reads = []
+        real_read = avchd.read_card_durations
+        monkeypatch.setattr(avchd, "read_card_durations",
+                            lambda d: reads.append(d) or real_read(d))
+        card_index = {}
+        first, second = self._clip("00000.MTS"), self._clip("00001.MTS")
+        fill_durations_from_index([first], card_index)
+        fill_durations_from_index([second], card_index)
+        assert reads == [self.stream]
+        assert (first.duration_sec, second.duration_sec) == (30.0, 40.0)
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+#  ProbeEngine
+# ══════════════════════════════════════════════════════════════════════════════
+
+class _FixedBackend(ProbeBackend):
+    """Backend di test con risultato fisso."""
+
+    def __init__(self, name, duration=None, error=None, complete=False):
+        self.name = name
+        info = MediaInfo(duration_sec=duration, complete=complete) if duration else None
+        self.result = (info, error)
+        self.calls = 0
+
+    def probe(self, file_path, token=None):
+        self.calls += 1
+        return self.result
+
+
+class TestProbeEngine:
+    """Test catena di backend."""
+
+    def test_first_success_wins(self):
+        first = _FixedBackend("a")
+        second = _FixedBackend("b", duration=12.0)
+        third = _FixedBackend("c", duration=99.0)
+        engine = ProbeEngine([first, second, third])
+        assert engine.get_duration(Path("x.mts")) == (12.0, None)
+        assert third.calls == 0
+        stats = engine.stats()
+        assert stats["a"]["failures"] == 1
+        assert stats["b"]["successes"] == 1
+        assert stats["c"]["calls"] == 0
+
+    def test_last_error_reported(self):
+        engine = ProbeEngine([
+            _FixedBackend("a", error="primo"),
+            _FixedBackend("b", error="secondo"),
+        ])
+        assert engine.get_duration(Path("x.mts")) == (None, "secondo")
+
+    def test_backend_exception_is_an_error(self):
+        class Broken(ProbeBackend):
+            name = "broken"
+
+            def probe(self, file_path, token=None):
+                raise RuntimeError("boom")
+
+        duration, err = ProbeEngine([Broken()]).get_duration(Path("x.mts"))
+        assert duration is None
+        assert "boom" in err
+
+    def test_backend_without_probe_rejected(self):
+        class Incomplete(ProbeBackend):
+            name = "incomplete"
+
+        with pytest.raises(TypeError):
+            Incomplete()
+
+    def test_result_stored_in_earlier_cache(self):
+        tmpdir = Path(tempfile.mkdtemp())
+        try:
+            fp = tmpdir / "a.mts"
+            fp.write_text("dummy")
+            cache = DurationCache(tmpdir / "cache.sqlite3")
+            engine = ProbeEngine([CacheBackend(cache), _FixedBackend("native", duration=5.0)])
+            assert engine.get_duration(fp) == (5.0, None)
+            assert cache.get(fp) == 5.0
+            cache.close()
+        finally:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+
+    def test_full_probe_skips_partial_results(self):
+        native = _FixedBackend("native", duration=5.0)
+        external = _FixedBackend("ffprobe", duration=5.1, complete=True)
+        engine = ProbeEngine([native, external])
+        assert engine.probe(Path("x.mp4"))[0].duration_sec == 5.0
+        info, err = engine.probe(Path("x.mp4"), full=True)
+        assert err is None
+        assert info.duration_sec == 5.1 and info.complete
+
+    def test_creation_time_probe_keeps_dated_native_result(self):
+        dated = _FixedBackend("mp4", duration=5.0)
+        dated.result[0].creation_time = datetime(2026, 2, 2, 9, 15)
+        external = _FixedBackend("ffprobe", duration=5.1, complete=True)
+        engine = ProbeEngine([dated, external])
+        assert engine.probe(Path("x.mp4"), need_creation_time=True)[0].duration_sec == 5.0
+        assert external.calls == 0
+
+        undated = ProbeEngine([_FixedBackend("mpegts", duration=5.0), external])
+        assert undated.probe(Path("x.mts"), need_creation_time=True)[0].complete
+
+    def test_full_probe_falls_back_to_partial(self):
+        engine = ProbeEngine([
+            _FixedBackend("native", duration=5.0),
+            _FixedBackend("ffprobe", error="ffprobe non trovato"),
+        ])
+        info, err = engine.probe(Path("x.mts"), full=True)
+        assert err is None
+        assert info.duration_sec == 5.0 and not info.complete
+
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+#  ProbeScheduler
+# ══════════════════════════════════════════════════════════════════════════════
+
+class TestProbeScheduler:
+    """Test scheduler per dispositivo."""
+
+    def test_runs_all_and_respects_device_limit(self):
+        lock = threading.Lock()
+        running = [0]
+        peak = [0]
+
+        def slow_probe(path, token):
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            time.sleep(0.01)
+            with lock:
+                running[0] -= 1
+            return path.name
+
+        sched = ProbeScheduler(slow_probe, initial_limit=2, max_limit=2, low_priority=False)
+        futures = [sched.submit(Path(tempfile.gettempdir()) / f"f{i}.mts") for i in range(12)]
+        results = [f.result(timeout=5) for f in futures]
+        sched.shutdown(wait=True)
+        assert results == [f"f{i}.mts" for i in range(12)]
+        assert peak[0] <= 2
+        stats = list(sched.device_stats().values())
+        assert stats[0]["completed"] == 12
+
+    def test_exception_propagates(self):
+        def broken(path, token):
+            raise ValueError("boom")
+
+        sched = ProbeScheduler(broken, low_priority=False)
+        future = sched.submit(Path("x.mts"))
+        with pytest.raises(ValueError):
+            future.result(timeout=5)
+        sched.shutdown(wait=True)
+
+    def test_priority_and_reprioritize(self):
+        gate = threading.Event()
+        order = []
+
+        def probe(path, token):
+            if path.name == "blocker.mts":
+                gate.wait(5)
+            order.append(path.name)
+            return path.name
+
+        tmp = Path(tempfile.gettempdir())
+        sched = ProbeScheduler(probe, initial_limit=1, max_limit=1, low_priority=False)
+        blocker = sched.submit(tmp / "blocker.mts")
+        futures = [sched.submit(tmp / f"f{i}.mts", PRIORITY_BACKGROUND) for i in range(4)]
+        futures.append(sched.submit(tmp / "visible.mts", PRIORITY_VISIBLE))
+        assert sched.reprioritize({tmp / "f3.mts": PRIORITY_VISIBLE}) == 1
+        gate.set()
+        for f in [blocker] + futures:
+            f.result(timeout=5)
+        sched.shutdown(wait=True)
+        assert order == ["blocker.mts", "visible.mts", "f3.mts", "f0.mts", "f1.mts", "f2.mts"]
+
+    def test_limit_backs_off_when_throughput_drops(self):
+        state = _DeviceState(device=1, limit=4, max_limit=8)
+        state.last_throughput = 1e9   # finestra precedente molto più veloce
+        state.best_latency = 0.001
+        for _ in range(8):
+            state.on_complete(0.001)
+        assert state.limit == 3
+
+
+    def test_cancel_queued_probe(self):
+        gate = threading.Event()
+
+        def probe(path, token):
+            gate.wait(5)
+            return path.name
+
+        tmp = Path(tempfile.gettempdir())
+        sched = ProbeScheduler(probe, initial_limit=1, max_limit=1, low_priority=False)
+        running = sched.submit(tmp / "a.mts")
+        queued = sched.submit(tmp / "b.mts")
+        assert sched.cancel(tmp / "b.mts")
+        assert queued.cancelled()
+        gate.set()
+        assert running.result(timeout=5) == "a.mts"
+        sched.shutdown(wait=True)
+
+    def test_cancel_running_probe_cancels_token(self):
+        started = threading.Event()
+
+        def probe(path, token):
+            started.set()
+            while not token.cancelled:
+                time.sleep(0.005)
+            return "annullato"
+
+        sched = ProbeScheduler(probe, low_priority=False)
+        future = sched.submit(Path("x.mts"))
+        assert started.wait(5)
+        assert sched.cancel(Path("x.mts"))
+        assert future.result(timeout=5) == "annullato"
+        sched.shutdown(wait=True)
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+#  Timeout, annullamento e circuit breaker di ffprobe
+# ══════════════════════════════════════════════════════════════════════════════
+
+@pytest.mark.skipif(sys.platform.startswith("win"), reason="script shell POSIX")
+class TestFfprobeHangs:
+    """Test ffprobe bloccato: timeout, kill su annullamento, circuit breaker."""
+
+    def setup_method(self):
+        self.tmpdir = Path(tempfile.mkdtemp())
+        self.video = self.tmpdir / "a.avi"
+        self.video.write_bytes(b"\x00" * 1024)
+        # Finto ffprobe che non risponde mai
+        self.fake = self.tmpdir / "ffprobe"
+        self.fake.write_text("#!/bin/sh\nexec sleep 30\n")
+        self.fake.chmod(0o755)
+
+    def teardown_method(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def _backend(self, monkeypatch, breaker=None, timeout=0.2):
+        monkeypatch.setattr(ffprobe, "resolve_ffprobe", lambda refresh=False: (str(self.fake), "test"))
+        monkeypatch.setattr(ffprobe, "probe_timeout", lambda size: timeout)
+        return FfprobeBackend(breaker)
+
+    def test_timeout_scales_with_size(self):
+        assert probe_timeout(0) < probe_timeout(4 * 10**9)
+        assert probe_timeout(10**15) == ffprobe.PROBE_TIMEOUT_MAX_SEC
+
+    def test_breaker_opens_after_repeated_hangs(self, monkeypatch):
+        backend = self._backend(monkeypatch, CircuitBreaker(max_hangs=2, cooldown_sec=60))
+        for _ in range(2):
+            duration, err = backend.probe(self.video)
+            assert duration is None and "timeout" in err
+        t0 = time.monotonic()
+        duration, err = backend.probe(self.video)
+        assert time.monotonic() - t0 < 0.1
+        assert "sospeso" in err
+
+    def test_cancel_kills_subprocess(self, monkeypatch):
+        backend = self._backend(monkeypatch, timeout=20)
+        token = CancelToken()
+        threading.Timer(0.2, token.cancel).start()
+        t0 = time.monotonic()
+        duration, err = backend.probe(self.video, token)
+        assert time.monotonic() - t0 < 5
+        assert err == PROBE_CANCELLED
+
+
+@pytest.mark.skipif(sys.platform.startswith("win"), reason="script shell POSIX")
+class TestFfprobeMetadata:
+    """Test lettura in un solo passaggio dei metadati da ffprobe."""
+
+    OUTPUT = (
+        '{"streams": [{"codec_name": "h264", "width": 1920, "height": 1080,'
+        ' "avg_frame_rate": "30000/1001", "r_frame_rate": "60000/1001"}],'
+        ' "format": {"duration": "62.500000", "bit_rate": "24000000",'
+        ' "tags": {"creation_time": "2026-02-02T09:15:00.000000Z"}}}'
+    )
+
+    def setup_method(self):
+        self.tmpdir = Path(tempfile.mkdtemp())
+        self.video = self.tmpdir / "a.avi"
+        self.video.write_bytes(b"\x00" * 1024)
+        self.fake = self.tmpdir / "ffprobe"
+        self.fake.write_text(f"#!/bin/sh\ncat <<'EOF'\n{self.OUTPUT}\nEOF\n")
+        self.fake.chmod(0o755)
+
+    def teardown_method(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def test_all_fields_from_one_run(self, monkeypatch):
+        monkeypatch.setattr(ffprobe, "resolve_ffprobe", lambda refresh=False: (str(self.fake), "test"))
+        info, err = FfprobeBackend().probe(self.video)
+        assert err is None
+        assert info.duration_sec == 62.5
+        assert (info.codec, info.width, info.height) == ("h264", 1920, 1080)
+        assert info.fps == pytest.approx(29.97, abs=0.01)
+        assert info.bit_rate == 24_000_000
+        utc = datetime(2026, 2, 2, 9, 15, tzinfo=timezone.utc)
+        assert info.creation_time == utc.astimezone().replace(tzinfo=None)
+        assert info.complete
+
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+#  Durate provvisorie (dimensione / bitrate)
+# ══════════════════════════════════════════════════════════════════════════════
+
+class TestBitrateModel:
+    """Test stima durata da dimensione file."""
+
+    def _info(self, path: str, size: int) -> FileInfo:
+        p = Path(path)
+        return FileInfo(path=p, original_filename=p.name, extension=p.suffix.lower(), size_bytes=size)
+
+    def test_default_rate_by_extension(self):
+        model = BitrateModel(defaults={".mts": 1000.0})
+        assert model.estimate(self._info("/card/00001.MTS", 60_000)) == 60.0
+        assert model.estimate(self._info("/card/clip.mp4", 60_000)) is None
+
+    def test_learned_rate_overrides_default(self):
+        model = BitrateModel(defaults={".mts": 1000.0})
+        model.learn(Path("/card/00001.MTS"), ".mts", 4_000_000, 2.0)
+        assert model.estimate(self._info("/card/00002.MTS", 6_000_000)) == 3.0
+
+    def test_most_specific_key_wins(self):
+        model = BitrateModel(defaults={})
+        model.learn(Path("/a/GOPR0001.MP4"), ".mp4", 1000, 1.0)
+        model.learn(Path("/b/MVI_0001.MP4"), ".mp4", 3000, 1.0)
+        # Stessa cartella della GoPro: usa il suo bitrate
+        assert model.estimate(self._info("/a/GOPR0002.MP4", 5000)) == 5.0
+        # Cartella nuova ma stesso prefisso Canon
+        assert model.estimate(self._info("/c/MVI_0002.MP4", 6000)) == 2.0
+
+    def test_apply_provisional_marks_file(self):
+        model = BitrateModel(defaults={".mts": 1000.0})
+        fi = self._info("/card/00001.MTS", 30_000)
+        assert apply_provisional_duration(fi, model)
+        assert fi.duration_sec == 30.0
+        assert fi.duration_provisional
+
+    def test_apply_provisional_keeps_exact_duration(self):
+        model = BitrateModel(defaults={".mts": 1000.0})
+        fi = self._info("/card/00001.MTS", 30_000)
+        fi.duration_sec = 12.0
+        assert not apply_provisional_duration(fi, model)
+        assert fi.duration_sec == 12.0
+        assert not fi.duration_provisional
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,143 @@
+"""Test unitari — scansione cartelle e preparazione FileInfo in batch."""
+import os
+import sys
+import tempfile
+import shutil
+from pathlib import Path
+
+# Aggiungi src al path
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+import pytest
+from etho_renamer.scanner import scan_videos, iter_batches, parse_patterns
+from etho_renamer.models import ScanOptions, CancelToken
+from etho_renamer import core
+from etho_renamer.core import prepare_file_info, prepare_file_infos
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+#  scan_videos
+# ══════════════════════════════════════════════════════════════════════════════
+
+class TestScanVideos:
+    """Test scansione ricorsiva in streaming."""
+
+    def setup_method(self):
+        self.tmpdir = Path(tempfile.mkdtemp())
+        for rel in (
+            "b.MTS", "a.mp4", "notes.txt",
+            "day1/GOPR0001.MP4", "day1/deep/00001.MTS",
+            "day2/clip.mov", "BACKUP/old.mp4", ".hidden/x.mp4",
+        ):
+            p = self.tmpdir / rel
+            p.parent.mkdir(parents=True, exist_ok=True)
+            p.write_text("dummy")
+
+    def teardown_method(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def _names(self, options=None, token=None):
+        return [
+            Path(e.path).relative_to(self.tmpdir).as_posix()
+            for e in scan_videos(self.tmpdir, options, token)
+        ]
+
+    def test_recursive_sorted_files_before_subfolders(self):
+        assert self._names() == [
+            "a.mp4", "b.MTS",
+            "BACKUP/old.mp4",
+            "day1/GOPR0001.MP4", "day1/deep/00001.MTS",
+            "day2/clip.mov",
+        ]
+
+    def test_max_depth(self):
+        assert self._names(ScanOptions(max_depth=0)) == ["a.mp4", "b.MTS"]
+        assert "day1/deep/00001.MTS" not in self._names(ScanOptions(max_depth=1))
+
+    def test_include_and_exclude(self):
+        options = ScanOptions(include=["gopr*", "*.mts"], exclude=["deep"])
+        assert self._names(options) == ["b.MTS", "day1/GOPR0001.MP4"]
+        assert "BACKUP/old.mp4" not in self._names(ScanOptions(exclude=["backup"]))
+
+    def test_cancel_stops_scan(self):
+        token = CancelToken()
+        found = []
+        for entry in scan_videos(self.tmpdir, token=token):
+            found.append(entry.name)
+            token.cancel()
+        assert found == ["a.mp4"]
+
+    def test_unreadable_folder_reported(self):
+        errors = []
+        list(scan_videos(self.tmpdir / "missing", on_error=lambda p, msg: errors.append(p)))
+        assert errors == [self.tmpdir / "missing"]
+
+
+class TestScanHelpers:
+    """Test pattern e raggruppamento a blocchi."""
+
+    def test_parse_patterns(self):
+        assert parse_patterns(" GOPR*; *_proxy*, ,") == ["GOPR*", "*_proxy*"]
+
+    def test_batches_by_size(self):
+        batches = list(iter_batches(range(5), batch_size=2, max_delay=60))
+        assert batches == [[0, 1], [2, 3], [4]]
+
+    def test_batches_by_delay(self):
+        batches = list(iter_batches(range(3), batch_size=100, max_delay=0))
+        assert batches == [[0], [1], [2]]
+
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+#  prepare_file_infos
+# ══════════════════════════════════════════════════════════════════════════════
+
+class TestPrepareFileInfos:
+    """Test preparazione FileInfo in batch (un solo stat per file)."""
+
+    def setup_method(self):
+        self.tmpdir = Path(tempfile.mkdtemp())
+        for name in ("a.MTS", "b.mp4", "c.mov"):
+            (self.tmpdir / name).write_bytes(b"x" * 10)
+        (self.tmpdir / "notes.txt").write_text("x")
+        (self.tmpdir / "dir.mp4").mkdir()
+
+    def teardown_method(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def test_paths_in_order_with_errors(self):
+        items = [
+            self.tmpdir / "c.mov", self.tmpdir / "missing.mp4",
+            self.tmpdir / "a.MTS", self.tmpdir / "notes.txt",
+            self.tmpdir / "dir.mp4",
+        ]
+        infos, errors = prepare_file_infos(items)
+        assert [fi.original_filename for fi in infos] == ["c.mov", "a.MTS"]
+        assert infos[1].extension == ".mts"
+        assert infos[1].size_bytes == 10
+        messages = [err for _, err in errors]
+        assert "File non esiste" in messages[0]
+        assert "Estensione non supportata" in messages[1]
+        assert "Non è un file" in messages[2]
+
+    def test_dir_entries_match_single_prepare(self):
+        with os.scandir(self.tmpdir) as it:
+            entries = sorted((e for e in it if e.name != "dir.mp4"), key=lambda e: e.name)
+        infos, errors = prepare_file_infos(entries)
+        assert len(infos) == 3 and len(errors) == 1
+        for fi in infos:
+            single, err = prepare_file_info(fi.path)
+            assert err == ""
+            assert (fi.mtime, fi.size_bytes) == (single.mtime, single.size_bytes)
+
+    def test_remote_paths_use_concurrent_stats(self, monkeypatch):
+        monkeypatch.setattr(core, "is_remote_path", lambda folder: True)
+        items = [self.tmpdir / n for n in ("a.MTS", "b.mp4", "missing.mp4", "c.mov")]
+        infos, errors = prepare_file_infos(items, max_workers=4)
+        assert [fi.original_filename for fi in infos] == ["a.MTS", "b.mp4", "c.mov"]
+        assert [p.name for p, _ in errors] == ["missing.mp4"]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
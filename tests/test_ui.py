@@ -0,0 +1,89 @@
+"""Test UI — rinomina automatica (richiede PySide6, piattaforma offscreen)."""
+import os
+import sys
+import tempfile
+import shutil
+import struct
+import time
+from pathlib import Path
+
+# Aggiungi src al path
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+os.environ.setdefault("ETHO_RENAMER_DATA_DIR", tempfile.mkdtemp(prefix="etho_ui_"))
+
+import pytest
+
+pytest.importorskip("PySide6")
+from PySide6.QtWidgets import QApplication
+
+from etho_renamer.ui import main_window as main_window_module
+from etho_renamer.ui import MainWindow
+
+
+def _mp4(path: Path, seconds: int) -> None:
+    """MP4 minimo: solo il box moov/mvhd con la durata."""
+    payload = struct.pack(">B3xIIII", 0, 0, 0, 1000, seconds * 1000) + bytes(80)
+    mvhd = struct.pack(">I4s", 8 + len(payload), b"mvhd") + payload
+    path.write_bytes(struct.pack(">I4s", 8 + len(mvhd), b"moov") + mvhd)
+
+
+def _spin(app, until, timeout: float = 5.0) -> bool:
+    """Processa gli eventi finché until() è vero (o scade il timeout)."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        app.processEvents()
+        if until():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+#  Rinomina automatica
+# ══════════════════════════════════════════════════════════════════════════════
+
+class TestAutoRename:
+    """Test coda della rinomina automatica."""
+
+    def setup_method(self):
+        self.app = QApplication.instance() or QApplication([])
+        self.window = None
+        self.tmpdir = Path(tempfile.mkdtemp())
+        for name in ("a.mp4", "b.mp4"):
+            _mp4(self.tmpdir / name, 60)
+        os.utime(self.tmpdir / "b.mp4", (time.time() - 3600, time.time() - 3600))
+
+    def teardown_method(self):
+        if self.window is not None:
+            # La cache condivisa resta aperta per gli altri test
+            original = main_window_module.get_default_cache
+            main_window_module.get_default_cache = lambda: None
+            try:
+                self.window.close()
+            finally:
+                main_window_module.get_default_cache = original
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def test_queued_while_input_invalid_renamed_once_valid(self):
+        w = self.window = MainWindow()
+        w.checkbox_dryrun.setChecked(False)
+        w.checkbox_auto_rename.setChecked(True)
+        for name in ("a.mp4", "b.mp4"):
+            w._add_file(self.tmpdir / name)
+
+        # Input vuoto: niente rinomine, la coda resta in attesa
+        assert _spin(self.app, lambda: w.auto_rename_paused)
+        assert sorted(p.name for p in self.tmpdir.iterdir()) == ["a.mp4", "b.mp4"]
+        assert "[WARN] Rinomina automatica in pausa" in w.log_text.toPlainText()
+
+        w.input_pup.setText("pup1")
+        w.input_mama.setText("Nova")
+        w.input_year.setText("26")
+        assert _spin(self.app, lambda: not (self.tmpdir / "a.mp4").exists()
+                     and not (self.tmpdir / "b.mp4").exists())
+        assert all("_pup1_Nova_" in p.name for p in self.tmpdir.iterdir())
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])